@@ -0,0 +1,231 @@
+import os
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from benchmarks.runner import Skip, benchmark
+from model.contact_model import ContactModel
+from model.import_export_model import ImportExportModel
+from model.memory_model import InMemoryContactModel
+from model.write_queue import WriteQueue
+
+
+# Contacts added one at a time by the add_contact benchmark
+ADD_CONTACT_COUNT = 1000
+
+# Threads adding contacts at the same time in the concurrent benchmarks
+WRITER_THREADS = 16
+
+# Searches timed by the filter_contacts benchmarks, by query shape
+QUERY_SHAPES = {
+    "short": "an",  # Below the trigram length, scans the table
+    "name": "ohn",
+    "word": "smith",
+    "phone": "5551",
+    "miss": "zzqx",
+}
+
+# Times each search is repeated per measurement, since one takes well under
+# a millisecond on small databases
+SEARCH_REPEAT = 10
+
+# Caller-ID lookups timed per measurement, written in international form so
+# both the exact and the suffix lookup run
+PHONE_LOOKUPS = [f"+1 555 {i:03d} {i * 37 % 10000:04d}" for i in range(100)]
+
+# Rows loaded by the first-page benchmarks, as the table view does
+PAGE_SIZE = 200
+
+# Fuzzy searches timed per measurement, by what they exercise
+FUZZY_SHAPES = {
+    "typos": "jhon smiht",
+    "prefix": "j",
+    "accent": "muller",
+    "number": "12",
+    "miss": "zzqx",
+}
+
+# Results of each fuzzy search, as the GUI asks for
+FUZZY_LIMIT = 50
+
+
+@contextmanager
+def writable_model(context):
+    with ContactModel(context.writable_database()) as model:
+        yield model
+
+
+@benchmark("add_contact", setup=writable_model)
+def add_contact(model):
+    for i in range(ADD_CONTACT_COUNT):
+        model.add_contact(f"Benchmark Contact {i}", f"999{i:07d}")
+    return ADD_CONTACT_COUNT
+
+
+def _add_concurrently(add):
+    """Adds ADD_CONTACT_COUNT contacts from WRITER_THREADS threads"""
+    per_thread = ADD_CONTACT_COUNT // WRITER_THREADS
+
+    def write(thread):
+        for i in range(per_thread):
+            add(f"Benchmark Contact {thread}-{i}", f"999{i:07d}")
+
+    with ThreadPoolExecutor(WRITER_THREADS) as executor:
+        list(executor.map(write, range(WRITER_THREADS)))
+    return per_thread * WRITER_THREADS
+
+
+@benchmark(f"add_contact[{WRITER_THREADS} threads]", setup=writable_model)
+def add_contact_concurrently(model):
+    return _add_concurrently(model.add_contact)
+
+
+@contextmanager
+def write_queue(context):
+    with ContactModel(context.writable_database()) as model, WriteQueue(model) as queue:
+        yield queue
+
+
+@benchmark(f"WriteQueue.add_contact[{WRITER_THREADS} threads]", setup=write_queue)
+def add_contact_queued(queue):
+    return _add_concurrently(lambda name, phone: queue.add_contact(name, phone).result())
+
+
+@benchmark("get_all_contacts")
+def get_all_contacts(context):
+    return len(context.model.get_all_contacts())
+
+
+def _register_filter(shape, text):
+    @benchmark(f"filter_contacts[{shape}]")
+    def filter_all(context):
+        for _ in range(SEARCH_REPEAT):
+            context.model.filter_contacts(text)
+        return SEARCH_REPEAT
+
+    @benchmark(f"filter_contacts[{shape}, first page]")
+    def filter_page(context):
+        for _ in range(SEARCH_REPEAT):
+            context.model.filter_contacts(text, limit=PAGE_SIZE)
+        return SEARCH_REPEAT
+
+
+for _shape, _text in QUERY_SHAPES.items():
+    _register_filter(_shape, _text)
+
+
+@benchmark("lookup_by_phone")
+def lookup_by_phone(context):
+    for phone in PHONE_LOOKUPS:
+        context.model.lookup_by_phone(phone)
+    return len(PHONE_LOOKUPS)
+
+
+@contextmanager
+def fuzzy_index(context):
+    # The first fuzzy search indexes every name; only time the later ones
+    context.model.fuzzy_search("warm up", 1)
+    yield context.model
+
+
+@benchmark("fuzzy_search[every shape]", setup=fuzzy_index)
+def fuzzy_search(model):
+    for text in FUZZY_SHAPES.values():
+        model.fuzzy_search(text, FUZZY_LIMIT)
+    return len(FUZZY_SHAPES)
+
+
+@contextmanager
+def memory_model(context):
+    model = InMemoryContactModel()
+    model.load_snapshot(context.database_path)
+    yield model
+
+
+@benchmark("InMemoryContactModel.filter_contacts[every shape, first page]", setup=memory_model)
+def filter_memory_page(model):
+    for text in QUERY_SHAPES.values():
+        for _ in range(SEARCH_REPEAT):
+            model.filter_contacts(text, limit=PAGE_SIZE)
+    return len(QUERY_SHAPES) * SEARCH_REPEAT
+
+
+@benchmark("InMemoryContactModel.lookup_by_phone", setup=memory_model)
+def lookup_by_phone_memory(model):
+    for phone in PHONE_LOOKUPS:
+        model.lookup_by_phone(phone)
+    return len(PHONE_LOOKUPS)
+
+
+@benchmark("InMemoryContactModel.fuzzy_search[every shape]", setup=memory_model)
+def fuzzy_search_memory(model):
+    for text in FUZZY_SHAPES.values():
+        model.fuzzy_search(text, FUZZY_LIMIT)
+    return len(FUZZY_SHAPES)
+
+
+@contextmanager
+def empty_import(context):
+    # Make sure the input exists before timing starts
+    file_path = context.import_file
+    with ContactModel(context.temp_path("import.db")) as model:
+        yield ImportExportModel(model), file_path
+
+
+@benchmark("import_contacts_from_file", setup=empty_import)
+def import_contacts(state):
+    importer, file_path = state
+    success, message = importer.import_contacts_from_file(file_path)
+    if not success:
+        raise RuntimeError(message)
+    return importer.contact_model.count_contacts()
+
+
+@contextmanager
+def export_target(context):
+    # Build the shared model before timing starts
+    context.model
+    path = context.temp_path("export.txt")
+    yield ImportExportModel(context.model), path
+    os.unlink(path)
+
+
+@benchmark("export_contacts_to_file", setup=export_target)
+def export_contacts(state):
+    exporter, path = state
+    success, message = exporter.export_contacts_to_file(path)
+    if not success:
+        raise RuntimeError(message)
+    return exporter.contact_model.count_contacts()
+
+
+# Application and window shared by the view benchmarks
+_qt = {}
+
+
+@contextmanager
+def main_window(context):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    try:
+        from PyQt5.QtWidgets import QApplication
+        from view.main_window import MainWindow
+    except ImportError as e:
+        raise Skip(f"PyQt5 is not available ({e})") from None
+
+    if "window" not in _qt:
+        _qt["app"] = QApplication.instance() or QApplication(["benchmarks"])
+        _qt["window"] = MainWindow()
+        _qt["window"].show()
+
+    model = context.model
+
+    def fetch_page(after, limit):
+        return model.page_contacts(after, limit)
+
+    yield _qt["app"], _qt["window"], fetch_page
+
+
+@benchmark("MainWindow.show_contacts", setup=main_window)
+def show_contacts(state):
+    app, window, fetch_page = state
+    window.show_contacts(fetch_page)
+    app.processEvents()
+    return 1
@@ -0,0 +1,69 @@
+import os
+import random
+import sqlite3
+from model.contact_model import ContactModel
+from model.migrations import latest_version
+
+
+FIRST_NAMES = [
+    "James", "Mary", "John", "Patricia", "Robert", "Jennifer", "Michael", "Linda",
+    "William", "Elizabeth", "David", "Barbara", "Richard", "Susan", "Joseph", "Jessica",
+    "Thomas", "Sarah", "Charles", "Karen", "José", "María", "Zoë", "Søren",
+]
+
+LAST_NAMES = [
+    "Smith", "Johnson", "Williams", "Brown", "Jones", "Garcia", "Miller", "Davis",
+    "Rodriguez", "Martinez", "Hernandez", "Lopez", "Gonzalez", "Wilson", "Anderson",
+    "Thomas", "Taylor", "Moore", "Jackson", "Martin", "Lee", "Müller", "Nguyen", "Kim",
+]
+
+# Seed of the generated data, so every run sees the same contacts
+SEED = 1234
+
+
+def generate_contacts(count, seed=SEED):
+    """Yields count reproducible (name, phone) pairs"""
+    rng = random.Random(seed)
+    for i in range(count):
+        name = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)} {i}"
+        phone = f"555{rng.randrange(10 ** 7):07d}"
+        yield name, phone
+
+
+def import_file(data_dir, count):
+    """Returns the path of a "name, phone" file with count contacts, writing it once"""
+    path = os.path.join(data_dir, f"contacts-{count}.txt")
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        with open(partial, "w", encoding="utf-8") as file:
+            for name, phone in generate_contacts(count):
+                file.write(f"{name}, {phone}\n")
+        os.replace(partial, path)
+    return path
+
+
+def database(data_dir, count):
+    """Returns the path of a database holding count contacts, building it once
+
+    Databases are cached per schema version, so a migration rebuilds them.
+    """
+    path = os.path.join(data_dir, f"contacts-{count}-v{latest_version()}.db")
+    if not os.path.exists(path):
+        partial = path + ".partial"
+        if os.path.exists(partial):
+            os.unlink(partial)
+        with ContactModel(partial) as model:
+            model.add_contacts_bulk(generate_contacts(count))
+        os.replace(partial, path)
+    return path
+
+
+def copy_database(source, destination):
+    """Copies a database with the backup API, which is safe while it is open"""
+    src = sqlite3.connect(source)
+    dst = sqlite3.connect(destination)
+    try:
+        src.backup(dst)
+    finally:
+        src.close()
+        dst.close()
@@ -0,0 +1,215 @@
+import argparse
+import asyncio
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.request
+from urllib.parse import quote, urlsplit
+from benchmarks import data
+
+
+# Search texts sent by the simulated clients
+SEARCH_TEXTS = ["ohn", "smith", "mar", "555", "lee", "garcia", "zzqx"]
+
+# Seconds to wait for a spawned service to answer
+SPAWN_TIMEOUT = 30
+
+
+class Client:
+    def __init__(self, host, port):
+        """Keep-alive HTTP/1.1 connection to the service"""
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method, path, body=None):
+        """Sends a request and returns (status, body)"""
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+
+        payload = b"" if body is None else json.dumps(body).encode("utf-8")
+        self.writer.write(
+            f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\n"
+            f"Content-Length: {len(payload)}\r\n\r\n".encode("latin-1") + payload
+        )
+        await self.writer.drain()
+
+        head = await self.reader.readuntil(b"\r\n\r\n")
+        lines = head.decode("latin-1").split("\r\n")
+        status = int(lines[0].split(" ")[1])
+        length = 0
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name.lower() == "content-length":
+                length = int(value)
+        return status, await self.reader.readexactly(length)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+
+def _choose_request(rng, write_ratio, max_id):
+    """Returns (operation, method, path, body) for the next request"""
+    if rng.random() < write_ratio:
+        return "create", "POST", "/contacts", {
+            "name": f"Load Test {rng.randrange(10 ** 9)}",
+            "phone": f"777{rng.randrange(10 ** 7):07d}",
+        }
+    kind = rng.choice(["search", "page", "get"])
+    if kind == "search":
+        text = quote(rng.choice(SEARCH_TEXTS))
+        return kind, "GET", f"/contacts?search={text}&limit=50", None
+    if kind == "page":
+        return kind, "GET", "/contacts?limit=50", None
+    return kind, "GET", f"/contacts/{rng.randint(1, max_id)}", None
+
+
+async def _worker(host, port, deadline, write_ratio, max_id, seed, latencies, errors):
+    rng = random.Random(seed)
+    client = Client(host, port)
+    try:
+        while time.perf_counter() < deadline:
+            operation, method, path, body = _choose_request(rng, write_ratio, max_id)
+            started = time.perf_counter()
+            try:
+                status, _ = await client.request(method, path, body)
+            except (OSError, asyncio.IncompleteReadError) as e:
+                errors[type(e).__name__] = errors.get(type(e).__name__, 0) + 1
+                client.close()
+                client = Client(host, port)
+                continue
+            latencies.setdefault(operation, []).append(time.perf_counter() - started)
+            if status >= 500 or (status >= 400 and status != 404):
+                errors[str(status)] = errors.get(str(status), 0) + 1
+    finally:
+        client.close()
+
+
+def _percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def run_load(host, port, concurrency, duration, write_ratio, max_id):
+    """Runs concurrent clients for duration seconds and returns the summary"""
+    latencies = {}
+    errors = {}
+    deadline = time.perf_counter() + duration
+    started = time.perf_counter()
+    await asyncio.gather(*(
+        _worker(host, port, deadline, write_ratio, max_id, seed, latencies, errors)
+        for seed in range(concurrency)
+    ))
+    elapsed = time.perf_counter() - started
+
+    total = sum(len(values) for values in latencies.values())
+    operations = {
+        operation: {
+            "requests": len(values),
+            "p50_ms": statistics.median(values) * 1000,
+            "p95_ms": _percentile(values, 0.95) * 1000,
+            "p99_ms": _percentile(values, 0.99) * 1000,
+        }
+        for operation, values in sorted(latencies.items())
+    }
+    return {
+        "concurrency": concurrency,
+        "duration": elapsed,
+        "requests": total,
+        "requests_per_sec": total / elapsed,
+        "errors": errors,
+        "operations": operations,
+    }
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def spawn_service(contacts, data_dir, temp_dir):
+    """Starts python -m service on a copy of a generated database
+
+    Returns (process, host, port).
+    """
+    db_path = os.path.join(temp_dir, "contacts.db")
+    data.copy_database(data.database(data_dir, contacts), db_path)
+    port = _free_port()
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    process = subprocess.Popen(
+        [sys.executable, "-m", "service", "--db", db_path, "--port", str(port)],
+        cwd=root,
+        stdout=subprocess.DEVNULL,
+    )
+
+    deadline = time.monotonic() + SPAWN_TIMEOUT
+    while True:
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/health", timeout=1).read()
+            return process, "127.0.0.1", port
+        except OSError:
+            if process.poll() is not None or time.monotonic() > deadline:
+                process.kill()
+                raise RuntimeError("The service did not start") from None
+            time.sleep(0.1)
+
+
+def main(argv=None):
+    """Runs the load test from the command line and returns the exit code"""
+    from benchmarks.runner import DEFAULT_DATA_DIR, parse_scales
+
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.load_test",
+        description="Send concurrent requests to a contacts service.",
+    )
+    parser.add_argument("--url", help="service to test (default: spawn one)")
+    parser.add_argument(
+        "--contacts", default="100k",
+        help="contacts in the spawned service's database (default: 100k)",
+    )
+    parser.add_argument("--concurrency", type=int, default=200)
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds")
+    parser.add_argument("--write-ratio", type=float, default=0.05)
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", help="write the summary to this JSON file")
+    args = parser.parse_args(argv)
+
+    count = parse_scales(args.contacts)[0]
+    process = None
+    temp_dir = tempfile.mkdtemp()
+    try:
+        if args.url:
+            url = urlsplit(args.url)
+            host, port = url.hostname, url.port or 80
+        else:
+            os.makedirs(args.data_dir, exist_ok=True)
+            process, host, port = spawn_service(count, args.data_dir, temp_dir)
+
+        summary = asyncio.run(
+            run_load(host, port, args.concurrency, args.duration, args.write_ratio, count)
+        )
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        shutil.rmtree(temp_dir)
+
+    print(json.dumps(summary, indent=2))
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(summary, file, indent=2)
+    return 1 if summary["errors"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,254 @@
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from collections import namedtuple
+from contextlib import contextmanager
+from benchmarks import data
+from model.contact_model import ContactModel
+
+
+# Named scales, in contacts
+SCALES = {"1k": 1000, "100k": 100000, "1m": 1000000}
+
+DEFAULT_SCALES = "1k,100k"
+
+DEFAULT_REPEAT = 3
+
+# Slowdown of the median, relative to the baseline, reported as a regression
+DEFAULT_THRESHOLD = 0.2
+
+# Where generated databases and import files are kept between runs
+DEFAULT_DATA_DIR = os.path.join(tempfile.gettempdir(), "contacts-benchmarks")
+
+# A timed operation. setup(context) is a context manager whose value is
+# passed to run, which returns the number of operations it performed.
+Benchmark = namedtuple("Benchmark", ["name", "run", "setup"])
+
+# Registered benchmarks in definition order
+BENCHMARKS = []
+
+
+class Skip(Exception):
+    """Raised by a benchmark setup when the benchmark cannot run here"""
+
+
+@contextmanager
+def _context_value(context):
+    yield context
+
+
+def benchmark(name, setup=_context_value):
+    """Decorator that registers a run(state) function as a benchmark"""
+
+    def decorator(run):
+        BENCHMARKS.append(Benchmark(name, run, setup))
+        return run
+
+    return decorator
+
+
+class BenchmarkContext:
+    def __init__(self, count, data_dir, temp_dir):
+        """Data shared by the benchmarks of one scale"""
+        self.count = count
+        self.data_dir = data_dir
+        self.temp_dir = temp_dir
+        self._model = None
+        self._copies = 0
+
+    @property
+    def database_path(self):
+        """Database with count contacts (do not modify)"""
+        return data.database(self.data_dir, self.count)
+
+    @property
+    def import_file(self):
+        """Import file with count contacts"""
+        return data.import_file(self.data_dir, self.count)
+
+    @property
+    def model(self):
+        """Shared ContactModel over database_path, for read-only benchmarks"""
+        if self._model is None:
+            self._model = ContactModel(self.database_path)
+        return self._model
+
+    def temp_path(self, name):
+        """Returns a new path in the scratch directory"""
+        self._copies += 1
+        return os.path.join(self.temp_dir, f"{self._copies}-{name}")
+
+    def writable_database(self):
+        """Returns the path of a fresh copy of database_path"""
+        path = self.temp_path("contacts.db")
+        data.copy_database(self.database_path, path)
+        return path
+
+    def close(self):
+        if self._model is not None:
+            self._model.close()
+
+
+def time_benchmark(case, context, repeat):
+    """Runs a benchmark repeat times and returns its result record"""
+    times = []
+    operations = 0
+    for _ in range(repeat):
+        with case.setup(context) as state:
+            started = time.perf_counter()
+            operations = case.run(state)
+            times.append(time.perf_counter() - started)
+
+    median = statistics.median(times)
+    return {
+        "name": case.name,
+        "count": context.count,
+        "operations": operations,
+        "times": times,
+        "min": min(times),
+        "median": median,
+        "ops_per_sec": operations / median if median else None,
+    }
+
+
+def run_benchmarks(counts, repeat=DEFAULT_REPEAT, data_dir=DEFAULT_DATA_DIR,
+                   name_filter=None, report=None):
+    """Runs the registered benchmarks at every scale and returns the results"""
+    # Registers the benchmarks
+    from benchmarks import cases  # noqa: F401
+
+    os.makedirs(data_dir, exist_ok=True)
+    results = []
+    for count in counts:
+        temp_dir = tempfile.mkdtemp()
+        context = BenchmarkContext(count, data_dir, temp_dir)
+        try:
+            for case in BENCHMARKS:
+                if name_filter and name_filter not in case.name:
+                    continue
+                try:
+                    result = time_benchmark(case, context, repeat)
+                except Skip as e:
+                    result = {"name": case.name, "count": count, "skipped": str(e)}
+                results.append(result)
+                if report:
+                    report(result)
+        finally:
+            context.close()
+            shutil.rmtree(temp_dir)
+
+    return {
+        "metadata": {
+            "python": platform.python_version(),
+            "sqlite": sqlite3.sqlite_version,
+            "platform": platform.platform(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+            "repeat": repeat,
+        },
+        "results": results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    """Compares median times and returns (name, count, ratio, status) rows
+
+    status is "regression" when the current median is more than threshold
+    slower than the baseline, "improvement" when it is that much faster, and
+    "ok" otherwise. Benchmarks missing from either run are left out.
+    """
+    previous = {
+        (result["name"], result["count"]): result
+        for result in baseline["results"]
+        if "median" in result
+    }
+    rows = []
+    for result in current["results"]:
+        base = previous.get((result["name"], result["count"]))
+        if base is None or "median" not in result:
+            continue
+
+        ratio = result["median"] / base["median"] if base["median"] else 1.0
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 / (1 + threshold):
+            status = "improvement"
+        else:
+            status = "ok"
+        rows.append((result["name"], result["count"], ratio, status))
+    return rows
+
+
+def parse_scales(text):
+    """Parses a comma-separated list of scale names or contact counts"""
+    counts = []
+    for scale in text.split(","):
+        scale = scale.strip().lower()
+        counts.append(SCALES[scale] if scale in SCALES else int(scale))
+    return counts
+
+
+def _print_result(result):
+    label = f"{result['name']} [{result['count']}]"
+    if "skipped" in result:
+        print(f"{label:60} skipped: {result['skipped']}")
+    else:
+        print(
+            f"{label:60} {result['median'] * 1000:10.2f} ms"
+            f" {result['ops_per_sec'] or 0:14.0f} ops/s"
+        )
+
+
+def main(argv=None):
+    """Runs the benchmarks from the command line and returns the exit code"""
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks", description="Time the contact manager hot paths."
+    )
+    parser.add_argument(
+        "--scales", default=DEFAULT_SCALES,
+        help=f"comma-separated scales: {', '.join(SCALES)} or contact counts "
+             f"(default: {DEFAULT_SCALES})",
+    )
+    parser.add_argument("--repeat", type=int, default=DEFAULT_REPEAT)
+    parser.add_argument("--filter", help="only run benchmarks whose name contains this")
+    parser.add_argument("--data-dir", default=DEFAULT_DATA_DIR)
+    parser.add_argument("--output", help="write the results to this JSON file")
+    parser.add_argument("--compare", metavar="BASELINE", help="results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD)
+    args = parser.parse_args(argv)
+
+    results = run_benchmarks(
+        parse_scales(args.scales),
+        repeat=args.repeat,
+        data_dir=args.data_dir,
+        name_filter=args.filter,
+        report=_print_result,
+    )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(results, file, indent=2)
+
+    if not args.compare:
+        return 0
+
+    with open(args.compare, encoding="utf-8") as file:
+        baseline = json.load(file)
+
+    print()
+    regressions = 0
+    for name, count, ratio, status in compare(baseline, results, args.threshold):
+        label = f"{name} [{count}]"
+        print(f"{label:60} {ratio:6.2f}x  {status}")
+        regressions += status == "regression"
+
+    if regressions:
+        print(f"\n{regressions} regression(s) above {args.threshold:.0%}", file=sys.stderr)
+        return 1
+    return 0
@@ -0,0 +1,386 @@
+import argparse
+import gzip
+import json
+import os
+import shutil
+import sys
+import tempfile
+from itertools import islice
+from model.changes import read_changes, write_changes
+from model.contact_model import DUPLICATE_MODES
+from model.fuzzy import DEFAULT_FUZZY_LIMIT
+from model.export_formats import EXPORT_FORMATS, format_for_path
+from model.import_export_model import ImportExportModel
+from model.instrumentation import instrumentation
+from model.sharded_model import DEFAULT_SHARD_COUNT, open_model, reshard
+
+
+# Exit codes
+EXIT_OK = 0
+EXIT_ERROR = 1
+EXIT_USAGE = 2  # Also used by argparse
+EXIT_EMPTY = 3  # Nothing matched the search, or the input held no contacts
+EXIT_INTERRUPTED = 130
+
+# Database used when neither --db nor CONTACTS_DB is given
+DEFAULT_DB_PATH = "contacts.db"
+
+# Path argument meaning stdin or stdout
+STDIO = "-"
+
+
+def build_parser():
+    """Builds the argument parser for every subcommand"""
+    parser = argparse.ArgumentParser(
+        prog="python -m contacts",
+        description="Manage the contacts database without the GUI.",
+    )
+    parser.add_argument(
+        "--db",
+        default=os.environ.get("CONTACTS_DB", DEFAULT_DB_PATH),
+        help="database file or sharded store directory (default: $CONTACTS_DB or contacts.db)",
+    )
+    parser.add_argument(
+        "--json", action="store_true", help="print machine-readable JSON"
+    )
+
+    parser.add_argument(
+        "--metrics", metavar="FILE",
+        help="write operation timings to FILE (JSON for .json, Prometheus text otherwise)",
+    )
+    parser.add_argument(
+        "--slow-ms", type=float,
+        help="log operations slower than this many milliseconds with their query plans",
+    )
+
+    # Lets --json also follow the subcommand
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument(
+        "--json", action="store_true", default=argparse.SUPPRESS, help=argparse.SUPPRESS
+    )
+
+    commands = parser.add_subparsers(dest="command", metavar="command")
+    commands.required = True
+
+    command = commands.add_parser(
+        "import", parents=[common], help='import "name, phone" lines'
+    )
+    command.add_argument("file", nargs="?", default=STDIO, help="input file or - for stdin")
+    command.add_argument(
+        "--on-duplicate", choices=DUPLICATE_MODES, default="keep",
+        help="what to do with phones that are already stored",
+    )
+    command.add_argument("--encoding", help="input encoding (default: guessed)")
+    command.add_argument("--batch-size", type=int, default=None)
+    command.add_argument("--workers", type=int, default=None, help="parser processes")
+    command.add_argument(
+        "--no-atomic", dest="atomic", action="store_false",
+        help="commit every batch instead of the whole import at once",
+    )
+    command.set_defaults(handler=import_command)
+
+    command = commands.add_parser(
+        "export", parents=[common], help="export every contact"
+    )
+    command.add_argument("file", nargs="?", default=STDIO, help="output file or - for stdout")
+    command.add_argument(
+        "--format", choices=sorted(EXPORT_FORMATS),
+        help="output format (default: from the file extension, else txt)",
+    )
+    command.add_argument("--gzip", action="store_true", help="gzip the output")
+    command.set_defaults(handler=export_command)
+
+    command = commands.add_parser(
+        "export-changes", parents=[common],
+        help="export the contacts changed since a sync (JSON Lines)",
+    )
+    command.add_argument("file", nargs="?", default=STDIO, help="output file or - for stdout")
+    command.add_argument(
+        "--since", type=int, default=0,
+        help="next_since reported by the previous export (default: every contact)",
+    )
+    command.set_defaults(handler=export_changes_command)
+
+    command = commands.add_parser(
+        "apply-changes", parents=[common], help="apply changes exported by another database"
+    )
+    command.add_argument("file", nargs="?", default=STDIO, help="input file or - for stdin")
+    command.set_defaults(handler=apply_changes_command)
+
+    command = commands.add_parser(
+        "search", parents=[common], help="print the contacts matching a text"
+    )
+    command.add_argument("text")
+    command.add_argument("--limit", type=int, default=None)
+    command.add_argument(
+        "--fuzzy", action="store_true",
+        help=f"best matches first, tolerating typos (default --limit {DEFAULT_FUZZY_LIMIT})",
+    )
+    command.set_defaults(handler=search_command)
+
+    command = commands.add_parser(
+        "lookup", parents=[common], help="print the contacts with a phone number"
+    )
+    command.add_argument("phone")
+    command.set_defaults(handler=lookup_command)
+
+    command = commands.add_parser(
+        "count", parents=[common], help="count all or matching contacts"
+    )
+    command.add_argument("text", nargs="?", default="")
+    command.set_defaults(handler=count_command)
+
+    command = commands.add_parser(
+        "stats", parents=[common], help="show database statistics"
+    )
+    command.set_defaults(handler=stats_command)
+
+    command = commands.add_parser(
+        "vacuum", parents=[common], help="compact the database file"
+    )
+    command.set_defaults(handler=vacuum_command)
+
+    command = commands.add_parser(
+        "reshard", parents=[common], help="copy the contacts into a new sharded store"
+    )
+    command.add_argument("destination", help="directory of the new store (must not exist)")
+    command.add_argument("--shards", type=int, default=DEFAULT_SHARD_COUNT)
+    command.set_defaults(handler=reshard_command)
+
+    return parser
+
+
+def main(argv=None):
+    """Runs the command line interface and returns the exit code"""
+    args = build_parser().parse_args(argv)
+    if args.metrics or args.slow_ms is not None:
+        slow_threshold = None if args.slow_ms is None else args.slow_ms / 1000
+        instrumentation.enable(slow_threshold=slow_threshold)
+
+    try:
+        with open_model(args.db) as model:
+            return args.handler(model, args)
+    except KeyboardInterrupt:
+        return EXIT_INTERRUPTED
+    except BrokenPipeError:
+        # The reader went away (e.g. piped into head); silence the flush at exit
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+        return EXIT_ERROR
+    except Exception as e:
+        print(f"error: {e}", file=sys.stderr)
+        return EXIT_ERROR
+    finally:
+        if args.metrics:
+            instrumentation.write(args.metrics)
+
+
+def _print_result(args, result, text):
+    """Prints result as JSON with --json, otherwise the text"""
+    if args.json:
+        print(json.dumps(result, ensure_ascii=False))
+    else:
+        print(text)
+
+
+def import_command(model, args):
+    """Imports a file or stdin"""
+    options = {
+        "atomic": args.atomic,
+        "workers": args.workers,
+        "encoding": args.encoding,
+        "on_duplicate": args.on_duplicate,
+    }
+    if args.batch_size:
+        options["batch_size"] = args.batch_size
+
+    importer = ImportExportModel(model)
+    if args.file != STDIO:
+        result = importer.import_contacts(args.file, **options)
+    else:
+        # The importer memory-maps its input, so spool stdin to a file first
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "stdin.txt")
+            with open(path, "wb") as file:
+                shutil.copyfileobj(sys.stdin.buffer, file)
+            result = importer.import_contacts(path, **options)
+
+    if not args.json:
+        for line in result.invalid_lines:
+            print(line, file=sys.stderr)
+    _print_result(
+        args,
+        result._asdict(),
+        f"Imported {result.inserted} contact(s), updated {result.updated}, "
+        f"skipped {result.skipped}, {len(result.invalid_lines)} invalid line(s)",
+    )
+
+    if result.inserted + result.updated + result.skipped > 0:
+        return EXIT_OK
+    return EXIT_ERROR if result.invalid_lines else EXIT_EMPTY
+
+
+def export_command(model, args):
+    """Exports to a file or stdout"""
+    to_stdout = args.file == STDIO
+    export_format = args.format
+    if export_format is None:
+        export_format = "txt" if to_stdout else format_for_path(args.file).name
+    compress = args.gzip or (not to_stdout and args.file.lower().endswith(".gz"))
+
+    exporter = ImportExportModel(model)
+    if to_stdout:
+        count = exporter.export_contacts_to_stream(sys.stdout.buffer, export_format, compress)
+    else:
+        # Opened outside the try: a file that could not be created is not removed
+        file = open(args.file, "wb")
+        try:
+            with file:
+                count = exporter.export_contacts_to_stream(file, export_format, compress)
+        except BaseException:
+            os.unlink(args.file)
+            raise
+
+    result = {"exported": count, "format": export_format, "file": args.file}
+    if to_stdout:
+        # Keep stdout for the contacts
+        if args.json:
+            print(json.dumps(result), file=sys.stderr)
+    else:
+        _print_result(args, result, f"Exported {count} contact(s) to {args.file}")
+    return EXIT_OK
+
+
+def _open_changes(path, mode):
+    """Opens a changes file as UTF-8 text, gzipped if its name ends in .gz"""
+    if path == STDIO:
+        stream = sys.stdout if mode == "w" else sys.stdin
+        return open(stream.fileno(), mode, encoding="utf-8", closefd=False)
+    if path.lower().endswith(".gz"):
+        return gzip.open(path, mode + "t", encoding="utf-8")
+    return open(path, mode, encoding="utf-8")
+
+
+def _check_change_journal(model):
+    """Whether the model keeps a change journal, printing an error if not"""
+    if hasattr(model, "export_changes"):
+        return True
+    print("error: sharded stores do not keep a change journal", file=sys.stderr)
+    return False
+
+
+def export_changes_command(model, args):
+    """Exports the changes made since --since to a file or stdout"""
+    if not _check_change_journal(model):
+        return EXIT_USAGE
+
+    # Changes made during the export are exported again next time, which
+    # applying them tolerates
+    next_since = model.get_change_seq()
+    if args.file == STDIO:
+        sys.stdout.flush()
+    # Opened outside the try: a file that could not be created is not removed
+    file = _open_changes(args.file, "w")
+    try:
+        with file:
+            count = write_changes(file, model.export_changes(args.since))
+    except BaseException:
+        if args.file != STDIO:
+            os.unlink(args.file)
+        raise
+
+    result = {"changes": count, "next_since": next_since, "file": args.file}
+    if args.file == STDIO:
+        # Keep stdout for the changes
+        if args.json:
+            print(json.dumps(result), file=sys.stderr)
+    else:
+        _print_result(
+            args, result,
+            f"Exported {count} change(s) to {args.file}; next --since {next_since}",
+        )
+    return EXIT_OK
+
+
+def apply_changes_command(model, args):
+    """Applies a changes file or stdin"""
+    if not _check_change_journal(model):
+        return EXIT_USAGE
+
+    with _open_changes(args.file, "r") as file:
+        result = model.apply_changes(read_changes(file))
+    _print_result(
+        args,
+        result._asdict(),
+        f"Applied changes: inserted {result.inserted}, updated {result.updated}, "
+        f"deleted {result.deleted}",
+    )
+    return EXIT_OK
+
+
+def _print_contacts(args, contacts):
+    """Prints contacts as tab-separated lines or JSON Lines and returns the exit code"""
+    found = False
+    for contact in contacts:
+        found = True
+        if args.json:
+            record = {"id": contact.contact_id, "name": contact.name, "phone": contact.phone}
+            print(json.dumps(record, ensure_ascii=False))
+        else:
+            print(f"{contact.contact_id}\t{contact.name}\t{contact.phone}")
+    return EXIT_OK if found else EXIT_EMPTY
+
+
+def search_command(model, args):
+    """Prints the contacts matching a text"""
+    if args.fuzzy:
+        limit = DEFAULT_FUZZY_LIMIT if args.limit is None else args.limit
+        return _print_contacts(args, model.fuzzy_search(args.text, limit))
+    contacts = model.iter_contacts(search_text=args.text)
+    if args.limit is not None:
+        contacts = islice(contacts, args.limit)
+    return _print_contacts(args, contacts)
+
+
+def lookup_command(model, args):
+    """Prints the contacts with a phone number, ignoring its formatting"""
+    return _print_contacts(args, model.lookup_by_phone(args.phone))
+
+
+def count_command(model, args):
+    """Prints the number of contacts matching the text"""
+    count = model.count_contacts(args.text)
+    _print_result(args, {"count": count}, str(count))
+    return EXIT_OK
+
+
+def stats_command(model, args):
+    """Prints database statistics"""
+    stats = model.get_stats()
+    _print_result(args, stats, "\n".join(f"{key}: {value}" for key, value in stats.items()))
+    return EXIT_OK
+
+
+def vacuum_command(model, args):
+    """Compacts the database file"""
+    before, after = model.vacuum()
+    _print_result(
+        args,
+        {"size_before": before, "size_after": after},
+        f"Database size: {before} -> {after} bytes",
+    )
+    return EXIT_OK
+
+
+def reshard_command(model, args):
+    """Copies the database into a new sharded store"""
+    if args.shards < 1:
+        print("error: --shards must be at least 1", file=sys.stderr)
+        return EXIT_USAGE
+    count = reshard(model, args.destination, args.shards)
+    _print_result(
+        args,
+        {"contacts": count, "shards": args.shards, "destination": args.destination},
+        f"Copied {count} contact(s) into {args.destination} ({args.shards} shards)",
+    )
+    return EXIT_OK
@@ -1,13 +1,75 @@
+import threading
+from PyQt5.QtCore import QThreadPool, QTimer
+from model.contact_cache import ContactCache
 from model.contact_model import ContactModel
-from model.import_export_model import ImportExportModel
-from view.contact_dialog import ContactDialog
+from model.fuzzy import DEFAULT_FUZZY_LIMIT
+from model.instrumentation import timed
+from controller.workers import JobWorker, Worker
+
+# Time to wait after the last keystroke before searching
+SEARCH_DELAY_MS = 250
+
+# How often to check whether another program modified the database
+EXTERNAL_CHANGES_INTERVAL_MS = 2000
 
 
 class ContactController:
-    def __init__(self, view):
+    def __init__(self, view, search_delay_ms=SEARCH_DELAY_MS, db_path="contacts.db",
+                 on_first_page=None, contact_model=None):
+        """Connects the view to the contacts database
+
+        contact_model is any ContactRepository to use instead of opening
+        db_path, for example an InMemoryContactModel; the controller closes
+        it when the window closes. Nothing is loaded here: the first page
+        and the contact cache are read on worker threads, so the window can
+        be shown right away.
+        on_first_page() is called once the first page is in the table.
+        """
         self.view = view
-        self.model = ContactModel()
-        self.import_export_model = ImportExportModel(self.model)
+        if contact_model is None:
+            # Existing rows of an upgraded database are filled in the background
+            contact_model = ContactModel(db_path, defer_backfills=True)
+        self.model = contact_model
+        self._import_export_model = None
+        self.on_first_page = on_first_page
+
+        # Contacts are edited through an in-memory cache that keeps the
+        # unfiltered list sorted and reports single-row changes, so the table
+        # is updated in place instead of being reloaded. Until the cache is
+        # loaded (and while searching) the table reads pages from the database.
+        self.cache = ContactCache(self.model)
+        self.cache.add_listener(self._on_cache_changed)
+        self._showing_database_pages = False
+        self.cache_pool = QThreadPool()
+        self.cache_pool.setMaxThreadCount(1)
+        self._cache_generation = 0
+        self._cache_loading = False
+
+        self.external_changes_timer = QTimer()
+        self.external_changes_timer.setInterval(EXTERNAL_CHANGES_INTERVAL_MS)
+        self.external_changes_timer.timeout.connect(self._check_for_external_changes)
+
+        # Migration backfills run on their own thread. Their commits would
+        # look like external changes, so the timer starts once they finish.
+        self.backfill_pool = QThreadPool()
+        self.backfill_pool.setMaxThreadCount(1)
+        self._backfills_cancelled = threading.Event()
+
+        # Search pipeline: keystrokes restart a debounce timer and the query
+        # runs on a single worker thread. Each search gets a generation number
+        # so results of superseded searches are discarded.
+        self.search_timer = QTimer()
+        self.search_timer.setSingleShot(True)
+        self.search_timer.setInterval(search_delay_ms)
+        self.search_timer.timeout.connect(self.filter_contacts)
+        self.search_pool = QThreadPool()
+        self.search_pool.setMaxThreadCount(1)
+        self._search_generation = 0
+
+        # Imports and exports run one at a time on their own thread
+        self.job_pool = QThreadPool()
+        self.job_pool.setMaxThreadCount(1)
+        self._job = None  # The running JobWorker, cancelled by close
 
         # Connect view signals with controller methods
         self.view.btn_new.clicked.connect(self.create_contact)
@@ -15,18 +77,94 @@ class ContactController:
         self.view.btn_delete.clicked.connect(self.delete_contact)
         self.view.btn_export.clicked.connect(self.export_contacts)
         self.view.btn_import.clicked.connect(self.import_contacts)
-        self.view.search_input.textChanged.connect(self.filter_contacts)
+        self.view.search_input.textChanged.connect(lambda: self.search_timer.start())
+        self.view.fuzzy_checkbox.toggled.connect(lambda: self.search_timer.start())
 
         # Load initial contacts (if any)
         self.refresh_contacts()
+        self._load_cache()
+        self._run_backfills()
+
+    @property
+    def import_export_model(self):
+        """Import/export model, created on first use to keep startup fast"""
+        if self._import_export_model is None:
+            from model.import_export_model import ImportExportModel
+
+            self._import_export_model = ImportExportModel(self.model)
+        return self._import_export_model
+
+    def _load_cache(self):
+        """Loads or reloads the contact cache on a worker thread
+
+        The cache keeps serving its current contacts until the snapshot
+        arrives. A snapshot is dropped if a newer load started meanwhile, and
+        read again if an edit went through the cache while it was loading.
+        """
+        self._cache_generation += 1
+        generation = self._cache_generation
+        self._cache_loading = True
+        data_version = self.model.get_data_version()
+        edit_count = self.cache.edit_count
+
+        def apply(snapshot):
+            if generation != self._cache_generation:
+                return
+            if self.cache.edit_count != edit_count:
+                self._load_cache()
+                return
+            self._cache_loading = False
+            self.cache.apply_snapshot(snapshot, data_version)
+
+        def fail(message):
+            if generation == self._cache_generation:
+                self._cache_loading = False
+            self.view.show_error(f"Error loading contacts: {message}")
+
+        worker = Worker(self.cache.load_snapshot)
+        worker.signals.finished.connect(apply)
+        worker.signals.error.connect(fail)
+        self.cache_pool.start(worker)
+
+    def _run_backfills(self):
+        """Fills the rows of deferred migrations on a worker thread"""
+        worker = Worker(self.model.run_backfills, cancelled=self._backfills_cancelled.is_set)
+        worker.signals.finished.connect(lambda finished: self._backfills_finished())
+        worker.signals.error.connect(
+            lambda message: self._backfills_finished(f"Error upgrading the database: {message}")
+        )
+        self.backfill_pool.start(worker)
+
+    def _backfills_finished(self, error=None):
+        """Starts watching for external changes once the backfills are done"""
+        if self._backfills_cancelled.is_set():
+            return  # Closing
+        if error is not None:
+            self.view.show_error(error)
+        # Searches now use the filled indexes; catch up with any commit made
+        # by another program meanwhile
+        self._check_for_external_changes()
+        self.external_changes_timer.start()
+
+    def _check_for_external_changes(self):
+        """Reloads the cache in the background if another program changed the database"""
+        if not self._cache_loading and self.cache.is_stale():
+            self._load_cache()
+
+    def _first_page_shown(self):
+        """Calls on_first_page after the first page has been shown"""
+        if self.on_first_page is not None:
+            callback, self.on_first_page = self.on_first_page, None
+            callback()
 
     def create_contact(self):
         """Creates a new contact"""
+        from view.contact_dialog import ContactDialog
+
         dialog = ContactDialog(self.view)
         if dialog.exec_():
             data = dialog.get_data()
-            contact_id = self.model.add_contact(data["name"], data["phone"])
-            self.refresh_contacts()
+            self.cache.add_contact(data["name"], data["phone"])
             self.view.show_info(f"Contact '{data['name']}' created successfully.")
 
     def edit_contact(self):
@@ -36,18 +174,19 @@ class ContactController:
             self.view.show_error("You must select a contact to edit.")
             return
 
-        contact = self.model.get_contact(contact_id)
+        contact = self.cache.get_contact(contact_id)
         if contact is None:
             self.view.show_error("The selected contact no longer exists.")
             self.refresh_contacts()
             return
 
+        from view.contact_dialog import ContactDialog
+
         dialog = ContactDialog(self.view, contact)
         if dialog.exec_():
             data = dialog.get_data()
-            success = self.model.update_contact(contact_id, data["name"], data["phone"])
+            success = self.cache.update_contact(contact_id, data["name"], data["phone"])
             if success:
-                self.refresh_contacts()
                 self.view.show_info(f"Contact '{data['name']}' updated successfully.")
             else:
                 self.view.show_error("Could not update the contact.")
@@ -59,62 +198,197 @@ class ContactController:
             self.view.show_error("You must select a contact to delete.")
             return
 
-        contact = self.model.get_contact(contact_id)
+        contact = self.cache.get_contact(contact_id)
         if contact is None:
             self.view.show_error("The selected contact no longer exists.")
             self.refresh_contacts()
             return
 
         if self.view.confirm_delete():
-            success = self.model.delete_contact(contact_id)
+            success = self.cache.delete_contact(contact_id)
             if success:
-                self.refresh_contacts()
                 self.view.show_info(f"Contact '{contact.name}' deleted successfully.")
             else:
                 self.view.show_error("Could not delete the contact.")
 
     def export_contacts(self):
-        """Exports contacts to a text file"""
+        """Exports contacts to a text file in the background"""
         # Get file path from dialog
         file_path = self.view.export_contacts_dialog()
         if not file_path:
             return  # User cancelled the dialog
 
         # Use the import/export model to handle the export
-        success, message = self.import_export_model.export_contacts_to_file(file_path)
-
-        # Show result message
-        if success:
-            self.view.show_info(message)
-        else:
-            self.view.show_error(message)
+        self._start_job(
+            "Exporting contacts...",
+            self.import_export_model.export_contacts_to_file,
+            file_path,
+            on_finished=self._show_result,
+        )
 
     def import_contacts(self):
-        """Imports contacts from a text file"""
+        """Imports contacts from a text file in the background"""
         # Get file path from dialog
         file_path = self.view.import_contacts_dialog()
         if not file_path:
             return  # User cancelled the dialog
 
+        on_duplicate = self.view.ask_duplicate_mode()
+        if on_duplicate is None:
+            return  # User cancelled the dialog
+
         # Use the import/export model to handle the import
-        success, message = self.import_export_model.import_contacts_from_file(file_path)
+        self._start_job(
+            "Importing contacts...",
+            self.import_export_model.import_contacts_from_file,
+            file_path,
+            on_finished=self._import_finished,
+            on_duplicate=on_duplicate,
+        )
 
-        # Refresh contacts list
-        self.refresh_contacts()
+    def _import_finished(self, result):
+        """Reloads the contacts after an import and shows the result"""
+        # Reload the cache in the background, which refreshes the contacts list
+        self._load_cache()
+        self._show_result(result)
 
-        # Show result message
+    def _show_result(self, result):
+        """Shows the (success, message) result of an import or export"""
+        success, message = result
         if success:
             self.view.show_info(message)
         else:
             self.view.show_error(message)
 
+    def _start_job(self, title, fn, *args, on_finished, **kwargs):
+        """Runs fn on the job pool with a progress dialog that can cancel it
+
+        The job runs on its own thread and therefore its own database
+        connection; on_finished receives the job's result on the GUI thread.
+        """
+        dialog = self.view.create_progress_dialog(title)
+        job = JobWorker(fn, *args, **kwargs)
+        self._job = job
+
+        def finish(result):
+            self._job = None
+            dialog.close()
+            on_finished(result)
+
+        def fail(message):
+            self._job = None
+            dialog.close()
+            self.view.show_error(message)
+
+        job.signals.progress.connect(dialog.update_progress)
+        job.signals.finished.connect(finish)
+        job.signals.error.connect(fail)
+        dialog.canceled.connect(job.cancel)
+
+        dialog.show()
+        self.job_pool.start(job)
+
+    def close(self):
+        """Releases the database connections held by the controller"""
+        self.search_timer.stop()
+        self.external_changes_timer.stop()
+        self._search_generation += 1
+        # Unfinished backfills resume the next time the database is opened
+        self._backfills_cancelled.set()
+        self.backfill_pool.waitForDone()
+        self.search_pool.waitForDone()
+        self.cache_pool.waitForDone()
+        # A running import or export stops at its next progress report, as
+        # if its progress dialog had been cancelled
+        if self._job is not None:
+            self._job.cancel()
+        self.job_pool.waitForDone()
+        self.model.close()
+
     def refresh_contacts(self):
         """Updates the contact list in the view"""
-        contacts = self.model.get_all_contacts()
-        self.view.show_contacts(contacts)
+        self.filter_contacts()
 
+    @timed
     def filter_contacts(self):
-        """Filters contacts based on search text"""
+        """Filters contacts based on search text in the background"""
         search_text = self.view.search_input.text().strip().lower()
-        filtered_contacts = self.model.filter_contacts(search_text)
-        self.view.show_contacts(filtered_contacts)
+        fuzzy = self.view.fuzzy_checkbox.isChecked()
+
+        self._search_generation += 1
+        generation = self._search_generation
+
+        if not search_text and self.cache.loaded:
+            # The full list is served from the cache
+            self._showing_database_pages = False
+            self.view.show_contacts(self.cache.page_contacts)
+            self._first_page_shown()
+            return
+        page_size = self.view.table_model.page_size
+
+        worker = Worker(self._run_search, generation, search_text, page_size, fuzzy)
+        worker.signals.finished.connect(
+            lambda first_page: self._show_search_result(generation, search_text, first_page, fuzzy)
+        )
+        worker.signals.error.connect(
+            lambda message: self._show_search_error(generation, message)
+        )
+        self.search_pool.start(worker)
+
+    def _run_search(self, generation, search_text, page_size, fuzzy=False):
+        """Fetches the first page of results on the worker thread
+
+        A fuzzy search fetches all of its (at most DEFAULT_FUZZY_LIMIT)
+        results, best first, as its only page.
+        """
+        if generation != self._search_generation:
+            return None  # Superseded while waiting in the queue
+        if fuzzy:
+            return self.model.fuzzy_search(search_text, DEFAULT_FUZZY_LIMIT)
+        return self.model.page_contacts(None, page_size, search_text)
+
+    @timed
+    def _show_search_result(self, generation, search_text, first_page, fuzzy=False):
+        """Shows the search result if no newer search has started"""
+        if generation != self._search_generation:
+            return
+        self._showing_database_pages = True
+        self.view.show_contacts(self._contacts_source(search_text, first_page, fuzzy))
+        self._first_page_shown()
+
+    def _show_search_error(self, generation, message):
+        """Reports a failed search if no newer search has started"""
+        if generation != self._search_generation:
+            return
+        self.view.show_error(f"Error searching contacts: {message}")
+
+    def _contacts_source(self, search_text, first_page=None, fuzzy=False):
+        """Returns a fetch_page(after, limit) function for the view"""
+
+        def fetch_page(after, limit):
+            if after is None and first_page is not None:
+                return first_page[:limit]
+            if fuzzy:
+                # The first page held every result
+                return []
+            return self.model.page_contacts(after, limit, search_text)
+
+        return fetch_page
+
+    @timed
+    def _on_cache_changed(self, event):
+        """Applies a cache change to the contacts table"""
+        if event.kind == "reset" or self._showing_database_pages:
+            # Pages read from the database (search results, or the full list
+            # before the cache was loaded) cannot be patched row by row
+            self.refresh_contacts()
+            return
+
+        table_model = self.view.table_model
+        if event.kind == "inserted":
+            table_model.insert_contact(event.row, event.contact)
+        elif event.kind == "changed":
+            table_model.update_contact(event.row, event.new_row, event.contact)
+        elif event.kind == "removed":
+            table_model.remove_contact(event.row)
+        self.view.on_selection_changed()
@@ -0,0 +1,69 @@
+import builtins
+import sys
+import time
+
+# Imports listed in the startup report
+REPORT_IMPORTS = 15
+
+
+class StartupReport:
+    def __init__(self):
+        """Records how long each startup phase and module import takes
+
+        Similar to python -X importtime, but limited to the application's
+        startup and printed together with the phase timings once the first
+        page of contacts is shown.
+        """
+        self.started = time.perf_counter()
+        self.phases = []  # (label, seconds since start)
+        self.imports = []  # (module, self seconds, cumulative seconds)
+        self._children = []  # Time spent in nested imports, per open import
+        self._original_import = None
+
+    def track_imports(self):
+        """Starts timing every module imported for the first time"""
+        self._original_import = builtins.__import__
+        builtins.__import__ = self._import
+
+    def _import(self, name, globals=None, locals=None, fromlist=(), level=0):
+        if level or name in sys.modules:
+            return self._original_import(name, globals, locals, fromlist, level)
+
+        self._children.append(0.0)
+        started = time.perf_counter()
+        try:
+            return self._original_import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.perf_counter() - started
+            children = self._children.pop()
+            if self._children:
+                self._children[-1] += elapsed
+            self.imports.append((name, elapsed - children, elapsed))
+
+    def mark(self, label):
+        """Records that a startup phase ended"""
+        self.phases.append((label, time.perf_counter() - self.started))
+
+    def finish(self, file=None):
+        """Stops timing imports and prints the report"""
+        if self._original_import is not None:
+            builtins.__import__ = self._original_import
+            self._original_import = None
+        self.mark("first page shown (interactive)")
+
+        file = file or sys.stderr
+        print("Startup report", file=file)
+        previous = 0.0
+        for label, elapsed in self.phases:
+            print(
+                f"  {elapsed * 1000:8.1f} ms  (+{(elapsed - previous) * 1000:7.1f})  {label}",
+                file=file,
+            )
+            previous = elapsed
+
+        print("Slowest imports (self | cumulative):", file=file)
+        slowest = sorted(self.imports, key=lambda item: item[2], reverse=True)
+        for name, self_time, cumulative in slowest[:REPORT_IMPORTS]:
+            print(
+                f"  {self_time * 1000:8.1f} | {cumulative * 1000:8.1f} ms  {name}", file=file
+            )
@@ -0,0 +1,54 @@
+import threading
+from PyQt5.QtCore import QObject, QRunnable, pyqtSignal
+
+
+class WorkerSignals(QObject):
+    """Signals used by a Worker to report back to the GUI thread"""
+
+    finished = pyqtSignal(object)
+    error = pyqtSignal(str)
+    progress = pyqtSignal(int, float)
+
+
+class Worker(QRunnable):
+    def __init__(self, fn, *args, **kwargs):
+        """Runs fn(*args, **kwargs) on a thread pool thread"""
+        super().__init__()
+        self.fn = fn
+        self.args = args
+        self.kwargs = kwargs
+        self.signals = WorkerSignals()
+
+    def run(self):
+        """Execute the function and emit its result or error"""
+        try:
+            result = self.fn(*self.args, **self.kwargs)
+        except Exception as e:
+            self.signals.error.emit(str(e))
+            return
+        self.signals.finished.emit(result)
+
+
+class JobWorker(Worker):
+    def __init__(self, fn, *args, **kwargs):
+        """Runs a long job that reports progress and can be cancelled
+
+        fn receives a progress_callback(count, fraction) keyword argument that
+        emits the progress signal, and raises OperationCancelled once cancel()
+        has been called.
+        """
+        super().__init__(fn, *args, **kwargs)
+        self._cancelled = threading.Event()
+        self.kwargs["progress_callback"] = self._report_progress
+
+    def cancel(self):
+        """Ask the job to stop at its next progress report"""
+        self._cancelled.set()
+
+    def _report_progress(self, count, fraction):
+        if self._cancelled.is_set():
+            # Imported here so the import/export machinery loads on first use
+            from model.import_export_model import OperationCancelled
+
+            raise OperationCancelled()
+        self.signals.progress.emit(count, fraction)
@@ -1,27 +1,130 @@
+import argparse
+import sqlite3
 import sys
-from PyQt5.QtWidgets import QApplication
-from view.main_window import MainWindow
-from controller.contact_controller import ContactController
+
+
+def parse_args(argv=None):
+    """Parses the command line arguments"""
+    parser = argparse.ArgumentParser(description="Contact manager")
+    parser.add_argument("--db", default="contacts.db", help="database file")
+    parser.add_argument(
+        "--migrate",
+        action="store_true",
+        help="upgrade the database schema and exit without starting the GUI",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="with --migrate, list the pending migrations without applying them",
+    )
+    parser.add_argument(
+        "--metrics",
+        metavar="FILE",
+        help="collect operation timings and write them to FILE on exit "
+             "(JSON for .json, Prometheus text otherwise)",
+    )
+    parser.add_argument(
+        "--slow-ms",
+        type=float,
+        help="log operations slower than this many milliseconds with their query plans",
+    )
+    parser.add_argument(
+        "--startup-report",
+        action="store_true",
+        help="print how long each startup phase and module import took",
+    )
+    return parser.parse_known_args(argv)
+
+
+def enable_instrumentation(args):
+    """Turns on the instrumentation when --metrics or --slow-ms is given"""
+    if args.metrics is None and args.slow_ms is None:
+        return
+    from model.instrumentation import instrumentation
+
+    slow_threshold = None if args.slow_ms is None else args.slow_ms / 1000
+    instrumentation.enable(slow_threshold=slow_threshold)
+
+
+def run_migrations(db_path, dry_run=False):
+    """Upgrades the database schema, printing every step and its duration"""
+    from model.migrations import get_version, latest_version, migrate
+
+    conn = sqlite3.connect(db_path)
+    try:
+        print(f"Schema version {get_version(conn)}, latest {latest_version()}")
+
+        def report(step):
+            action = "Applied" if step.applied else "Pending"
+            print(
+                f"{action} {step.version}: {step.description} "
+                f"({step.duration * 1000:.1f} ms)"
+            )
+
+        steps = migrate(conn, dry_run=dry_run, report=report)
+        if not steps:
+            print("Database is up to date")
+    finally:
+        conn.close()
+    return 0
+
 
 def main():
     """Main function to start the application"""
+    args, qt_args = parse_args()
+    if args.migrate:
+        sys.exit(run_migrations(args.db, args.dry_run))
+
+    enable_instrumentation(args)
+
+    report = None
+    if args.startup_report:
+        from controller.startup import StartupReport
+
+        report = StartupReport()
+        report.track_imports()
+
+    def mark(label):
+        if report:
+            report.mark(label)
+
+    from PyQt5.QtWidgets import QApplication
+    from view.main_window import MainWindow
+    from controller.contact_controller import ContactController
+    mark("modules imported")
+
     # Create Qt application
-    app = QApplication(sys.argv)
-    
+    app = QApplication(sys.argv[:1] + qt_args)
+
     # Set global style
     app.setStyle("Fusion")
-    
+    mark("application created")
+
     # Create main window
     main_window = MainWindow()
-    
-    # Create contact controller and connect it with the view
-    contact_controller = ContactController(main_window)
-    
+    mark("main window created")
+
+    # Create contact controller and connect it with the view; contacts are
+    # loaded in the background once the event loop runs
+    contact_controller = ContactController(
+        main_window, db_path=args.db, on_first_page=report.finish if report else None
+    )
+    mark("controller created")
+
     # Show main window
     main_window.show()
-    
+    mark("window shown")
+
     # Run event loop
-    sys.exit(app.exec_())
+    exit_code = app.exec_()
+
+    # Close database connections before exiting
+    contact_controller.close()
+    if args.metrics:
+        from model.instrumentation import instrumentation
+
+        instrumentation.write(args.metrics)
+    sys.exit(exit_code)
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    main()
@@ -0,0 +1,49 @@
+import json
+from collections import namedtuple
+
+
+# A contact's latest change: its current name and phone, both None when it
+# was deleted. seq numbers the changes of the database that exported it.
+Change = namedtuple("Change", ["seq", "uid", "name", "phone"])
+
+# Result of apply_changes. last_seq is the seq of the last change applied
+# (None if there were none), to export the next changes from.
+ChangeResult = namedtuple("ChangeResult", ["inserted", "updated", "deleted", "last_seq"])
+
+
+def write_changes(file, changes):
+    """Writes changes to a text file as JSON Lines and returns how many
+
+    Each line is [seq, uid, name, phone], or [seq, uid] for a deletion.
+    """
+    count = 0
+    for change in changes:
+        if change.name is None:
+            record = [change.seq, change.uid]
+        else:
+            record = list(change)
+        file.write(json.dumps(record, ensure_ascii=False, separators=(",", ":")))
+        file.write("\n")
+        count += 1
+    return count
+
+
+def read_changes(file):
+    """Yields the Changes written by write_changes to a text file"""
+    for line_number, line in enumerate(file, 1):
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+            if len(record) == 2:
+                record += [None, None]
+            change = Change(*record)
+        except (ValueError, TypeError):
+            raise ValueError(f"Invalid change on line {line_number}") from None
+        valid = isinstance(change.seq, int) and isinstance(change.uid, str) and (
+            change.name is change.phone is None
+            or isinstance(change.name, str) and isinstance(change.phone, str)
+        )
+        if not valid:
+            raise ValueError(f"Invalid change on line {line_number}")
+        yield change
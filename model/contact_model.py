@@ -1,147 +1,938 @@
+import json
 import sqlite3
+import threading
+import weakref
+from array import array
+from itertools import islice
+from model.changes import Change, ChangeResult
+from model.fuzzy import (
+    DEFAULT_FUZZY_LIMIT,
+    PREFIX_END,
+    best_ids,
+    best_score_sets,
+    candidate_words,
+    combine_tiers,
+    edit_budget,
+    fuzzy_words,
+    scan_score_sets,
+    store_contact_words,
+    word_score,
+    word_trigrams,
+)
+from model.instrumentation import instrumentation, timed
+from model.migrations import (
+    FUZZY_INDEX_VERSION,
+    PHONE_DIGITS_VERSION,
+    PHONE_LOOKUP_VERSION,
+    SEARCH_INDEX_VERSION,
+    get_version,
+    migrate,
+    pending_backfills,
+    run_backfill,
+    table_exists,
+)
+from model.phone import MIN_SUFFIX_DIGITS, normalize_phone, phone_key, phones_match
+from model.repository import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_PAGE_SIZE,
+    DUPLICATE_MODES,
+    BulkResult,
+    Contact,
+    ContactColumns,
+    ContactRepository,
+    group_duplicates,
+)
+
+
+# Pragmas applied to every pooled connection
+DEFAULT_PRAGMAS = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,  # 256 MB
+    "cache_size": -65536,  # 64 MB (negative values are KiB)
+    "temp_store": "MEMORY",
+}
+
+# The trigram index can only answer queries of at least this many characters
+MIN_INDEXED_SEARCH_LENGTH = 3
+
+# Words looked up per statement by fuzzy searches
+FUZZY_WORDS_PER_QUERY = 500
+
+# One-word fuzzy searches matching more than 1 / FUZZY_DENSE_FRACTION of the
+# contacts read the first ids in id order instead of every matching id
+FUZZY_DENSE_FRACTION = 50
+
+# Multi-word fuzzy searches read only the matches among the rarest word's
+# contacts for words matching this many times more (looking ids up costs
+# about as much as reading this many matches)
+FUZZY_RESTRICT_RATIO = 3
+
+
+# Statements storing a contact with its normalized phone columns. New
+# contacts get a random uid unless they come from another database.
+_INSERT_CONTACT = (
+    "INSERT INTO contacts (name, phone, phone_digits, phone_e164, phone_reversed, uid) "
+    "VALUES (?, ?, ?, ?, ?, lower(hex(randomblob(16))))"
+)
+_INSERT_SYNCED_CONTACT = (
+    "INSERT INTO contacts (name, phone, phone_digits, phone_e164, phone_reversed, uid) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_UPDATE_CONTACT = (
+    "UPDATE contacts SET name = ?, phone = ?, phone_digits = ?, phone_e164 = ?, "
+    "phone_reversed = ? WHERE id = ?"
+)
+_UPDATE_SYNCED_CONTACT = (
+    "UPDATE contacts SET name = ?, phone = ?, phone_digits = ?, phone_e164 = ?, "
+    "phone_reversed = ? WHERE uid = ?"
+)
+
+
+def _batched(iterable, size):
+    """Yields lists of at most size items from iterable"""
+    iterator = iter(iterable)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+def _fts_phrase(text):
+    """Quotes text as a single FTS5 phrase"""
+    return '"' + text.replace('"', '""') + '"'
+
+
+def _where(conditions):
+    """Joins WHERE conditions with AND (empty when there are none)"""
+    if not conditions:
+        return ""
+    return "WHERE " + " AND ".join(conditions)
+
+
+def _sql_limit(limit):
+    """Converts an optional limit to SQLite's LIMIT value (-1 means no limit)"""
+    return -1 if limit is None else limit
+
+
+def _union_score_sets(*score_sets):
+    """Merges {score: ids} dicts"""
+    merged = {}
+    for sets in score_sets:
+        for score, ids in sets.items():
+            merged.setdefault(score, set()).update(ids)
+    return merged
+
+
+def _contact_factory(cursor, row):
+    """Row factory that builds a Contact straight from a (name, phone, id) row"""
+    return Contact(*row)
+
+
+def _change_factory(cursor, row):
+    """Row factory that builds a Change from a (seq, uid, name, phone) row"""
+    return Change(*row)
 
 
-class Contact:
-    def __init__(self, name="", phone="", contact_id=None):
-        self.name = name
-        self.phone = phone
-        self.contact_id = contact_id
+class _ThreadConnection:
+    """Holds a thread's pooled connection in the pool's thread-local storage
 
+    Thread-local values are released when their thread exits, which closes
+    the connection (see ConnectionPool.get_connection).
+    """
 
-class ContactModel:
-    def __init__(self, db_path="contacts.db"):
-        """Initialize the contact model with SQLite database"""
+    __slots__ = ("connection", "__weakref__")
+
+    def __init__(self, connection):
+        self.connection = connection
+
+
+class ConnectionPool:
+    def __init__(self, db_path, pragmas=None, cached_statements=256):
+        """Initialize a pool of long-lived, per-thread SQLite connections"""
         self.db_path = db_path
-        self._create_table()
+        self.pragmas = dict(DEFAULT_PRAGMAS)
+        if pragmas:
+            self.pragmas.update(pragmas)
+        self.cached_statements = cached_statements
+        self._local = threading.local()
+        # Reentrant: a finalizer may release a connection while it is held
+        self._lock = threading.RLock()
+        self._connections = []
+        self._closed = False
+
+    def get_connection(self):
+        """Returns the calling thread's connection, opening it on first use
+
+        The connection is closed when the thread exits, so short-lived and
+        retired worker threads do not leave connections open.
+        """
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            return holder.connection
+
+        with self._lock:
+            if self._closed:
+                raise sqlite3.ProgrammingError("The connection pool is closed.")
+            conn = self._connect()
+            self._connections.append(conn)
+
+        holder = _ThreadConnection(conn)
+        weakref.finalize(holder, self._release, conn)
+        self._local.holder = holder
+        return conn
 
-    def _get_connection(self):
-        """Get a connection to the SQLite database"""
-        conn = sqlite3.connect(self.db_path)
-        conn.row_factory = sqlite3.Row  # This enables column access by name
+    def _release(self, conn):
+        """Closes the connection of a thread that exited"""
+        with self._lock:
+            if conn not in self._connections:
+                return  # Already closed by close()
+            self._connections.remove(conn)
+            instrumentation.unregister_connection(conn)
+            conn.close()
+
+    def _connect(self):
+        """Open a new connection and apply the configured pragmas"""
+        # The statement cache only pays off because connections are long-lived.
+        # check_same_thread is disabled so close() can shut down connections
+        # opened by worker threads; each connection is still used by one thread.
+        conn = sqlite3.connect(
+            self.db_path,
+            cached_statements=self.cached_statements,
+            check_same_thread=False,
+        )
+        for name, value in self.pragmas.items():
+            conn.execute(f"PRAGMA {name} = {value}")
+        instrumentation.register_connection(conn)
         return conn
 
-    def _create_table(self):
-        """Create the contacts table if it doesn't exist"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        # Create contacts table
-        cursor.execute(
-            """
-            CREATE TABLE IF NOT EXISTS contacts (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                phone TEXT NOT NULL
-            )
+    def close(self):
+        """Closes every connection handed out by the pool"""
+        with self._lock:
+            for conn in self._connections:
+                instrumentation.unregister_connection(conn)
+                conn.close()
+            self._connections.clear()
+            self._closed = True
+        self._local = threading.local()
+
+    @property
+    def closed(self):
+        return self._closed
+
+
+class ContactModel(ContactRepository):
+    def __init__(self, db_path="contacts.db", pragmas=None, defer_backfills=False):
+        """Initialize the contact model with SQLite database
+
+        With defer_backfills, upgrading an existing database only changes its
+        schema, which is quick; run_backfills fills the existing rows later.
+        Until then, the queries that rely on those rows use slower plans.
         """
-        )
+        self.db_path = db_path
+        self._pool = ConnectionPool(db_path, pragmas)
+        self._create_table(defer_backfills)
+
+    def close(self):
+        """Closes all database connections held by the model"""
+        self._pool.close()
+
+    def get_data_version(self):
+        """Returns PRAGMA data_version for the calling thread's connection
 
-        conn.commit()
-        conn.close()
+        The value changes whenever another connection commits to the database.
+        """
+        return self.get_connection().execute("PRAGMA data_version").fetchone()[0]
+
+    def get_stats(self):
+        """Returns a dict describing the size and state of the database"""
+        conn = self.get_connection()
+
+        def pragma(name):
+            return conn.execute(f"PRAGMA {name}").fetchone()[0]
+
+        page_size = pragma("page_size")
+        return {
+            "contacts": self.count_contacts(),
+            "schema_version": get_version(conn),
+            "search_index": self.search_index_enabled,
+            "page_size": page_size,
+            "pages": pragma("page_count"),
+            "free_pages": pragma("freelist_count"),
+            "size_bytes": page_size * pragma("page_count"),
+        }
+
+    @timed
+    def vacuum(self):
+        """Merges the search index, rebuilds the database file and refreshes statistics
+
+        The trigrams of words no contact has any more are dropped from the
+        fuzzy index first. Returns the database size in bytes before and after. The file is
+        rewritten, so this blocks every other connection while it runs.
+        """
+        conn = self.get_connection()
+        before = self.get_stats()["size_bytes"]
+
+        if self.search_index_enabled:
+            with conn:
+                conn.execute("INSERT INTO contacts_fts (contacts_fts) VALUES ('optimize')")
+        with conn:
+            conn.execute(
+                "DELETE FROM word_trigrams WHERE word NOT IN (SELECT word FROM contact_words)"
+            )
+        conn.execute("VACUUM")
+        conn.execute("PRAGMA optimize")
+
+        return before, self.get_stats()["size_bytes"]
 
+    def get_connection(self):
+        """Get the calling thread's connection to the SQLite database
+
+        For callers that group writes into their own transactions with the
+        *_in methods, such as WriteQueue.
+        """
+        return self._pool.get_connection()
+
+    def _create_table(self, defer_backfills=False):
+        """Brings the database schema up to date"""
+        conn = self.get_connection()
+        migrate(conn, defer_backfills=defer_backfills)
+        self._has_search_index = table_exists(conn, "contacts_fts")
+        # Replaced, never modified, as run_backfills finishes each version
+        self._pending_backfills = frozenset(pending_backfills(conn))
+
+    @property
+    def search_index_enabled(self):
+        """Whether searches can use the trigram index (built and filled)"""
+        return self._has_search_index and SEARCH_INDEX_VERSION not in self._pending_backfills
+
+    @timed
+    def run_backfills(self, cancelled=None):
+        """Fills the rows of the migrations deferred by defer_backfills
+
+        Meant to run on a background thread: the rows are filled in small
+        committed batches, and queries switch to their fast plans as each
+        migration finishes. cancelled is as for migrations.run_backfill;
+        returns whether every backfill finished.
+        """
+        conn = self.get_connection()
+        for version in sorted(self._pending_backfills):
+            if not run_backfill(conn, version, cancelled=cancelled):
+                return False
+            self._pending_backfills = self._pending_backfills - {version}
+        return True
+
+    @timed
     def add_contact(self, name, phone):
         """Adds a new contact and returns its ID"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        conn = self.get_connection()
 
-        cursor.execute(
-            "INSERT INTO contacts (name, phone) VALUES (?, ?)", (name, phone)
-        )
+        with conn:
+            return self.add_contact_in(conn, name, phone)
 
-        # Get the ID of the inserted contact
-        contact_id = cursor.lastrowid
+    def add_contact_in(self, conn, name, phone):
+        """Inserts a contact in conn's open transaction and returns its ID
 
-        conn.commit()
-        conn.close()
+        conn is the calling thread's get_connection(); the caller commits.
+        """
+        cursor = conn.execute(_INSERT_CONTACT, (name, phone, *normalize_phone(phone)))
+        store_contact_words(conn, [(cursor.lastrowid, name)])
 
-        return contact_id
+        # Get the ID of the inserted contact
+        return cursor.lastrowid
+
+    @timed
+    def add_contacts_bulk(
+        self,
+        contacts,
+        batch_size=DEFAULT_BATCH_SIZE,
+        progress_callback=None,
+        atomic=True,
+        on_duplicate="keep",
+        before_commit=None,
+    ):
+        """Adds (name, phone) pairs in batches and returns a BulkResult
+
+        In atomic mode all batches share one transaction, so a failure leaves
+        the database untouched. Otherwise every batch is committed on its own
+        and a failure keeps the batches committed before it.
+        progress_callback, if given, is called with the number of pairs
+        processed after each batch.
+
+        on_duplicate decides what happens to a pair whose normalized phone is
+        already stored (or appeared earlier in the same call): "keep" inserts
+        it anyway, "skip" drops it and "update" renames the existing contact.
+        The known phones are loaded once into a dict before the first batch.
+
+        before_commit, if given, is called once every pair is written, just
+        before the last commit; an exception it raises rolls back what the
+        open transaction holds (everything, in atomic mode).
+        """
+        if on_duplicate not in DUPLICATE_MODES:
+            raise ValueError(f"Unknown duplicate mode: {on_duplicate}")
+
+        conn = self.get_connection()
+        known = None if on_duplicate == "keep" else self.phone_keys()
+        inserted = updated = skipped = 0
+
+        try:
+            for batch in _batched(contacts, batch_size):
+                inserts = []
+                updates = []
+                for name, phone in batch:
+                    normalized = normalize_phone(phone)
+                    key = normalized.digits
+                    if known is None or key not in known:
+                        inserts.append((name, phone, *normalized))
+                        if known is not None:
+                            known[key] = None  # Id assigned by the insert
+                    elif on_duplicate == "skip":
+                        skipped += 1
+                    else:
+                        updates.append((name, phone, *normalized, known[key]))
+
+                conn.executemany(_INSERT_CONTACT, inserts)
+                inserted += len(inserts)
+                # The write lock is held, so the batch got consecutive ids
+                last_id = conn.execute("SELECT last_insert_rowid()").fetchone()[0]
+                names = list(zip(
+                    range(last_id - len(inserts) + 1, last_id + 1),
+                    (name for name, *_ in inserts),
+                ))
+
+                if updates:
+                    # Duplicates of rows inserted by this call need their ids
+                    for position, (*values, contact_id) in enumerate(updates):
+                        if contact_id is None:
+                            key = values[2]
+                            contact_id = self._find_by_phone_key(conn, key)
+                            known[key] = contact_id
+                            updates[position] = (*values, contact_id)
+                    conn.executemany(_UPDATE_CONTACT, updates)
+                    updated += len(updates)
+                    names.extend((contact_id, name) for name, *_, contact_id in updates)
+                store_contact_words(conn, names)
+
+                if not atomic:
+                    conn.commit()
+                if progress_callback:
+                    progress_callback(inserted + updated + skipped)
+            if before_commit:
+                before_commit()
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        return BulkResult(inserted, updated, skipped)
+
+    def phone_keys(self):
+        """Returns the lowest contact id for every stored normalized phone (see phone_key)"""
+        known = {}
+        conn = self.get_connection()
+        if PHONE_DIGITS_VERSION in self._pending_backfills:
+            # Rows not backfilled yet have no phone_digits
+            rows = conn.execute("SELECT phone_digits, phone, id FROM contacts ORDER BY id")
+            for key, phone, contact_id in rows:
+                known.setdefault(phone_key(phone) if key is None else key, contact_id)
+            return known
+
+        rows = conn.execute("SELECT phone_digits, id FROM contacts ORDER BY id")
+        for key, contact_id in rows:
+            known.setdefault(key, contact_id)
+        return known
+
+    def _find_by_phone_key(self, conn, key):
+        """Returns the lowest id of the contacts with a normalized phone"""
+        row = conn.execute(
+            "SELECT MIN(id) FROM contacts WHERE phone_digits = ?", (key,)
+        ).fetchone()
+        return row[0]
+
+    @timed
+    def find_duplicates(self):
+        """Returns groups of contacts that look like the same person
+
+        See group_duplicates; the table is read in one pass.
+        """
+        cursor = self._contact_cursor().execute(
+            "SELECT name, phone, id FROM contacts ORDER BY name, id"
+        )
+        return group_duplicates(cursor)
 
+    @timed
     def update_contact(self, contact_id, name, phone):
         """Updates an existing contact"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        conn = self.get_connection()
+
+        with conn:
+            return self.update_contact_in(conn, contact_id, name, phone)
 
-        cursor.execute(
-            "UPDATE contacts SET name = ?, phone = ? WHERE id = ?",
-            (name, phone, contact_id),
+    def update_contact_in(self, conn, contact_id, name, phone):
+        """Updates a contact in conn's open transaction"""
+        cursor = conn.execute(
+            _UPDATE_CONTACT, (name, phone, *normalize_phone(phone), contact_id)
         )
 
         # Check if any row was affected
-        success = cursor.rowcount > 0
-
-        conn.commit()
-        conn.close()
-
-        return success
+        if cursor.rowcount == 0:
+            return False
+        store_contact_words(conn, [(contact_id, name)])
+        return True
 
+    @timed
     def delete_contact(self, contact_id):
         """Deletes a contact by its ID"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        conn = self.get_connection()
 
-        cursor.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
+        with conn:
+            return self.delete_contact_in(conn, contact_id)
 
-        # Check if any row was affected
-        success = cursor.rowcount > 0
+    def delete_contact_in(self, conn, contact_id):
+        """Deletes a contact in conn's open transaction"""
+        cursor = conn.execute("DELETE FROM contacts WHERE id = ?", (contact_id,))
 
-        conn.commit()
-        conn.close()
+        # Check if any row was affected
+        return cursor.rowcount > 0
 
-        return success
+    def get_change_seq(self):
+        """Returns the sequence number of the latest change (0 if none)
 
+        A database copied from this one as it is now can sync from here
+        with export_changes(since=...).
+        """
+        row = self.get_connection().execute(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'contact_changes'"
+        ).fetchone()
+        return row[0] if row else 0
+
+    def export_changes(self, since=0, chunk_size=DEFAULT_BATCH_SIZE):
+        """Yields a Change for every contact changed after sequence number since
+
+        The change journal keeps only each contact's latest change, so
+        every contact appears once, with its current name and phone (or as
+        deleted), in sequence order. Read in keyset chunks of chunk_size
+        changes; a contact changed while the export runs may appear twice,
+        the second time with its newer state. since=0 exports every contact.
+        """
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = _change_factory
+        while True:
+            chunk = cursor.execute(
+                "SELECT changes.seq, changes.uid, contacts.name, contacts.phone "
+                "FROM contact_changes AS changes "
+                "LEFT JOIN contacts ON contacts.uid = changes.uid "
+                "WHERE changes.seq > ? ORDER BY changes.seq LIMIT ?",
+                (since, chunk_size),
+            ).fetchall()
+            yield from chunk
+            if len(chunk) < chunk_size:
+                return
+            since = chunk[-1].seq
+
+    @timed
+    def apply_changes(self, changes):
+        """Applies Changes exported by another database and returns a ChangeResult
+
+        Contacts are matched by uid: changed ones are overwritten (the last
+        change applied wins), unknown ones inserted with the same uid and
+        deleted ones removed. Everything is applied in one transaction. The
+        applied changes enter this database's journal under its own
+        sequence numbers, except updates that change nothing, so changes
+        synced back to the database they came from stop there.
+        """
+        conn = self.get_connection()
+        inserted = updated = deleted = 0
+        last_seq = None
+        stored_uids = []  # Of the contacts whose names must be indexed
+
+        try:
+            for change in changes:
+                if change.name is None:
+                    cursor = conn.execute("DELETE FROM contacts WHERE uid = ?", (change.uid,))
+                    deleted += cursor.rowcount
+                else:
+                    normalized = normalize_phone(change.phone)
+                    values = (change.name, change.phone, *normalized, change.uid)
+                    if conn.execute(_UPDATE_SYNCED_CONTACT, values).rowcount:
+                        updated += 1
+                    else:
+                        conn.execute(_INSERT_SYNCED_CONTACT, values)
+                        inserted += 1
+                    stored_uids.append(change.uid)
+                last_seq = change.seq
+
+            # Indexed once every change is applied, so contacts deleted by a
+            # later change are left out
+            for uids in _batched(stored_uids, DEFAULT_BATCH_SIZE):
+                store_contact_words(conn, conn.execute(
+                    "SELECT id, name FROM contacts WHERE uid IN (SELECT value FROM json_each(?))",
+                    (json.dumps(uids),),
+                ).fetchall())
+            conn.commit()
+        except BaseException:
+            conn.rollback()
+            raise
+
+        return ChangeResult(inserted, updated, deleted, last_seq)
+
+    def _contact_cursor(self):
+        """Returns a cursor whose rows are Contact objects"""
+        cursor = self.get_connection().cursor()
+        cursor.row_factory = _contact_factory
+        return cursor
+
+    @timed
     def get_contact(self, contact_id):
         """Gets a contact by its ID"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
-
-        cursor.execute(
-            "SELECT id, name, phone FROM contacts WHERE id = ?", (contact_id,)
+        return (
+            self._contact_cursor()
+            .execute("SELECT name, phone, id FROM contacts WHERE id = ?", (contact_id,))
+            .fetchone()
         )
-        row = cursor.fetchone()
 
-        conn.close()
+    @timed
+    def lookup_by_phone(self, phone, min_suffix=MIN_SUFFIX_DIGITS):
+        """Returns the contacts with the given phone number, ordered by name
 
-        if row:
-            return Contact(row["name"], row["phone"], row["id"])
-        return None
-
-    def get_all_contacts(self):
-        """Returns all contacts"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+        Formatting is ignored. Numbers of different lengths match when the
+        shorter one is the longer one's last digits and has at least
+        min_suffix of them, so "+1 555 123 4567" finds "5551234567". When
+        both numbers have an E.164 form, they must be equal. Shorter
+        numbers only match exactly. Every lookup is a few index seeks,
+        whatever the number of contacts.
+        """
+        normalized = normalize_phone(phone)
+        if not normalized.digits:
+            return []
+
+        found = self._lookup_indexed_phone(normalized, min_suffix)
+        if self._pending_backfills & {PHONE_DIGITS_VERSION, PHONE_LOOKUP_VERSION}:
+            # Rows not backfilled yet have no normalized columns to seek;
+            # they are the rows without reversed digits
+            rows = self._contact_cursor().execute(
+                "SELECT name, phone, id FROM contacts WHERE phone_reversed IS NULL"
+            )
+            found.extend(
+                contact for contact in rows
+                if phones_match(normalize_phone(contact.phone), normalized, min_suffix)
+            )
+            found.sort(key=lambda contact: (contact.name, contact.contact_id))
+        return found
+
+    def _lookup_indexed_phone(self, normalized, min_suffix):
+        """Returns the contacts lookup_by_phone finds through the phone indexes"""
+        cursor = self._contact_cursor()
+        reversed_digits = normalized.reversed_digits
+        if len(reversed_digits) < min_suffix:
+            return cursor.execute(
+                "SELECT name, phone, id FROM contacts WHERE phone_digits = ? ORDER BY name, id",
+                (normalized.digits,),
+            ).fetchall()
+
+        # Stored numbers ending with the given digits have the reversed
+        # digits as a prefix (':' sorts right after '9'), and stored numbers
+        # the given digits end with are prefixes of the reversed digits
+        prefixes = [
+            reversed_digits[:length] for length in range(min_suffix, len(reversed_digits))
+        ]
+        suffix_condition = (
+            "(phone_reversed >= ? AND phone_reversed < ? "
+            f"OR phone_reversed IN ({', '.join('?' * len(prefixes))}))"
+        )
+        params = [reversed_digits, reversed_digits + ":", *prefixes]
+
+        if normalized.e164 is None:
+            query = f"SELECT name, phone, id FROM contacts WHERE {suffix_condition}"
+        else:
+            # The unary + keeps SQLite from scanning the E.164 index for NULLs
+            query = (
+                "SELECT name, phone, id FROM contacts WHERE phone_e164 = ? "
+                "UNION "
+                "SELECT name, phone, id FROM contacts "
+                f"WHERE {suffix_condition} AND +phone_e164 IS NULL"
+            )
+            params.insert(0, normalized.e164)
+        return cursor.execute(query + " ORDER BY name, id", params).fetchall()
 
-        cursor.execute("SELECT id, name, phone FROM contacts ORDER BY name")
-        rows = cursor.fetchall()
+    @timed
+    def get_all_contacts(self, limit=None, offset=0):
+        """Returns all contacts, optionally a window of limit rows from offset"""
+        return self.filter_contacts("", limit, offset)
 
-        conn.close()
+    @timed
+    def filter_contacts(self, search_text, limit=None, offset=0):
+        """Returns contacts that match the search text in name or phone"""
+        query, params = self._filter_query(search_text, limit, offset)
+        return self._contact_cursor().execute(query, params).fetchall()
 
-        # Convert rows to Contact objects
-        contacts = []
-        for row in rows:
-            contacts.append(Contact(row["name"], row["phone"], row["id"]))
+    @timed
+    def page_contacts(self, after=None, limit=DEFAULT_PAGE_SIZE, search_text=""):
+        """Returns the page of contacts that follows the (name, id) key after
 
-        return contacts
+        Pages are ordered by (name, id) and read from the name index, so every
+        page costs the same no matter how deep into the table it is. Pass the
+        name and id of the last contact of a page to get the next one.
+        """
+        query, params = self._filter_query(search_text, limit, after=after)
+        return self._contact_cursor().execute(query, params).fetchall()
+
+    @timed
+    def count_contacts(self, search_text=""):
+        """Returns how many contacts match the search text"""
+        conn = self.get_connection()
+        if self._uses_search_index(search_text):
+            # Count index matches without touching the contacts table
+            query = "SELECT COUNT(*) FROM contacts_fts WHERE contacts_fts MATCH ?"
+            params = (_fts_phrase(search_text),)
+        else:
+            where, params = self._search_conditions(search_text)
+            query = f"SELECT COUNT(*) FROM contacts {_where(where)}"
+        return conn.execute(query, params).fetchone()[0]
+
+    @timed
+    def fuzzy_matches(self, search_text, limit=DEFAULT_FUZZY_LIMIT):
+        """Returns (score, contact) pairs for fuzzy_search, best first
+
+        Each query word finds the words sharing enough of its trigrams (or,
+        for short words and numbers, the words it is a prefix of) in the
+        word index, which every write keeps up to date, so searches only
+        read. Only the limit best contacts are read from the contacts table.
+        """
+        words = fuzzy_words(search_text)
+        if not words:
+            return []
+
+        conn = self.get_connection()
+        word_conditions = [self._fuzzy_conditions(conn, word) for word in words]
+        unindexed = None
+        if FUZZY_INDEX_VERSION in self._pending_backfills:
+            unindexed = self._unindexed_words(conn)
+        if unindexed:
+            # Contacts the backfill has not reached are scored in Python
+            tiers = combine_tiers([
+                best_score_sets(_union_score_sets(
+                    self._score_sets(conn, conditions), scan_score_sets(word, unindexed)
+                ))
+                for word, conditions in zip(words, word_conditions)
+            ])
+        elif len(word_conditions) == 1 and limit is not None:
+            tiers = self._single_word_tiers(conn, word_conditions[0], limit)
+        else:
+            tiers = self._combined_tiers(conn, word_conditions)
+
+        cursor = self._contact_cursor()
+        matches = []
+        for total, contact_ids in tiers:
+            remaining = None if limit is None else limit - len(matches)
+            if remaining == 0:
+                break
+            chosen = best_ids(contact_ids, remaining)
+            contacts = {
+                contact.contact_id: contact
+                for contact in cursor.execute(
+                    "SELECT name, phone, id FROM contacts "
+                    "WHERE id IN (SELECT value FROM json_each(?))",
+                    (json.dumps(chosen),),
+                )
+            }
+            # Contacts deleted since their ids were read are left out
+            matches.extend(
+                (total, contacts[contact_id]) for contact_id in chosen if contact_id in contacts
+            )
+        return matches
+
+    def _fuzzy_conditions(self, conn, query):
+        """Returns (score, condition, params) triples selecting the words matching query"""
+        budget = edit_budget(query)
+        if budget == 0:
+            # Exact and prefix matches only: ranges of the word index
+            return [
+                (0, "word = ?", (query,)),
+                (1, "word > ? AND word < ?", (query, query + PREFIX_END)),
+            ]
+
+        trigram_words = [
+            [word for (word,) in conn.execute(
+                "SELECT word FROM word_trigrams WHERE trigram = ?", (trigram,)
+            )]
+            for trigram in word_trigrams(query)
+        ]
+        words_by_score = {}
+        for word in candidate_words(query, trigram_words):
+            score = word_score(query, word, budget)
+            if score is not None:
+                words_by_score.setdefault(score, []).append(word)
+
+        return [
+            (score, f"word IN ({', '.join('?' * len(batch))})", batch)
+            for score, words in sorted(words_by_score.items())
+            for batch in _batched(words, FUZZY_WORDS_PER_QUERY)
+        ]
+
+    def _count_words(self, conn, conditions):
+        """Returns how many (word, contact) pairs match (score, condition, params) triples"""
+        return sum(
+            conn.execute(
+                f"SELECT COUNT(*) FROM contact_words WHERE {condition}", params
+            ).fetchone()[0]
+            for _, condition, params in conditions
+        )
 
-    def filter_contacts(self, search_text):
-        """Returns contacts that match the search text in name or phone"""
-        conn = self._get_connection()
-        cursor = conn.cursor()
+    def _single_word_tiers(self, conn, conditions, limit):
+        """Returns the best (score, ids) tiers of a one-word search, up to limit ids
 
-        query = """
-            SELECT id, name, phone 
-            FROM contacts 
-            WHERE LOWER(name) LIKE ? OR LOWER(phone) LIKE ?
-            ORDER BY name
+        Tiers matching many contacts are read in id order from the contact
+        index, stopping after limit new ids; others are read whole.
         """
-        search_pattern = f"%{search_text}%"
-        cursor.execute(query, (search_pattern, search_pattern))
-        rows = cursor.fetchall()
+        # An estimate: ids of deleted contacts are not reused
+        contact_count = conn.execute("SELECT COALESCE(MAX(id), 0) FROM contacts").fetchone()[0]
+        seen = set()
+        tiers = []
+        for score in sorted({score for score, _, _ in conditions}):
+            score_conditions = [triple for triple in conditions if triple[0] == score]
+            if self._count_words(conn, score_conditions) * FUZZY_DENSE_FRACTION >= contact_count:
+                where = " OR ".join(f"({condition})" for _, condition, _ in score_conditions)
+                params = [param for _, _, params in score_conditions for param in params]
+                rows = conn.execute(
+                    "SELECT contact_id FROM contact_words "
+                    f"INDEXED BY contact_words_contact_idx WHERE {where} ORDER BY contact_id",
+                    params,
+                )
+                ids = set()
+                for (contact_id,) in rows:
+                    if contact_id not in seen:
+                        ids.add(contact_id)
+                        if len(seen) + len(ids) == limit:
+                            break
+            else:
+                ids = set().union(*(
+                    self._word_contact_ids(conn, condition, params)
+                    for _, condition, params in score_conditions
+                )) - seen
+
+            if ids:
+                tiers.append((score, ids))
+                seen |= ids
+            if len(seen) >= limit:
+                break
+        return tiers
+
+    def _combined_tiers(self, conn, word_conditions):
+        """Returns every (total score, ids) tier of a search, best first
+
+        The ids of the query word with the fewest matches are read whole;
+        words with many more matches only read those among its ids.
+        """
+        counts = [self._count_words(conn, conditions) for conditions in word_conditions]
+        driver = counts.index(min(counts))
+
+        driver_sets = self._score_sets(conn, word_conditions[driver])
+        driver_ids = set().union(*driver_sets.values())
+        if not driver_ids:
+            return []
+        restrict = json.dumps(list(driver_ids))
+        restrict_above = FUZZY_RESTRICT_RATIO * len(driver_ids)
+        return combine_tiers([driver_sets] + [
+            self._score_sets(conn, conditions, restrict if count > restrict_above else None)
+            for index, (conditions, count) in enumerate(zip(word_conditions, counts))
+            if index != driver
+        ])
+
+    def _score_sets(self, conn, conditions, restrict=None):
+        """Returns {score: ids} of the contacts matching (score, condition, params) triples
+
+        restrict, a JSON list of ids, limits the contacts read to those.
+        """
+        sets = {}
+        for score, condition, params in conditions:
+            if restrict is not None:
+                condition = f"({condition}) AND contact_id IN (SELECT value FROM json_each(?))"
+                params = [*params, restrict]
+            sets.setdefault(score, set()).update(
+                self._word_contact_ids(conn, condition, params)
+            )
+        return best_score_sets(sets)
+
+    def _unindexed_words(self, conn):
+        """Returns {word: ids} of the contacts the fuzzy index backfill has not reached"""
+        progress = conn.execute(
+            "SELECT last_id, end_id FROM migration_progress WHERE version = ?",
+            (FUZZY_INDEX_VERSION,),
+        ).fetchone()
+        ids_by_word = {}
+        if progress is None:
+            return ids_by_word
+        rows = conn.execute(
+            "SELECT id, name FROM contacts WHERE id > ? AND id <= ?", progress
+        )
+        for contact_id, name in rows:
+            for word in fuzzy_words(name):
+                ids_by_word.setdefault(word, set()).add(contact_id)
+        return ids_by_word
+
+    def _word_contact_ids(self, conn, condition, params):
+        """Returns the set of ids of the contacts with words matching condition"""
+        # One string rather than a row per contact, which is much faster to
+        # read for common words
+        ids = conn.execute(
+            f"SELECT group_concat(contact_id) FROM contact_words WHERE {condition}", params
+        ).fetchone()[0]
+        return set(map(int, ids.split(","))) if ids else set()
+
+    @timed
+    def get_contact_columns(self, search_text="", limit=None, offset=0):
+        """Returns the contacts filter_contacts would return as ContactColumns
+
+        Consumers that only display or export values avoid building one
+        object per contact.
+        """
+        query, params = self._filter_query(search_text, limit, offset)
+        columns = ContactColumns(array("q"), [], [])
+        for name, phone, contact_id in self.get_connection().execute(query, params):
+            columns.ids.append(contact_id)
+            columns.names.append(name)
+            columns.phones.append(phone)
+        return columns
+
+    def _uses_search_index(self, search_text):
+        """Whether the trigram index can answer this search"""
+        return (
+            self.search_index_enabled
+            and len(search_text) >= MIN_INDEXED_SEARCH_LENGTH
+        )
 
-        conn.close()
+    def _search_conditions(self, search_text):
+        """Returns the WHERE conditions and params matching the search text"""
+        if not search_text:
+            return [], []
 
-        # Convert rows to Contact objects
-        contacts = []
-        for row in rows:
-            contacts.append(Contact(row["name"], row["phone"], row["id"]))
+        if self._uses_search_index(search_text):
+            # A quoted trigram phrase matches the text as a substring
+            condition = (
+                "id IN (SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH ?)"
+            )
+            return [condition], [_fts_phrase(search_text)]
 
-        return contacts
+        # Too short for trigrams: scan the table
+        search_pattern = f"%{search_text}%"
+        condition = "(LOWER(name) LIKE ? OR LOWER(phone) LIKE ?)"
+        return [condition], [search_pattern, search_pattern]
+
+    def _filter_query(self, search_text, limit=None, offset=0, after=None):
+        """Builds the (query, params) selecting name, phone, id for a search"""
+        where, params = self._search_conditions(search_text)
+        if after is not None:
+            where.append("(name, id) > (?, ?)")
+            params.extend(after)
+
+        query = f"""
+            SELECT name, phone, id
+            FROM contacts
+            {_where(where)}
+            ORDER BY name, id
+            LIMIT ? OFFSET ?
+        """
+        params.extend((_sql_limit(limit), offset))
+        return query, params
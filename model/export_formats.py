@@ -0,0 +1,98 @@
+import csv
+import json
+
+
+class ExportFormat:
+    def __init__(self, name, extension, description, writer):
+        """Describes a file format that contacts can be exported to"""
+        self.name = name
+        self.extension = extension
+        self.description = description
+        self.writer = writer
+
+    def write(self, file, contacts):
+        """Writes the contacts to an open text file"""
+        self.writer(file, contacts)
+
+
+# Registered export formats by name
+EXPORT_FORMATS = {}
+
+DEFAULT_EXPORT_FORMAT = "txt"
+
+
+def register_export_format(name, extension, description):
+    """Decorator that registers a writer(file, contacts) function as a format"""
+
+    def decorator(writer):
+        EXPORT_FORMATS[name] = ExportFormat(name, extension, description, writer)
+        return writer
+
+    return decorator
+
+
+def get_export_format(name):
+    """Returns the registered format with the given name"""
+    try:
+        return EXPORT_FORMATS[name]
+    except KeyError:
+        raise ValueError(f"Unknown export format: {name}") from None
+
+
+def format_for_path(file_path):
+    """Returns the format matching the file extension, ignoring a .gz suffix"""
+    path = file_path.lower()
+    if path.endswith(".gz"):
+        path = path[:-3]
+    for export_format in EXPORT_FORMATS.values():
+        if path.endswith(export_format.extension):
+            return export_format
+    return EXPORT_FORMATS[DEFAULT_EXPORT_FORMAT]
+
+
+@register_export_format("txt", ".txt", "Text Files")
+def write_txt(file, contacts):
+    """Legacy "name, phone" lines"""
+    for contact in contacts:
+        file.write(f"{contact.name}, {contact.phone}\n")
+
+
+@register_export_format("csv", ".csv", "CSV Files")
+def write_csv(file, contacts):
+    """CSV with a name,phone header"""
+    writer = csv.writer(file)
+    writer.writerow(["name", "phone"])
+    for contact in contacts:
+        writer.writerow([contact.name, contact.phone])
+
+
+@register_export_format("jsonl", ".jsonl", "JSON Lines Files")
+def write_jsonl(file, contacts):
+    """One JSON object per line"""
+    for contact in contacts:
+        record = {"name": contact.name, "phone": contact.phone}
+        file.write(json.dumps(record, ensure_ascii=False))
+        file.write("\n")
+
+
+def _vcard_escape(value):
+    """Escapes a vCard text value"""
+    return (
+        value.replace("\\", "\\\\")
+        .replace(",", "\\,")
+        .replace(";", "\\;")
+        .replace("\n", "\\n")
+    )
+
+
+@register_export_format("vcard", ".vcf", "vCard Files")
+def write_vcard(file, contacts):
+    """vCard 4.0 cards"""
+    for contact in contacts:
+        file.write(
+            "BEGIN:VCARD\r\n"
+            "VERSION:4.0\r\n"
+            f"FN:{_vcard_escape(contact.name)}\r\n"
+            f"TEL:{_vcard_escape(contact.phone)}\r\n"
+            "END:VCARD\r\n"
+        )
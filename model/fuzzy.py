@@ -0,0 +1,213 @@
+import heapq
+import re
+import unicodedata
+from collections import Counter
+
+
+# Results returned by a fuzzy search unless another limit is given
+DEFAULT_FUZZY_LIMIT = 50
+
+# Typos tolerated in a query word, by its length: (shortest length, edits).
+# Shorter words, and words with digits, must match exactly or as a prefix.
+FUZZY_EDIT_BUDGETS = ((3, 1), (6, 2))
+
+# Words are runs of letters, digits and underscores
+_WORD = re.compile(r"\w+")
+
+# Sorts after every character a word can hold, to bound prefix ranges
+PREFIX_END = "\U0010ffff"
+
+
+def fuzzy_words(text):
+    """Returns the words of text as matched by fuzzy searches
+
+    Words are compared case-insensitively and without accents, so "jose"
+    matches "José".
+    """
+    decomposed = unicodedata.normalize("NFKD", text.casefold())
+    stripped = "".join(char for char in decomposed if not unicodedata.combining(char))
+    return _WORD.findall(stripped)
+
+
+def has_digits(word):
+    """Whether word holds a digit; such words only match exactly or as a prefix"""
+    return any(char.isdigit() for char in word)
+
+
+def edit_budget(word):
+    """Returns how many edits a query word may be away from a name word"""
+    if has_digits(word):
+        return 0
+    budget = 0
+    for length, edits in FUZZY_EDIT_BUDGETS:
+        if len(word) >= length:
+            budget = edits
+    return budget
+
+
+def word_trigrams(word):
+    """Returns the trigrams of word, padded in front only
+
+    Leading spaces mark the start of the word, and a word of n characters
+    has at most n trigrams. Unpadded at the end, a word shares all of its
+    trigrams with every word it is a prefix of.
+    """
+    padded = "  " + word
+    return {padded[i:i + 3] for i in range(len(word))}
+
+
+def indexed_trigrams(word):
+    """Returns the trigrams a name word is indexed under (none for words with digits)
+
+    Numbers only match exactly or as a prefix, which does not need trigrams.
+    """
+    if has_digits(word):
+        return set()
+    return word_trigrams(word)
+
+
+def min_shared_trigrams(word, budget):
+    """Fewest trigrams a name word shares with a query word it can match
+
+    Every edit changes at most three trigrams; at least one must be shared.
+    """
+    return max(1, len(word_trigrams(word)) - 3 * budget)
+
+
+def word_score(query, word, budget):
+    """Scores how well query matches word, or returns None if it does not
+
+    The score is twice the edit distance from query to word, or to a prefix
+    of word plus one, whichever is lower: 0 is an exact match, 1 a prefix
+    ("jo" in "john"), 2 one typo ("jon" or "jhon" for "john"). Edits are
+    insertions, deletions, substitutions and swaps of adjacent characters.
+    Gives up as soon as the distance must exceed budget.
+    """
+    before_previous = None
+    previous = list(range(len(word) + 1))
+    for i, query_char in enumerate(query, 1):
+        current = [i]
+        for j, word_char in enumerate(word, 1):
+            distance = min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (query_char != word_char),
+            )
+            if (
+                i > 1 and j > 1
+                and query_char == word[j - 2] and query[i - 2] == word_char
+            ):
+                distance = min(distance, before_previous[j - 2] + 1)
+            current.append(distance)
+        if min(current) > budget:
+            return None
+        before_previous, previous = previous, current
+
+    full, prefix = previous[-1], min(previous)
+    if full <= budget:
+        return min(2 * full, 2 * prefix + 1)
+    return 2 * prefix + 1
+
+
+def candidate_words(query, trigram_words):
+    """Returns the words found under enough of query's trigrams to match it
+
+    trigram_words is a list of the words indexed under each of query's
+    trigrams, one list per trigram.
+    """
+    counts = Counter()
+    for words in trigram_words:
+        counts.update(words)
+    needed = min_shared_trigrams(query, edit_budget(query))
+    return [word for word, count in counts.items() if count >= needed]
+
+
+def scan_score_sets(query, ids_by_word):
+    """Returns {score: ids} for query from a {word: ids} map, scoring every word
+
+    For contacts not in a word index yet; finds the same words as an index
+    lookup would.
+    """
+    budget = edit_budget(query)
+    score_sets = {}
+    for word, ids in ids_by_word.items():
+        if budget == 0:
+            score = 0 if word == query else 1 if word.startswith(query) else None
+        elif has_digits(word):
+            score = None  # Not in the trigram index
+        else:
+            score = word_score(query, word, budget)
+        if score is not None:
+            score_sets.setdefault(score, set()).update(ids)
+    return score_sets
+
+
+def best_score_sets(score_sets):
+    """Makes {score: ids} disjoint, keeping every id under its best score"""
+    seen = set()
+    best = {}
+    for score in sorted(score_sets):
+        ids = score_sets[score] - seen
+        if ids:
+            best[score] = ids
+            seen |= ids
+    return best
+
+
+def combine_tiers(word_score_sets):
+    """Combines the {score: ids} of every query word into tiers
+
+    Returns (total score, ids) pairs, best first, of the ids found by every
+    word; an id's total is the sum of its scores.
+    """
+    word_score_sets = sorted(word_score_sets, key=lambda sets: sum(map(len, sets.values())))
+    tiers = word_score_sets[0]
+    for score_sets in word_score_sets[1:]:
+        combined = {}
+        for total, ids in tiers.items():
+            for score, word_ids in score_sets.items():
+                common = ids & word_ids
+                if common:
+                    combined.setdefault(total + score, set()).update(common)
+        tiers = combined
+    return sorted(tiers.items())
+
+
+def best_ids(contact_ids, limit):
+    """Returns the limit lowest ids of a tier (all of them for None), in order
+
+    Contacts with the same score are ranked oldest first.
+    """
+    if limit is None:
+        return sorted(contact_ids)
+    return heapq.nsmallest(limit, contact_ids)
+
+
+def store_contact_words(conn, rows):
+    """Indexes the name words of (contact id, name) rows in conn's open transaction
+
+    Replaces the words stored for those contacts; a contact given twice
+    gets the words of its last name. Trigrams are stored for every word;
+    those of words no contact has any more stay until the next vacuum and
+    only add candidates that match nothing.
+    """
+    names = dict(rows)
+    postings = set()
+    for contact_id, name in names.items():
+        for word in fuzzy_words(name):
+            postings.add((word, contact_id))
+
+    conn.executemany(
+        "DELETE FROM contact_words WHERE contact_id = ?", [(contact_id,) for contact_id in names]
+    )
+    conn.executemany(
+        "INSERT INTO contact_words (word, contact_id) VALUES (?, ?)", sorted(postings)
+    )
+    conn.executemany(
+        "INSERT OR IGNORE INTO word_trigrams (trigram, word) VALUES (?, ?)",
+        sorted(
+            (trigram, word)
+            for word in {word for word, _ in postings}
+            for trigram in indexed_trigrams(word)
+        ),
+    )
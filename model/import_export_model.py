@@ -1,56 +1,281 @@
-import re
+import codecs
+import gzip
+import io
+import mmap
+import os
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from itertools import chain, islice
+from model.contact_model import DEFAULT_BATCH_SIZE
+from model.export_formats import DEFAULT_EXPORT_FORMAT, format_for_path, get_export_format
+from model.instrumentation import timed
+from model.phone import is_valid_phone
+
+# Size of the write buffer used when exporting
+EXPORT_BUFFER_SIZE = 1024 * 1024
+
+# Number of exported contacts between progress reports
+EXPORT_PROGRESS_INTERVAL = 10000
+
+# Files at least this large are parsed by a process pool
+PARALLEL_IMPORT_THRESHOLD = 32 * 1024 * 1024
+
+# Size of the byte ranges handed to each parser process
+PARALLEL_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Bytes inspected when guessing the encoding of an import file
+ENCODING_SAMPLE_SIZE = 64 * 1024
+
+def detect_encoding(buffer, encoding=None):
+    """Returns the (encoding, BOM length) to use for an import buffer
+
+    A UTF-8 byte order mark is always honoured and skipped. Otherwise the
+    given encoding is used, or, when it is None, a sample from the start of
+    the buffer decides between UTF-8 and Latin-1. Only ASCII-compatible
+    encodings are accepted because lines are split as bytes.
+    """
+    if buffer[:3] == codecs.BOM_UTF8:
+        return 'utf-8', len(codecs.BOM_UTF8)
+    if buffer[:2] in (codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE):
+        raise ValueError("UTF-16 and UTF-32 files are not supported")
+
+    if encoding is None:
+        sample = buffer[:ENCODING_SAMPLE_SIZE]
+        if len(sample) == ENCODING_SAMPLE_SIZE:
+            # Do not judge a character cut in half at the end of the sample
+            sample = sample[:sample.rfind(b'\n') + 1]
+        try:
+            sample.decode('utf-8')
+            encoding = 'utf-8'
+        except UnicodeDecodeError:
+            encoding = 'latin-1'
+    elif 'a,\n'.encode(encoding) != b'a,\n':
+        raise ValueError(f"Unsupported encoding: {encoding}")
+
+    return encoding, 0
+
+
+@contextmanager
+def _mapped_file(file_path):
+    """Memory-maps a file for reading (empty files map to b'')"""
+    with open(file_path, 'rb') as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            yield b''
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buffer:
+            yield buffer
+
+
+def _scan_buffer(buffer, start, end, encoding, errors, position=None):
+    """Yields (name, phone) pairs from the "name, phone" lines in buffer[start:end]
+
+    Lines are located with find/rfind on the raw bytes; only the name is
+    decoded. The phone is whatever follows the last comma and must pass
+    is_valid_phone: ASCII digits with optional spaces, ( ) - . / separators
+    and a leading +. Invalid lines are appended to errors as (line offset,
+    message) pairs. If position is a one-item list, it is kept at the offset
+    of the next line to scan.
+    """
+    line_offset = 0
+    pos = start
+    while pos < end:
+        line_end = buffer.find(b'\n', pos, end)
+        if line_end == -1:
+            line_end = end
+        next_pos = line_end + 1
+
+        comma = buffer.rfind(b',', pos, line_end)
+        if comma == -1:
+            if buffer[pos:line_end].strip():
+                errors.append((line_offset, "Invalid format"))
+        else:
+            name = buffer[pos:comma].strip()
+            phone = buffer[comma + 1:line_end].strip()
+            if name and is_valid_phone(phone):
+                if position is not None:
+                    position[0] = next_pos
+                try:
+                    yield name.decode(encoding), phone.decode('ascii')
+                except UnicodeDecodeError:
+                    errors.append((line_offset, f"Invalid {encoding} text"))
+            else:
+                errors.append((line_offset, "Invalid format"))
+
+        line_offset += 1
+        pos = next_pos
+
+    return line_offset
+
+
+def _split_file(buffer, start, chunk_size):
+    """Yields (start, end) byte ranges of the buffer that end on a line boundary"""
+    size = len(buffer)
+    while start < size:
+        end = buffer.find(b'\n', min(start + chunk_size, size))
+        end = size if end == -1 else end + 1
+        yield start, end
+        start = end
+
+
+def _parse_chunk(file_path, start, end, encoding):
+    """Parses a byte range of the file in a worker process
+
+    Returns the parsed rows, (line offset, error) pairs relative to the first
+    line of the range, and the number of lines the range spans.
+    """
+    errors = []
+    with _mapped_file(file_path) as buffer:
+        scanner = _scan_buffer(buffer, start, end, encoding, errors)
+        rows = []
+        while True:
+            try:
+                rows.append(next(scanner))
+            except StopIteration as stop:
+                return rows, errors, stop.value
+
+
+def _open_export_file(file_path, compress):
+    """Opens a buffered UTF-8 text stream for writing, optionally gzipped"""
+    if compress:
+        raw = gzip.GzipFile(file_path, 'wb')
+    else:
+        raw = io.FileIO(file_path, 'w')
+    buffered = io.BufferedWriter(raw, EXPORT_BUFFER_SIZE)
+    return io.TextIOWrapper(buffered, encoding='utf-8', newline='')
+
+
+def _count(items, counter):
+    """Yields the items, keeping counter[0] at the number yielded so far"""
+    for item in items:
+        counter[0] += 1
+        yield item
+
+
+# Outcome of an import: row counts from ContactModel.add_contacts_bulk and
+# "Line N: message" strings for the lines that could not be parsed
+ImportResult = namedtuple('ImportResult', ['inserted', 'updated', 'skipped', 'invalid_lines'])
+
+
+class OperationCancelled(Exception):
+    """Raised by a progress callback to stop an import or export"""
+
+
+def _report_progress(contacts, total, progress_callback):
+    """Yields the contacts, reporting (count, fraction done) every so often"""
+    count = 0
+    for contact in contacts:
+        yield contact
+        count += 1
+        if count % EXPORT_PROGRESS_INTERVAL == 0:
+            progress_callback(count, min(count / total, 1.0))
+    progress_callback(count, 1.0)
+
 
 class ImportExportModel:
     def __init__(self, contact_model):
         """Initialize the import/export model with a reference to the contact model"""
         self.contact_model = contact_model
     
-    def export_contacts_to_file(self, file_path):
-        """Exports contacts to a text file and returns success status and error message"""
-        contacts = self.contact_model.get_all_contacts()
-        
-        # Check if there are contacts to export
-        if not contacts:
-            return False, "There are no contacts to export."
-        
+    @timed
+    def export_contacts_to_file(self, file_path, export_format=None, compress=None,
+                                progress_callback=None):
+        """Exports contacts to a file and returns success status and error message
+
+        Contacts are streamed from the database in chunks, so memory use does
+        not depend on the number of contacts. The format is picked from the
+        file extension unless export_format names a registered format, and the
+        output is gzip-compressed when compress is set or the path ends in .gz.
+
+        progress_callback(count, fraction) is called as contacts are written;
+        it may raise OperationCancelled to stop, which removes the partial file.
+        """
         try:
-            with open(file_path, 'w') as file:
-                for contact in contacts:
-                    file.write(f"{contact.name}, {contact.phone}\n")
+            if export_format is None:
+                output_format = format_for_path(file_path)
+            else:
+                output_format = get_export_format(export_format)
+            if compress is None:
+                compress = file_path.lower().endswith('.gz')
+
+            contacts = self.contact_model.iter_contacts()
+            
+            # Check if there are contacts to export
+            first_contact = next(contacts, None)
+            if first_contact is None:
+                return False, "There are no contacts to export."
+
+            contacts = chain([first_contact], contacts)
+            if progress_callback:
+                total = self.contact_model.count_contacts()
+                contacts = _report_progress(contacts, total, progress_callback)
+            
+            try:
+                with _open_export_file(file_path, compress) as file:
+                    output_format.write(file, contacts)
+            except OperationCancelled:
+                os.unlink(file_path)
+                return False, "Export cancelled."
             
             return True, f"Contacts successfully exported to {file_path}"
         except Exception as e:
             return False, f"Error exporting contacts: {str(e)}"
     
-    def import_contacts_from_file(self, file_path):
-        """Imports contacts from a text file and returns results"""
+    @timed
+    def export_contacts_to_stream(self, stream, export_format=DEFAULT_EXPORT_FORMAT,
+                                  compress=False):
+        """Writes every contact to an open binary stream and returns the count
+
+        Used for pipes such as stdout. The stream is flushed but left open.
+        """
+        output_format = get_export_format(export_format)
+        written = [0]
+
+        raw = gzip.GzipFile(fileobj=stream, mode='wb') if compress else stream
+        file = io.TextIOWrapper(raw, encoding='utf-8', newline='')
         try:
-            imported_count = 0
-            invalid_lines = []
-            
-            with open(file_path, 'r') as file:
-                for line_number, line in enumerate(file, 1):
-                    line = line.strip()
-                    if not line:  # Skip empty lines
-                        continue
-                    
-                    # Parse line with format "name, phone"
-                    match = re.match(r'^(.+?),\s*(\d+)$', line)
-                    if match:
-                        name = match.group(1).strip()
-                        phone = match.group(2).strip()
-                        
-                        if name and phone:
-                            self.contact_model.add_contact(name, phone)
-                            imported_count += 1
-                        else:
-                            invalid_lines.append(f"Line {line_number}: Missing name or phone")
-                    else:
-                        invalid_lines.append(f"Line {line_number}: Invalid format")
-            
+            output_format.write(file, _count(self.contact_model.iter_contacts(), written))
+        finally:
+            file.detach()
+            if compress:
+                raw.close()  # Writes the gzip trailer; the stream stays open
+            stream.flush()
+
+        return written[0]
+
+    def import_contacts_from_file(self, file_path, batch_size=DEFAULT_BATCH_SIZE,
+                                  progress_callback=None, atomic=True, workers=None,
+                                  encoding=None, on_duplicate="keep"):
+        """Imports contacts from a text file and returns success status and message
+
+        See import_contacts for the arguments.
+        """
+        committed = [0]
+
+        def on_progress(count, fraction):
+            committed[0] = count
+            if progress_callback:
+                progress_callback(count, fraction)
+
+        try:
+            result = self.import_contacts(
+                file_path,
+                batch_size=batch_size,
+                progress_callback=on_progress,
+                atomic=atomic,
+                workers=workers,
+                encoding=encoding,
+                on_duplicate=on_duplicate,
+            )
+            invalid_lines = result.invalid_lines
+
             # Prepare result message
-            if imported_count > 0:
-                message = f"Successfully imported {imported_count} contact(s)"
+            if result.inserted + result.updated + result.skipped > 0:
+                message = f"Successfully imported {result.inserted} contact(s)"
+                if result.updated:
+                    message += f"\n{result.updated} existing contact(s) updated"
+                if result.skipped:
+                    message += f"\n{result.skipped} duplicate(s) skipped"
                 if invalid_lines:
                     message += f"\n\nWarning: {len(invalid_lines)} line(s) could not be imported:"
                     # Show at most 5 invalid lines to avoid a huge message box
@@ -66,5 +291,113 @@ class ImportExportModel:
                 else:
                     return False, "No contacts were found in the file."
                     
+        except OperationCancelled:
+            if atomic or committed[0] == 0:
+                return False, "Import cancelled. No contacts were imported."
+            return False, f"Import cancelled after {committed[0]} contact(s) were imported."
         except Exception as e:
-            return False, f"Error importing contacts: {str(e)}" 
\ No newline at end of file
+            message = f"Error importing contacts: {str(e)}"
+            if not atomic and committed[0] > 0:
+                message += f"\n\n{committed[0]} contact(s) were imported before the error."
+            return False, message
+
+    @timed
+    def import_contacts(self, file_path, batch_size=DEFAULT_BATCH_SIZE,
+                        progress_callback=None, atomic=True, workers=None,
+                        encoding=None, on_duplicate="keep"):
+        """Imports contacts from a text file and returns an ImportResult
+
+        Parsed rows are streamed into ContactModel.add_contacts_bulk. With
+        atomic=True a failure leaves the database untouched; with atomic=False
+        every batch is committed and a failure keeps the batches already written.
+        on_duplicate ("keep", "skip" or "update") decides what happens to lines
+        whose phone is already stored; see ContactModel.add_contacts_bulk.
+
+        The file is memory-mapped and scanned as bytes. Its encoding is taken
+        from a UTF-8 BOM, then from the encoding argument, and otherwise
+        guessed as UTF-8 or Latin-1 (see detect_encoding). Files larger than
+        PARALLEL_IMPORT_THRESHOLD are parsed by a pool of worker processes;
+        workers sets the pool size (1 disables it).
+
+        progress_callback(count, fraction) is called after every batch with the
+        number of contacts written and the fraction of the file read. It may
+        raise OperationCancelled to stop the import, which is re-raised like
+        any other error.
+        """
+        position = [0]
+        file_size = [0]
+
+        def on_progress(count):
+            if progress_callback:
+                progress_callback(count, position[0] / file_size[0])
+
+        invalid_lines = []
+
+        if workers is None:
+            workers = os.cpu_count() or 1
+            if os.path.getsize(file_path) < PARALLEL_IMPORT_THRESHOLD:
+                workers = 1
+
+        with _mapped_file(file_path) as buffer:
+            encoding, bom_length = detect_encoding(buffer, encoding)
+            position[0] = bom_length
+            file_size[0] = max(len(buffer), 1)
+            if workers > 1:
+                contacts = self._parse_contacts_parallel(
+                    file_path, buffer, bom_length, encoding, invalid_lines, workers,
+                    position=position,
+                )
+            else:
+                contacts = self._parse_buffer(
+                    buffer, bom_length, encoding, invalid_lines, position
+                )
+
+            result = self.contact_model.add_contacts_bulk(
+                contacts,
+                batch_size=batch_size,
+                progress_callback=on_progress,
+                atomic=atomic,
+                on_duplicate=on_duplicate,
+            )
+
+        return ImportResult(result.inserted, result.updated, result.skipped, invalid_lines)
+
+    def _parse_buffer(self, buffer, start, encoding, invalid_lines, position=None):
+        """Yields (name, phone) pairs from a mapped file, collecting invalid lines"""
+        errors = []
+        yield from _scan_buffer(buffer, start, len(buffer), encoding, errors, position)
+        invalid_lines.extend(f"Line {offset + 1}: {error}" for offset, error in errors)
+
+    def _parse_contacts_parallel(self, file_path, buffer, start, encoding, invalid_lines,
+                                 workers, chunk_size=PARALLEL_CHUNK_SIZE, position=None):
+        """Yields (name, phone) pairs parsed by a process pool, in file order
+
+        The file is split into newline-aligned byte ranges. At most two chunks
+        per worker are in flight so parsed rows never pile up in memory while
+        the database writer catches up.
+        """
+        chunks = _split_file(buffer, start, chunk_size)
+        first_line = 1
+
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
+            for start, end in islice(chunks, workers * 2):
+                future = executor.submit(_parse_chunk, file_path, start, end, encoding)
+                pending.append((future, end))
+
+            while pending:
+                future, chunk_end = pending.popleft()
+                rows, errors, line_count = future.result()
+                if position is not None:
+                    position[0] = chunk_end
+
+                # Keep the pipeline full while this chunk is written
+                for start, end in islice(chunks, 1):
+                    future = executor.submit(_parse_chunk, file_path, start, end, encoding)
+                    pending.append((future, end))
+
+                for line_offset, error in errors:
+                    invalid_lines.append(f"Line {first_line + line_offset}: {error}")
+                first_line += line_count
+
+                yield from rows
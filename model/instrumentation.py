@@ -0,0 +1,266 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from functools import wraps
+
+
+# Upper bounds, in seconds, of the latency histogram buckets
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+
+# Operations slower than this many seconds are logged
+DEFAULT_SLOW_THRESHOLD = 0.1
+
+# SQL statements remembered per operation for the slow-operation log
+MAX_TRACED_STATEMENTS = 20
+
+# Prefix of every exported metric name
+METRIC_PREFIX = "contacts"
+
+logger = logging.getLogger("contacts.slow")
+
+
+class Histogram:
+    __slots__ = ("buckets", "count", "total")
+
+    def __init__(self):
+        """Latency histogram with the fixed LATENCY_BUCKETS bounds"""
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)  # The last one is +Inf
+        self.count = 0
+        self.total = 0.0
+
+    def observe(self, seconds):
+        self.buckets[bisect_left(LATENCY_BUCKETS, seconds)] += 1
+        self.count += 1
+        self.total += seconds
+
+
+class _Span:
+    __slots__ = ("name", "statements")
+
+    def __init__(self, name):
+        self.name = name
+        self.statements = []  # (connection, sql) pairs
+
+
+class Instrumentation:
+    def __init__(self):
+        """Operation timings, SQL tracing and slow-operation logging
+
+        Everything is off until enable() is called. While disabled a timed
+        operation costs one attribute check and connections have no trace
+        callback.
+        """
+        self.enabled = False
+        self.trace_sql = False
+        self.slow_threshold = DEFAULT_SLOW_THRESHOLD
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._connections = set()
+        self._local = threading.local()
+
+    def enable(self, slow_threshold=None, trace_sql=True):
+        """Starts collecting metrics
+
+        With trace_sql every statement run during an operation is recorded
+        (via sqlite3's set_trace_callback), and the query plans of the
+        statements of slow operations are logged. Traced statements include
+        their bound values.
+        """
+        if slow_threshold is not None:
+            self.slow_threshold = slow_threshold
+        self.trace_sql = trace_sql
+        self.enabled = True
+        self._set_tracers()
+
+    def disable(self):
+        """Stops collecting metrics; the values collected so far are kept"""
+        self.enabled = False
+        self.trace_sql = False
+        self._set_tracers()
+
+    def reset(self):
+        """Discards the collected metrics"""
+        with self._lock:
+            self._histograms = {}
+            self._counters = {}
+
+    def register_connection(self, conn):
+        """Lets the instrumentation trace a new SQLite connection"""
+        with self._lock:
+            self._connections.add(conn)
+        if self.trace_sql:
+            self._set_tracer(conn)
+
+    def unregister_connection(self, conn):
+        """Forgets a connection that is about to be closed"""
+        with self._lock:
+            self._connections.discard(conn)
+
+    def _set_tracers(self):
+        with self._lock:
+            connections = list(self._connections)
+        for conn in connections:
+            self._set_tracer(conn)
+
+    def _set_tracer(self, conn):
+        try:
+            if self.trace_sql:
+                conn.set_trace_callback(lambda sql: self._on_statement(conn, sql))
+            else:
+                conn.set_trace_callback(None)
+        except sqlite3.ProgrammingError:
+            pass  # Closed
+
+    def _on_statement(self, conn, sql):
+        """Trace callback: counts the statement and files it under the operation"""
+        if sql.startswith("--") or getattr(self._local, "explaining", False):
+            return  # Run by a trigger or virtual table, or by _explain
+        self.increment("sqlite_statements")
+        spans = getattr(self._local, "spans", None)
+        if spans and len(spans[-1].statements) < MAX_TRACED_STATEMENTS:
+            spans[-1].statements.append((conn, sql))
+
+    def increment(self, name, amount=1):
+        """Adds amount to a counter"""
+        with self._lock:
+            self._counters[name] = self._counters.get(name, 0) + amount
+
+    def observe(self, name, seconds):
+        """Records the duration of an operation"""
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.observe(seconds)
+
+    @contextmanager
+    def span(self, name):
+        """Times the enclosed code as operation name
+
+        Nested spans are timed separately; a slow operation is logged once,
+        by the outermost span, together with the statements of the spans it
+        contains.
+        """
+        spans = getattr(self._local, "spans", None)
+        if spans is None:
+            spans = self._local.spans = []
+        span = _Span(name)
+        spans.append(span)
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - started
+            spans.pop()
+            self.observe(name, elapsed)
+            if spans:
+                spans[-1].statements.extend(span.statements)
+            elif elapsed >= self.slow_threshold:
+                self._log_slow(span, elapsed)
+
+    def _log_slow(self, span, elapsed):
+        """Logs a slow operation with the query plans of its statements"""
+        self.increment("slow_operations")
+        lines = [f"Slow operation {span.name}: {elapsed * 1000:.1f} ms"]
+        for conn, sql in span.statements[:MAX_TRACED_STATEMENTS]:
+            lines.append(f"  SQL: {' '.join(sql.split())}")
+            for detail in self._explain(conn, sql):
+                lines.append(f"    PLAN: {detail}")
+        logger.warning("\n".join(lines))
+
+    def _explain(self, conn, sql):
+        """Returns the EXPLAIN QUERY PLAN details of a query"""
+        if not sql.lstrip().upper().startswith(("SELECT", "WITH")):
+            return []
+        self._local.explaining = True
+        try:
+            rows = conn.execute("EXPLAIN QUERY PLAN " + sql).fetchall()
+        except sqlite3.Error:
+            return []
+        finally:
+            self._local.explaining = False
+        return [row[-1] for row in rows]
+
+    def snapshot(self):
+        """Returns the counters and histograms as a JSON-serializable dict"""
+        with self._lock:
+            operations = {
+                name: {
+                    "count": histogram.count,
+                    "sum": histogram.total,
+                    "buckets": dict(
+                        zip([str(bound) for bound in LATENCY_BUCKETS] + ["+Inf"],
+                            histogram.buckets)
+                    ),
+                }
+                for name, histogram in sorted(self._histograms.items())
+            }
+            return {"counters": dict(sorted(self._counters.items())), "operations": operations}
+
+    def to_json(self):
+        """Returns the metrics as JSON text"""
+        return json.dumps(self.snapshot(), indent=2)
+
+    def to_prometheus(self):
+        """Returns the metrics in the Prometheus text exposition format"""
+        snapshot = self.snapshot()
+        lines = []
+        for name, value in snapshot["counters"].items():
+            metric = f"{METRIC_PREFIX}_{name}_total"
+            lines.append(f"# TYPE {metric} counter")
+            lines.append(f"{metric} {value}")
+
+        metric = f"{METRIC_PREFIX}_operation_seconds"
+        if snapshot["operations"]:
+            lines.append(f"# TYPE {metric} histogram")
+        for name, histogram in snapshot["operations"].items():
+            label = f'operation="{name}"'
+            cumulative = 0
+            for bound, count in histogram["buckets"].items():
+                cumulative += count
+                lines.append(f'{metric}_bucket{{{label},le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum{{{label}}} {histogram['sum']}")
+            lines.append(f"{metric}_count{{{label}}} {histogram['count']}")
+        return "\n".join(lines) + "\n"
+
+    def write(self, path):
+        """Writes the metrics to a .json file, or a Prometheus text file otherwise
+
+        The file is replaced atomically, as the Prometheus textfile collector
+        expects.
+        """
+        text = self.to_json() if path.lower().endswith(".json") else self.to_prometheus()
+        partial = f"{path}.{os.getpid()}.tmp"
+        with open(partial, "w", encoding="utf-8") as file:
+            file.write(text)
+        os.replace(partial, path)
+
+
+# Instrumentation shared by the models and the controller
+instrumentation = Instrumentation()
+
+
+def timed(fn):
+    """Decorator that times every call of fn while instrumentation is enabled
+
+    The operation is named after the function's qualified name, for example
+    ContactModel.add_contact.
+    """
+    name = fn.__qualname__
+
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        if not instrumentation.enabled:
+            return fn(*args, **kwargs)
+        with instrumentation.span(name):
+            return fn(*args, **kwargs)
+
+    return wrapper
@@ -0,0 +1,499 @@
+import os
+import threading
+from bisect import bisect_left, bisect_right, insort
+from collections import Counter
+from itertools import chain, islice
+from model.contact_model import MIN_INDEXED_SEARCH_LENGTH, ContactModel, _batched
+from model.fuzzy import (
+    DEFAULT_FUZZY_LIMIT,
+    best_ids,
+    best_score_sets,
+    candidate_words,
+    combine_tiers,
+    edit_budget,
+    fuzzy_words,
+    has_digits,
+    store_contact_words,
+    word_score,
+    word_trigrams,
+)
+from model.instrumentation import timed
+from model.phone import MIN_SUFFIX_DIGITS, normalize_phone
+from model.repository import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_PAGE_SIZE,
+    DUPLICATE_MODES,
+    BulkResult,
+    Contact,
+    ContactRepository,
+)
+
+
+# Searches whose trigram candidates are fewer than 1 / SORT_CANDIDATES_FRACTION
+# of the contacts sort the candidates; others walk the name index in order
+SORT_CANDIDATES_FRACTION = 20
+
+
+def _trigrams(text):
+    """Returns the lowercase three-character substrings of text"""
+    text = text.lower()
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _drop_sorted(keys, counts):
+    """Removes count copies of each key of counts from the sorted list keys
+
+    The list is rebuilt from the slices between the removed positions, so
+    removing many keys costs one copy of the list.
+    """
+    positions = []
+    for key, count in counts.items():
+        start = bisect_left(keys, key)
+        positions.extend(range(start, start + count))
+    positions.sort()
+    starts = [0] + [position + 1 for position in positions]
+    keys[:] = chain.from_iterable(
+        keys[start:end] for start, end in zip(starts, positions + [len(keys)])
+    )
+
+
+class InMemoryContactModel(ContactRepository):
+    def __init__(self, snapshot_path=None):
+        """Contacts held in memory, searched like ContactModel searches SQLite
+
+        Contacts live in a dict keyed by id. A sorted (name, id) list serves
+        ordered pages, a trigram index narrows searches of three or more
+        characters like the SQLite trigram index does, and a sorted list of
+        reversed phone digits plus dicts of digits and E.164 numbers answer
+        lookup_by_phone. Every method is thread-safe; a bulk add holds the
+        lock per batch, so readers may see an atomic add's contacts before
+        it completes (or is rolled back), and ids are never handed out twice.
+
+        Nothing touches the disk unless snapshot_path is given: the contacts
+        are then loaded from that SQLite database if it exists, and written
+        back to it by snapshot() and close().
+        """
+        self.snapshot_path = snapshot_path
+        self._lock = threading.RLock()
+        self._contacts = {}  # (name, phone, NormalizedPhone) by id
+        self._by_name = []  # Sorted (name, id) pairs
+        self._by_reversed_phone = []  # Sorted (reversed digits, id) pairs
+        self._by_digits = {}  # Set of ids by phone digits
+        self._by_e164 = {}  # Set of ids by E.164 number
+        self._by_trigram = {}  # Set of ids by trigram of the name or phone
+        self._by_word = {}  # Set of ids by fuzzy_words word of the name
+        self._words_by_trigram = {}  # Set of words by word_trigrams trigram
+        self._last_id = 0
+        self._changes = 0
+        self._local = threading.local()
+
+        if snapshot_path and os.path.exists(snapshot_path):
+            self.load_snapshot(snapshot_path)
+
+    def close(self):
+        """Writes the snapshot, if the model has a snapshot path"""
+        if self.snapshot_path:
+            self.snapshot()
+
+    def _changed(self, count=1):
+        """Records writes made by the calling thread"""
+        self._changes += count
+        self._local.changes = getattr(self._local, "changes", 0) + count
+
+    def get_data_version(self):
+        """Returns a value that changes when another thread writes
+
+        Mirrors PRAGMA data_version: writes made by the calling thread do
+        not change it.
+        """
+        with self._lock:
+            return self._changes - getattr(self._local, "changes", 0)
+
+    def _index(self, contact_id, name, phone, keep_sorted=True):
+        """Stores a contact and adds it to every index
+
+        With keep_sorted false, the sorted lists get the contact appended and
+        must be sorted by the caller.
+        """
+        normalized = normalize_phone(phone)
+        self._contacts[contact_id] = (name, phone, normalized)
+        if keep_sorted:
+            insort(self._by_name, (name, contact_id))
+            insort(self._by_reversed_phone, (normalized.reversed_digits, contact_id))
+        else:
+            self._by_name.append((name, contact_id))
+            self._by_reversed_phone.append((normalized.reversed_digits, contact_id))
+        self._by_digits.setdefault(normalized.digits, set()).add(contact_id)
+        if normalized.e164:
+            self._by_e164.setdefault(normalized.e164, set()).add(contact_id)
+        for trigram in _trigrams(name) | _trigrams(phone):
+            self._by_trigram.setdefault(trigram, set()).add(contact_id)
+        for word in set(fuzzy_words(name)):
+            ids = self._by_word.get(word)
+            if ids is None:
+                ids = self._by_word[word] = set()
+                for trigram in word_trigrams(word):
+                    self._words_by_trigram.setdefault(trigram, set()).add(word)
+            ids.add(contact_id)
+
+    def _sort_indexes(self, removed=None):
+        """Sorts the lists _index appended to with keep_sorted false
+
+        The lists are sorted runs followed by appended ones, which the sort
+        merges in linear time. removed holds the Counters _unindex filled;
+        their entries are then dropped from the lists and the Counters
+        cleared.
+        """
+        for keys, counts in zip((self._by_name, self._by_reversed_phone), removed or ({}, {})):
+            keys.sort()
+            if counts:
+                _drop_sorted(keys, counts)
+                counts.clear()
+
+    def _unindex(self, contact_id, removed=None):
+        """Removes a contact from the dict and every index
+
+        With removed, a pair of Counters, the contact's entries in the sorted
+        lists are counted there instead of deleted one by one, and the
+        caller must pass removed to _sort_indexes.
+        """
+        name, phone, normalized = self._contacts.pop(contact_id)
+        for keys, key, counts in zip(
+            (self._by_name, self._by_reversed_phone),
+            ((name, contact_id), (normalized.reversed_digits, contact_id)),
+            removed or (None, None),
+        ):
+            if counts is None:
+                del keys[bisect_left(keys, key)]
+            else:
+                counts[key] += 1
+        for index, key in ((self._by_digits, normalized.digits), (self._by_e164, normalized.e164)):
+            ids = index.get(key)
+            if ids is not None:
+                ids.discard(contact_id)
+                if not ids:
+                    del index[key]
+        for trigram in _trigrams(name) | _trigrams(phone):
+            ids = self._by_trigram[trigram]
+            ids.discard(contact_id)
+            if not ids:
+                del self._by_trigram[trigram]
+        for word in set(fuzzy_words(name)):
+            ids = self._by_word[word]
+            ids.discard(contact_id)
+            if not ids:
+                del self._by_word[word]
+                for trigram in word_trigrams(word):
+                    words = self._words_by_trigram[trigram]
+                    words.discard(word)
+                    if not words:
+                        del self._words_by_trigram[trigram]
+
+    def _contact(self, contact_id):
+        name, phone, _ = self._contacts[contact_id]
+        return Contact(name, phone, contact_id)
+
+    @timed
+    def add_contact(self, name, phone):
+        """Adds a new contact and returns its ID"""
+        with self._lock:
+            self._last_id += 1
+            self._index(self._last_id, name, phone)
+            self._changed()
+            return self._last_id
+
+    @timed
+    def add_contacts_bulk(
+        self,
+        contacts,
+        batch_size=DEFAULT_BATCH_SIZE,
+        progress_callback=None,
+        atomic=True,
+        on_duplicate="keep",
+    ):
+        """Adds (name, phone) pairs in batches and returns a BulkResult
+
+        Same semantics as ContactModel.add_contacts_bulk: on failure an
+        atomic add undoes everything, and a non-atomic one keeps the batches
+        before the failing one.
+        """
+        if on_duplicate not in DUPLICATE_MODES:
+            raise ValueError(f"Unknown duplicate mode: {on_duplicate}")
+
+        inserted = updated = skipped = 0
+        undo = []  # (contact id, previous (name, phone) or None), newest last
+        removed = (Counter(), Counter())  # Sorted list entries left by _unindex
+        with self._lock:
+            known = None
+            if on_duplicate != "keep":
+                known = {digits: min(ids) for digits, ids in self._by_digits.items()}
+
+        try:
+            for batch in _batched(contacts, batch_size):
+                with self._lock:
+                    for name, phone in batch:
+                        key = normalize_phone(phone).digits
+                        contact_id = None if known is None else known.get(key)
+                        if contact_id not in self._contacts:
+                            # New, or deleted by another thread since
+                            self._last_id += 1
+                            self._index(self._last_id, name, phone, keep_sorted=False)
+                            undo.append((self._last_id, None))
+                            inserted += 1
+                            if known is not None:
+                                known[key] = self._last_id
+                        elif on_duplicate == "skip":
+                            skipped += 1
+                        else:
+                            undo.append((contact_id, self._contacts[contact_id][:2]))
+                            self._unindex(contact_id, removed)
+                            self._index(contact_id, name, phone, keep_sorted=False)
+                            updated += 1
+                    self._sort_indexes(removed)
+                    self._changed(len(batch))
+
+                if not atomic:
+                    undo.clear()
+                if progress_callback:
+                    progress_callback(inserted + updated + skipped)
+        except BaseException:
+            # Only this call's changes are undone: other threads may have
+            # added contacts since, so the ids it used are not handed out
+            # again
+            with self._lock:
+                for contact_id, previous in reversed(undo):
+                    if contact_id in self._contacts:
+                        self._unindex(contact_id, removed)
+                        if previous is not None:
+                            self._index(contact_id, *previous, keep_sorted=False)
+                self._sort_indexes(removed)
+            raise
+
+        return BulkResult(inserted, updated, skipped)
+
+    @timed
+    def update_contact(self, contact_id, name, phone):
+        """Updates an existing contact"""
+        with self._lock:
+            if contact_id not in self._contacts:
+                return False
+            self._unindex(contact_id)
+            self._index(contact_id, name, phone)
+            self._changed()
+            return True
+
+    @timed
+    def delete_contact(self, contact_id):
+        """Deletes a contact by its ID"""
+        with self._lock:
+            if contact_id not in self._contacts:
+                return False
+            self._unindex(contact_id)
+            self._changed()
+            return True
+
+    @timed
+    def get_contact(self, contact_id):
+        """Gets a contact by its ID"""
+        with self._lock:
+            if contact_id not in self._contacts:
+                return None
+            return self._contact(contact_id)
+
+    @timed
+    def lookup_by_phone(self, phone, min_suffix=MIN_SUFFIX_DIGITS):
+        """Returns the contacts with the given phone number, ordered by name
+
+        Same matching rules as ContactModel.lookup_by_phone.
+        """
+        normalized = normalize_phone(phone)
+        if not normalized.digits:
+            return []
+
+        with self._lock:
+            reversed_digits = normalized.reversed_digits
+            if len(reversed_digits) < min_suffix:
+                ids = set(self._by_digits.get(normalized.digits, ()))
+            else:
+                # Numbers ending with the given digits, then numbers the
+                # given digits end with
+                start = bisect_left(self._by_reversed_phone, (reversed_digits,))
+                end = bisect_left(self._by_reversed_phone, (reversed_digits + ":",))
+                ids = {contact_id for _, contact_id in self._by_reversed_phone[start:end]}
+                for length in range(min_suffix, len(reversed_digits)):
+                    ids.update(self._by_digits.get(reversed_digits[:length][::-1], ()))
+
+                if normalized.e164 is not None:
+                    ids = {i for i in ids if self._contacts[i][2].e164 is None}
+                    ids.update(self._by_e164.get(normalized.e164, ()))
+
+            keys = sorted((self._contacts[i][0], i) for i in ids)
+            return [self._contact(contact_id) for _, contact_id in keys]
+
+    def _matches(self, contact_id, text):
+        name, phone, _ = self._contacts[contact_id]
+        return text in name.lower() or text in phone.lower()
+
+    def _search(self, search_text, after=None, limit=None, offset=0):
+        """Returns the (name, id) keys of the matching contacts in order"""
+        text = search_text.lower()
+        if len(text) >= MIN_INDEXED_SEARCH_LENGTH:
+            # Candidates share every trigram of the text; the smallest sets
+            # are intersected first
+            sets = sorted(
+                (self._by_trigram.get(trigram, set()) for trigram in _trigrams(text)), key=len
+            )
+            ids = sets[0].intersection(*sets[1:])
+            if len(ids) * SORT_CANDIDATES_FRACTION < len(self._contacts):
+                keys = sorted(
+                    (self._contacts[i][0], i) for i in ids if self._matches(i, text)
+                )
+                start = 0 if after is None else bisect_right(keys, tuple(after))
+                matches = iter(keys[start:])
+            else:
+                # Many candidates: walking the names in order lets a limited
+                # search stop early instead of sorting them all
+                start = 0 if after is None else bisect_right(self._by_name, tuple(after))
+                matches = (
+                    key for key in islice(self._by_name, start, None)
+                    if key[1] in ids and self._matches(key[1], text)
+                )
+        else:
+            start = 0 if after is None else bisect_right(self._by_name, tuple(after))
+            matches = islice(self._by_name, start, None)
+            if text:
+                matches = (key for key in matches if self._matches(key[1], text))
+
+        end = None if limit is None else offset + limit
+        return list(islice(matches, offset, end))
+
+    @timed
+    def filter_contacts(self, search_text, limit=None, offset=0):
+        """Returns contacts that match the search text in name or phone"""
+        with self._lock:
+            keys = self._search(search_text, limit=limit, offset=offset)
+            return [self._contact(contact_id) for _, contact_id in keys]
+
+    @timed
+    def page_contacts(self, after=None, limit=DEFAULT_PAGE_SIZE, search_text=""):
+        """Returns the page of contacts that follows the (name, id) key after"""
+        with self._lock:
+            keys = self._search(search_text, after, limit)
+            return [self._contact(contact_id) for _, contact_id in keys]
+
+    @timed
+    def count_contacts(self, search_text=""):
+        """Returns how many contacts match the search text"""
+        with self._lock:
+            if not search_text:
+                return len(self._contacts)
+            return len(self._search(search_text))
+
+    @timed
+    def fuzzy_matches(self, search_text, limit=DEFAULT_FUZZY_LIMIT):
+        """Returns (score, contact) pairs for fuzzy_search, best first
+
+        Matches and ranks exactly like ContactModel.fuzzy_matches.
+        """
+        words = fuzzy_words(search_text)
+        if not words:
+            return []
+
+        with self._lock:
+            tiers = combine_tiers([self._fuzzy_score_sets(word) for word in words])
+            matches = []
+            for total, contact_ids in tiers:
+                remaining = None if limit is None else limit - len(matches)
+                if remaining == 0:
+                    break
+                matches.extend(
+                    (total, self._contact(contact_id))
+                    for contact_id in best_ids(contact_ids, remaining)
+                )
+        return matches
+
+    def _fuzzy_score_sets(self, query):
+        """Returns {score: ids} of the contacts whose best word for query has that score"""
+        budget = edit_budget(query)
+        trigram_words = [
+            self._words_by_trigram.get(trigram, set()) for trigram in word_trigrams(query)
+        ]
+        if budget == 0:
+            # The words query is a prefix of have all of its trigrams
+            words_by_score = {0: [], 1: []}
+            for word in set.intersection(*trigram_words):
+                if word.startswith(query):
+                    words_by_score[0 if word == query else 1].append(word)
+        else:
+            # Like the SQLite index, typos are only looked for in words
+            # without digits
+            words_by_score = {}
+            for word in candidate_words(query, trigram_words):
+                if not has_digits(word):
+                    score = word_score(query, word, budget)
+                    if score is not None:
+                        words_by_score.setdefault(score, []).append(word)
+
+        return best_score_sets({
+            score: set().union(*(self._by_word[word] for word in words))
+            for score, words in words_by_score.items()
+        })
+
+    def snapshot(self, path=None):
+        """Writes every contact to a SQLite database, replacing it atomically
+
+        The database can be opened by ContactModel or loaded back with
+        load_snapshot; contact ids are kept. path defaults to the model's
+        snapshot path.
+        """
+        path = path or self.snapshot_path
+        with self._lock:
+            rows = [
+                (contact_id, name, phone, *normalized)
+                for contact_id, (name, phone, normalized) in self._contacts.items()
+            ]
+            last_id = self._last_id
+
+        temp_path = path + ".tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        with ContactModel(temp_path) as model:
+            conn = model.get_connection()
+            with conn:
+                conn.executemany(
+                    "INSERT INTO contacts "
+                    "(id, name, phone, phone_digits, phone_e164, phone_reversed) "
+                    "VALUES (?, ?, ?, ?, ?, ?)",
+                    rows,
+                )
+                store_contact_words(conn, [(row[0], row[1]) for row in rows])
+                # Ids of deleted contacts are not handed out again
+                conn.execute("DELETE FROM sqlite_sequence WHERE name = 'contacts'")
+                conn.execute(
+                    "INSERT INTO sqlite_sequence (name, seq) VALUES ('contacts', ?)", (last_id,)
+                )
+        os.replace(temp_path, path)
+
+    def load_snapshot(self, path):
+        """Replaces the contacts with those of a SQLite database"""
+        with ContactModel(path) as model:
+            conn = model.get_connection()
+            rows = conn.execute("SELECT id, name, phone FROM contacts").fetchall()
+            row = conn.execute(
+                "SELECT seq FROM sqlite_sequence WHERE name = 'contacts'"
+            ).fetchone()
+
+        with self._lock:
+            self._contacts.clear()
+            for index in (self._by_name, self._by_reversed_phone):
+                index.clear()
+            for index in (
+                self._by_digits, self._by_e164, self._by_trigram,
+                self._by_word, self._words_by_trigram,
+            ):
+                index.clear()
+            for contact_id, name, phone in rows:
+                self._index(contact_id, name, phone, keep_sorted=False)
+            self._sort_indexes()
+            self._last_id = max(row[0] if row else 0, max(self._contacts, default=0))
+            self._changed()
@@ -0,0 +1,489 @@
+import sqlite3
+import time
+from collections import namedtuple
+from model.fuzzy import store_contact_words
+from model.phone import normalize_phone, phone_key
+
+
+# Rows processed per committed batch when a migration fills existing rows
+BACKFILL_BATCH_SIZE = 10000
+
+# A schema change. schema(conn) runs inside a transaction and returns whether
+# existing rows must then be filled by backfill(conn, first_id, last_id), which
+# is called for consecutive id ranges, each in its own transaction. Backfills
+# may be deferred until after later schema changes (see migrate), which must
+# therefore not depend on them.
+Migration = namedtuple("Migration", ["version", "description", "schema", "backfill"])
+
+# Result of one migration step
+StepReport = namedtuple("StepReport", ["version", "description", "duration", "applied"])
+
+# Registered migrations in version order
+MIGRATIONS = []
+
+# Versions whose backfilled rows the models' queries rely on
+SEARCH_INDEX_VERSION = 2
+PHONE_DIGITS_VERSION = 4
+PHONE_LOOKUP_VERSION = 5
+CHANGE_JOURNAL_VERSION = 6
+FUZZY_INDEX_VERSION = 7
+
+
+def migration(version, description, backfill=None):
+    """Decorator that registers a schema function as a migration"""
+
+    def decorator(schema):
+        MIGRATIONS.append(Migration(version, description, schema, backfill))
+        MIGRATIONS.sort(key=lambda step: step.version)
+        return schema
+
+    return decorator
+
+
+def get_version(conn):
+    """Returns the schema version stored in PRAGMA user_version"""
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def latest_version():
+    """Returns the version a fully migrated database has"""
+    return MIGRATIONS[-1].version
+
+
+def pending_migrations(conn):
+    """Returns the migrations the database has not applied yet"""
+    version = get_version(conn)
+    return [step for step in MIGRATIONS if step.version > version]
+
+
+def table_exists(conn, name):
+    """Whether a table (or virtual table) exists"""
+    row = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (name,)
+    ).fetchone()
+    return row is not None
+
+
+def pending_backfills(conn):
+    """Returns the versions whose schema is applied but whose rows are not all filled yet"""
+    if not table_exists(conn, "migration_progress"):
+        return []
+    return [
+        version for (version,) in conn.execute(
+            "SELECT version FROM migration_progress WHERE version <= ? ORDER BY version",
+            (get_version(conn),),
+        )
+    ]
+
+
+def _find_step(version):
+    """Returns the registered migration with a version"""
+    return next(step for step in MIGRATIONS if step.version == version)
+
+
+def migrate(conn, dry_run=False, batch_size=BACKFILL_BATCH_SIZE, report=None,
+            defer_backfills=False):
+    """Applies the pending migrations in order and returns a StepReport for each
+
+    Every step's schema change and version bump are transactional. Steps
+    that fill existing rows do it in committed batches of batch_size ids and
+    record their progress, so a large database never holds the write lock for
+    long and an interrupted upgrade resumes where it stopped. With dry_run the
+    pending steps are reported but not applied. report, if given, is called
+    with each StepReport as soon as the step finishes.
+
+    With defer_backfills only the schema changes are applied: the rows to
+    fill are recorded, and run_backfill fills them later (for example on a
+    background thread). Otherwise backfills deferred earlier are finished
+    too, after the pending steps.
+    """
+    reports = []
+
+    def finish(step, started):
+        step_report = StepReport(
+            step.version, step.description, time.perf_counter() - started, not dry_run
+        )
+        reports.append(step_report)
+        if report:
+            report(step_report)
+
+    for step in pending_migrations(conn):
+        started = time.perf_counter()
+        if not dry_run and _apply_schema(conn, step, defer_backfills) and not defer_backfills:
+            _backfill(conn, step, batch_size)
+        finish(step, started)
+
+    if not defer_backfills:
+        for version in pending_backfills(conn):
+            started = time.perf_counter()
+            if not dry_run:
+                _backfill(conn, _find_step(version), batch_size)
+            finish(_find_step(version), started)
+
+    return reports
+
+
+def run_backfill(conn, version, batch_size=BACKFILL_BATCH_SIZE, cancelled=None):
+    """Fills the remaining rows of a deferred migration and returns whether it finished
+
+    cancelled, if given, is called before every batch; once it returns true
+    the backfill stops, and the next call resumes it. Several connections
+    may run the same backfill; each batch is filled once.
+    """
+    return _backfill(conn, _find_step(version), batch_size, cancelled)
+
+
+def _apply_schema(conn, step, defer_backfill):
+    """Applies a migration's schema change and returns whether rows must be filled
+
+    The version is bumped now unless the rows are filled right after.
+    """
+    with _transaction(conn):
+        conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS migration_progress (
+                version INTEGER PRIMARY KEY,
+                last_id INTEGER NOT NULL,
+                end_id INTEGER NOT NULL
+            )
+        """
+        )
+        progress = conn.execute(
+            "SELECT last_id, end_id FROM migration_progress WHERE version = ?",
+            (step.version,),
+        ).fetchone()
+
+        needs_backfill = step.schema(conn)
+        if progress is None and needs_backfill and step.backfill:
+            # Rows added after this point are handled by the new schema
+            end_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM contacts").fetchone()[0]
+            progress = (0, end_id)
+            conn.execute(
+                "INSERT INTO migration_progress (version, last_id, end_id) VALUES (?, 0, ?)",
+                (step.version, end_id),
+            )
+
+        if progress is None or defer_backfill:
+            conn.execute(f"PRAGMA user_version = {step.version}")
+    return progress is not None
+
+
+def _backfill(conn, step, batch_size, cancelled=None):
+    """Fills a migration's rows in committed batches, then bumps the version if needed"""
+    while True:
+        if cancelled is not None and cancelled():
+            return False
+        # Immediate, so connections running the same backfill take turns
+        with _transaction(conn, immediate=True):
+            progress = conn.execute(
+                "SELECT last_id, end_id FROM migration_progress WHERE version = ?",
+                (step.version,),
+            ).fetchone()
+            if progress is None:
+                return True  # Finished by another connection
+
+            last_id, end_id = progress
+            if last_id >= end_id:
+                conn.execute("DELETE FROM migration_progress WHERE version = ?", (step.version,))
+                if get_version(conn) < step.version:
+                    conn.execute(f"PRAGMA user_version = {step.version}")
+                return True
+
+            batch_end = min(last_id + batch_size, end_id)
+            step.backfill(conn, last_id + 1, batch_end)
+            conn.execute(
+                "UPDATE migration_progress SET last_id = ? WHERE version = ?",
+                (batch_end, step.version),
+            )
+
+
+class _transaction:
+    def __init__(self, conn, immediate=False):
+        """Explicit transaction that also covers DDL statements"""
+        self.conn = conn
+        self.immediate = immediate
+
+    def __enter__(self):
+        self.conn.execute("BEGIN IMMEDIATE" if self.immediate else "BEGIN")
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is None:
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+
+
+@migration(1, "Create contacts table")
+def _create_contacts(conn):
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS contacts (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            phone TEXT NOT NULL
+        )
+    """
+    )
+    return False
+
+
+def _backfill_search_index(conn, first_id, last_id):
+    conn.execute(
+        "INSERT INTO contacts_fts (rowid, name, phone) "
+        "SELECT id, name, phone FROM contacts WHERE id BETWEEN ? AND ?",
+        (first_id, last_id),
+    )
+
+
+@migration(
+    SEARCH_INDEX_VERSION, "Create trigram search index", backfill=_backfill_search_index
+)
+def _create_search_index(conn):
+    if table_exists(conn, "contacts_fts"):
+        return False  # Built before migrations were versioned
+
+    try:
+        # External content table: the index stores only trigrams and reads
+        # names and phones back from the contacts table
+        conn.execute(
+            """
+            CREATE VIRTUAL TABLE contacts_fts USING fts5(
+                name,
+                phone,
+                content='contacts',
+                content_rowid='id',
+                tokenize='trigram'
+            )
+        """
+        )
+    except sqlite3.OperationalError:
+        # SQLite was built without FTS5 or the trigram tokenizer; searches
+        # fall back to scanning the table
+        return False
+
+    # Keep the index in sync with the contacts table
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_insert
+        AFTER INSERT ON contacts BEGIN
+            INSERT INTO contacts_fts (rowid, name, phone)
+            VALUES (new.id, new.name, new.phone);
+        END
+    """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_delete
+        AFTER DELETE ON contacts BEGIN
+            INSERT INTO contacts_fts (contacts_fts, rowid, name, phone)
+            VALUES ('delete', old.id, old.name, old.phone);
+        END
+    """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contacts_fts_update
+        AFTER UPDATE OF name, phone ON contacts BEGIN
+            INSERT INTO contacts_fts (contacts_fts, rowid, name, phone)
+            VALUES ('delete', old.id, old.name, old.phone);
+            INSERT INTO contacts_fts (rowid, name, phone)
+            VALUES (new.id, new.name, new.phone);
+        END
+    """
+    )
+    return True
+
+
+@migration(3, "Index contacts by name")
+def _create_name_index(conn):
+    # Lets ORDER BY name, id (and keyset pages of it) read rows in index
+    # order instead of sorting the whole table. The rowid is part of every
+    # index entry, so this is a (name, id) index.
+    conn.execute("CREATE INDEX IF NOT EXISTS contacts_name_idx ON contacts (name)")
+    return False
+
+
+def _backfill_phone_digits(conn, first_id, last_id):
+    rows = conn.execute(
+        "SELECT phone, id FROM contacts "
+        "WHERE id BETWEEN ? AND ? AND phone_digits IS NULL",
+        (first_id, last_id),
+    ).fetchall()
+    conn.executemany(
+        "UPDATE contacts SET phone_digits = ? WHERE id = ?",
+        [(phone_key(phone), contact_id) for phone, contact_id in rows],
+    )
+
+
+@migration(
+    PHONE_DIGITS_VERSION, "Add normalized phone column", backfill=_backfill_phone_digits
+)
+def _add_phone_digits(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(contacts)")]
+    if "phone_digits" not in columns:
+        conn.execute("ALTER TABLE contacts ADD COLUMN phone_digits TEXT")
+
+    # Not unique: "keep" imports and older databases may hold duplicates
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS contacts_phone_digits_idx ON contacts (phone_digits)"
+    )
+    return True
+
+
+def _backfill_phone_lookup(conn, first_id, last_id):
+    rows = conn.execute(
+        "SELECT phone, id FROM contacts "
+        "WHERE id BETWEEN ? AND ? AND phone_reversed IS NULL",
+        (first_id, last_id),
+    ).fetchall()
+    updates = []
+    for phone, contact_id in rows:
+        normalized = normalize_phone(phone)
+        updates.append((normalized.e164, normalized.reversed_digits, contact_id))
+    conn.executemany(
+        "UPDATE contacts SET phone_e164 = ?, phone_reversed = ? WHERE id = ?", updates
+    )
+
+
+@migration(
+    PHONE_LOOKUP_VERSION,
+    "Add E.164 and reversed-digit phone columns",
+    backfill=_backfill_phone_lookup,
+)
+def _add_phone_lookup(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(contacts)")]
+    if "phone_e164" not in columns:
+        conn.execute("ALTER TABLE contacts ADD COLUMN phone_e164 TEXT")
+    if "phone_reversed" not in columns:
+        conn.execute("ALTER TABLE contacts ADD COLUMN phone_reversed TEXT")
+
+    # Exact lookups by international number, and suffix lookups as range
+    # scans over the reversed digits (a number's trailing digits become a
+    # prefix)
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS contacts_phone_e164_idx ON contacts (phone_e164)"
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS contacts_phone_reversed_idx ON contacts (phone_reversed)"
+    )
+    return True
+
+
+def _backfill_contact_uids(conn, first_id, last_id):
+    # The journal's update trigger records every contact given a uid here,
+    # so the first export of an upgraded database holds all of them
+    conn.execute(
+        "UPDATE contacts SET uid = lower(hex(randomblob(16))) "
+        "WHERE id BETWEEN ? AND ? AND uid IS NULL",
+        (first_id, last_id),
+    )
+
+
+@migration(CHANGE_JOURNAL_VERSION, "Create change journal", backfill=_backfill_contact_uids)
+def _create_change_journal(conn):
+    columns = [row[1] for row in conn.execute("PRAGMA table_info(contacts)")]
+    if "uid" not in columns:
+        # Ids are local to a database; uids identify a contact everywhere
+        # its changes are applied
+        conn.execute("ALTER TABLE contacts ADD COLUMN uid TEXT")
+    conn.execute("CREATE UNIQUE INDEX IF NOT EXISTS contacts_uid_idx ON contacts (uid)")
+
+    # The latest change of every contact: each write replaces the contact's
+    # row with one numbered after every earlier change, so the changes since
+    # a sequence number are a range scan and hold each contact once. A uid
+    # missing from contacts was deleted. AUTOINCREMENT never hands out a
+    # number twice, even after deletes.
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS contact_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            uid TEXT NOT NULL UNIQUE
+        )
+    """
+    )
+
+    # Contacts inserted without a uid get one; the update below is journaled
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contacts_uid_insert
+        AFTER INSERT ON contacts WHEN new.uid IS NULL BEGIN
+            UPDATE contacts SET uid = lower(hex(randomblob(16))) WHERE id = new.id;
+        END
+    """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contact_changes_insert
+        AFTER INSERT ON contacts WHEN new.uid IS NOT NULL BEGIN
+            INSERT OR REPLACE INTO contact_changes (uid) VALUES (new.uid);
+        END
+    """
+    )
+    # Updates that change nothing are not journaled, so applying a contact's
+    # own changes back to it does not bounce them between databases
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contact_changes_update
+        AFTER UPDATE OF name, phone, uid ON contacts
+        WHEN new.uid IS NOT NULL AND (
+            old.name IS NOT new.name OR old.phone IS NOT new.phone OR old.uid IS NOT new.uid
+        ) BEGIN
+            INSERT OR REPLACE INTO contact_changes (uid) VALUES (new.uid);
+        END
+    """
+    )
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contact_changes_delete
+        AFTER DELETE ON contacts WHEN old.uid IS NOT NULL BEGIN
+            INSERT OR REPLACE INTO contact_changes (uid) VALUES (old.uid);
+        END
+    """
+    )
+    return True
+
+
+def _backfill_contact_words(conn, first_id, last_id):
+    rows = conn.execute(
+        "SELECT id, name FROM contacts WHERE id BETWEEN ? AND ?", (first_id, last_id)
+    ).fetchall()
+    store_contact_words(conn, rows)
+
+
+@migration(FUZZY_INDEX_VERSION, "Create fuzzy name index", backfill=_backfill_contact_words)
+def _create_fuzzy_index(conn):
+    # The normalized words of every name, and the trigrams of every distinct
+    # word: fuzzy searches find the words close to a query word through
+    # their shared trigrams, then the contacts with those words
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS contact_words (
+            word TEXT NOT NULL,
+            contact_id INTEGER NOT NULL,
+            PRIMARY KEY (word, contact_id)
+        ) WITHOUT ROWID
+    """
+    )
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS contact_words_contact_idx ON contact_words (contact_id)"
+    )
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS word_trigrams (
+            trigram TEXT NOT NULL,
+            word TEXT NOT NULL,
+            PRIMARY KEY (trigram, word)
+        ) WITHOUT ROWID
+    """
+    )
+    # Words need Python to split names, so ContactModel indexes the names it
+    # inserts and updates (see store_contact_words); deletes need no Python
+    conn.execute(
+        """
+        CREATE TRIGGER IF NOT EXISTS contact_words_delete
+        AFTER DELETE ON contacts BEGIN
+            DELETE FROM contact_words WHERE contact_id = old.id;
+        END
+    """
+    )
+    return True
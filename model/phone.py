@@ -0,0 +1,90 @@
+import re
+from collections import namedtuple
+
+
+# Country calling code given to numbers written without one (for example
+# "1"), or None to store such numbers without an E.164 form. Lookups still
+# find them by their trailing digits.
+DEFAULT_COUNTRY_CODE = None
+
+# E.164 numbers have at most this many digits, country code included
+MAX_E164_DIGITS = 15
+
+# Fewest trailing digits two numbers of different lengths must share to be
+# considered the same number by a suffix lookup
+MIN_SUFFIX_DIGITS = 7
+
+# Digits and the separators people write between them, with an optional
+# leading + for international numbers
+_PHONE_PATTERN = r"\+?[0-9 ().\-/]*[0-9][0-9 ().\-/]*"
+_phone_match = re.compile(_PHONE_PATTERN).fullmatch
+_phone_bytes_match = re.compile(_PHONE_PATTERN.encode("ascii")).fullmatch
+
+# Shown when a phone number fails is_valid_phone
+PHONE_FORMAT_MESSAGE = (
+    "Phone must contain only numbers, spaces, ( ) - . / and an optional leading +."
+)
+
+# The stored forms of a phone number: its digits, its E.164 form (None when
+# it cannot be determined) and its digits reversed, for suffix lookups
+NormalizedPhone = namedtuple("NormalizedPhone", ["digits", "e164", "reversed_digits"])
+
+
+def phone_key(phone):
+    """Returns the digits of a phone number, used to spot duplicates"""
+    return "".join(char for char in phone if char.isdigit())
+
+
+def is_valid_phone(phone):
+    """Whether phone is digits with optional separators and a leading +
+
+    Accepts str or, for the importer, ASCII bytes.
+    """
+    if isinstance(phone, bytes):
+        return phone.isdigit() or _phone_bytes_match(phone) is not None
+    return _phone_match(phone) is not None
+
+
+def to_e164(phone, country_code=DEFAULT_COUNTRY_CODE):
+    """Returns phone as +<country code><number>, or None if that is unknown
+
+    Numbers written with a leading + or the 00 international prefix carry
+    their country code; others get country_code, after dropping a national
+    trunk prefix 0.
+    """
+    digits = phone_key(phone)
+    if phone.lstrip().startswith("+"):
+        number = digits
+    elif digits.startswith("00"):
+        number = digits[2:]
+    elif country_code:
+        number = country_code + digits.lstrip("0")
+    else:
+        return None
+
+    if not number or number[0] == "0" or len(number) > MAX_E164_DIGITS:
+        return None
+    return "+" + number
+
+
+def normalize_phone(phone, country_code=DEFAULT_COUNTRY_CODE):
+    """Returns the NormalizedPhone stored alongside phone"""
+    digits = phone_key(phone)
+    return NormalizedPhone(digits, to_e164(phone, country_code), digits[::-1])
+
+
+def phones_match(stored, query, min_suffix=MIN_SUFFIX_DIGITS):
+    """Whether a stored and a looked-up NormalizedPhone match, as in lookup_by_phone
+
+    Used for rows whose normalized columns are not filled yet; lookups
+    otherwise run on the indexes of those columns.
+    """
+    if len(query.reversed_digits) < min_suffix:
+        return stored.digits == query.digits
+    if query.e164 is not None and stored.e164 is not None:
+        return stored.e164 == query.e164
+    stored_digits = stored.reversed_digits
+    return stored_digits.startswith(query.reversed_digits) or (
+        min_suffix <= len(stored_digits) < len(query.reversed_digits)
+        and query.reversed_digits.startswith(stored_digits)
+    )
@@ -0,0 +1,196 @@
+from abc import ABC, abstractmethod
+from array import array
+from collections import namedtuple
+from model.fuzzy import DEFAULT_FUZZY_LIMIT
+from model.phone import MIN_SUFFIX_DIGITS, phone_key
+
+
+# Number of rows written per executemany call during bulk inserts
+DEFAULT_BATCH_SIZE = 5000
+
+# Default number of contacts per page_contacts call
+DEFAULT_PAGE_SIZE = 200
+
+# How add_contacts_bulk treats a contact whose phone is already stored:
+# keep both, skip the new one, or update the existing contact's name
+DUPLICATE_MODES = ("keep", "skip", "update")
+
+# Contacts as parallel columns: an array of ids and lists of names and phones
+ContactColumns = namedtuple("ContactColumns", ["ids", "names", "phones"])
+
+# Outcome of add_contacts_bulk
+BulkResult = namedtuple("BulkResult", ["inserted", "updated", "skipped"])
+
+
+class Contact:
+    __slots__ = ("name", "phone", "contact_id")
+
+    def __init__(self, name="", phone="", contact_id=None):
+        self.name = name
+        self.phone = phone
+        self.contact_id = contact_id
+
+
+def group_duplicates(contacts):
+    """Returns groups of contacts that look like the same person
+
+    Contacts are grouped when they share a normalized phone or a
+    case-folded, whitespace-collapsed name, transitively. contacts must be
+    in (name, id) order; each group is a list of Contacts in that order,
+    and only groups with more than one contact are returned.
+    """
+    parent = {}
+
+    def find(contact_id):
+        root = contact_id
+        while parent[root] != root:
+            root = parent[root]
+        # Path compression keeps later lookups short
+        while parent[contact_id] != root:
+            parent[contact_id], contact_id = root, parent[contact_id]
+        return root
+
+    ordered = []
+    first_by_phone = {}
+    first_by_name = {}
+    for contact in contacts:
+        ordered.append(contact)
+        contact_id = contact.contact_id
+        parent[contact_id] = contact_id
+
+        name_key = " ".join(contact.name.casefold().split())
+        keys = ((first_by_phone, phone_key(contact.phone)), (first_by_name, name_key))
+        for index, key in keys:
+            if not key:
+                continue
+            other = index.setdefault(key, contact_id)
+            if other != contact_id:
+                parent[find(contact_id)] = find(other)
+
+    groups = {}
+    for contact in ordered:
+        groups.setdefault(find(contact.contact_id), []).append(contact)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+class ContactRepository(ABC):
+    """Interface of a contact store
+
+    Implemented by ContactModel (SQLite), ShardedContactModel and
+    InMemoryContactModel, so the controller and ImportExportModel work with
+    any of them. Contacts are always returned in (name, id) order. A search matches
+    contacts whose name or phone contains the text, ignoring case.
+    """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @abstractmethod
+    def close(self):
+        """Releases the resources held by the repository"""
+
+    def run_backfills(self, cancelled=None):
+        """Finishes schema upgrades deferred to a background thread
+
+        Returns whether they all finished; engines that never defer them
+        have nothing to do.
+        """
+        return True
+
+    @abstractmethod
+    def get_data_version(self):
+        """Returns a value that changes when another thread or connection writes"""
+
+    @abstractmethod
+    def add_contact(self, name, phone):
+        """Adds a new contact and returns its ID"""
+
+    @abstractmethod
+    def add_contacts_bulk(
+        self,
+        contacts,
+        batch_size=DEFAULT_BATCH_SIZE,
+        progress_callback=None,
+        atomic=True,
+        on_duplicate="keep",
+    ):
+        """Adds (name, phone) pairs in batches and returns a BulkResult"""
+
+    @abstractmethod
+    def update_contact(self, contact_id, name, phone):
+        """Updates an existing contact and returns whether it existed"""
+
+    @abstractmethod
+    def delete_contact(self, contact_id):
+        """Deletes a contact and returns whether it existed"""
+
+    @abstractmethod
+    def get_contact(self, contact_id):
+        """Gets a contact by its ID, or None"""
+
+    @abstractmethod
+    def lookup_by_phone(self, phone, min_suffix=MIN_SUFFIX_DIGITS):
+        """Returns the contacts with the given phone number"""
+
+    @abstractmethod
+    def filter_contacts(self, search_text, limit=None, offset=0):
+        """Returns contacts that match the search text in name or phone"""
+
+    @abstractmethod
+    def page_contacts(self, after=None, limit=DEFAULT_PAGE_SIZE, search_text=""):
+        """Returns the page of contacts that follows the (name, id) key after"""
+
+    @abstractmethod
+    def count_contacts(self, search_text=""):
+        """Returns how many contacts match the search text"""
+
+    @abstractmethod
+    def fuzzy_matches(self, search_text, limit=DEFAULT_FUZZY_LIMIT):
+        """Returns (score, contact) pairs for fuzzy_search, best first"""
+
+    def fuzzy_search(self, search_text, limit=DEFAULT_FUZZY_LIMIT):
+        """Returns up to limit contacts whose names are close to search_text, best first
+
+        Every word of search_text must match a word of the name, in any
+        order, exactly, as a prefix or within a few typos (see
+        model.fuzzy.word_score). Contacts are ranked by their summed word
+        scores, then by id, oldest first. limit=None returns every match.
+        """
+        return [contact for _, contact in self.fuzzy_matches(search_text, limit)]
+
+    def get_all_contacts(self, limit=None, offset=0):
+        """Returns all contacts, optionally a window of limit rows from offset"""
+        return self.filter_contacts("", limit, offset)
+
+    def iter_contacts(self, chunk_size=DEFAULT_BATCH_SIZE, search_text=""):
+        """Yields contacts sorted by name, fetching chunk_size rows at a time
+
+        The contacts are walked in keyset pages, so nothing stays open
+        between chunks.
+        """
+        after = None
+        while True:
+            contacts = self.page_contacts(after, chunk_size, search_text)
+            yield from contacts
+            if len(contacts) < chunk_size:
+                return
+            after = (contacts[-1].name, contacts[-1].contact_id)
+
+    def get_contact_columns(self, search_text="", limit=None, offset=0):
+        """Returns the contacts filter_contacts would return as ContactColumns"""
+        columns = ContactColumns(array("q"), [], [])
+        for contact in self.filter_contacts(search_text, limit, offset):
+            columns.ids.append(contact.contact_id)
+            columns.names.append(contact.name)
+            columns.phones.append(contact.phone)
+        return columns
+
+    def find_duplicates(self):
+        """Returns groups of contacts that look like the same person
+
+        See group_duplicates.
+        """
+        return group_duplicates(self.iter_contacts())
@@ -0,0 +1,448 @@
+import heapq
+import json
+import os
+import queue
+import shutil
+import threading
+import zlib
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from operator import attrgetter
+from model.contact_model import ContactModel
+from model.fuzzy import DEFAULT_FUZZY_LIMIT
+from model.instrumentation import timed
+from model.phone import MIN_SUFFIX_DIGITS, phone_key
+from model.repository import (
+    DEFAULT_BATCH_SIZE,
+    DEFAULT_PAGE_SIZE,
+    DUPLICATE_MODES,
+    BulkResult,
+    ContactRepository,
+)
+
+
+# Shards a new store is created with
+DEFAULT_SHARD_COUNT = 4
+
+# File in a sharded store's directory that records its shard count
+MANIFEST_NAME = "shards.json"
+
+# Batches queued per shard while add_contacts_bulk distributes contacts
+BULK_QUEUED_BATCHES = 4
+
+# Seconds between checks for a failed shard while a bulk add waits on a queue
+BULK_POLL_INTERVAL = 0.1
+
+# Order of merged shard results
+_order_key = attrgetter("name", "contact_id")
+
+
+def _fuzzy_order_key(match):
+    """Order of merged (score, contact) fuzzy matches"""
+    score, contact = match
+    return score, contact.contact_id
+
+
+class _ShardAborted(Exception):
+    """Raised in a shard's bulk add when another shard failed"""
+
+
+def is_sharded_store(path):
+    """Whether path is the directory of a sharded store"""
+    return os.path.isfile(os.path.join(path, MANIFEST_NAME))
+
+
+def open_model(path, pragmas=None):
+    """Opens a ShardedContactModel for a sharded store, else a ContactModel"""
+    if is_sharded_store(path):
+        return ShardedContactModel(path, pragmas=pragmas)
+    return ContactModel(path, pragmas)
+
+
+class ShardedContactModel(ContactRepository):
+    def __init__(self, directory, shard_count=None, pragmas=None):
+        """A contact store split across shard_count SQLite files
+
+        Offers the ContactModel interface. A new contact goes to the shard
+        picked by a hash of its phone's digits, so contacts sharing a phone
+        share a shard and duplicate handling stays per shard. An update
+        keeps a contact (and its id) in its shard even when the new phone
+        hashes to another one, so bulk adds that skip or update duplicates
+        send such a phone to the shard holding it. IDs
+        are local_id * shard_count + shard, which makes them unique across
+        shards and routes every update, delete and get to a single file.
+        Queries run on every shard in parallel and their (name, id) ordered
+        results are merged, so each file keeps its own write lock and can
+        be vacuumed on its own core or disk.
+
+        The shard count of an existing store is read from its manifest;
+        passing a different shard_count raises ValueError.
+        """
+        self.db_path = directory
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        if os.path.isfile(manifest_path):
+            with open(manifest_path, encoding="utf-8") as file:
+                stored_count = json.load(file)["shards"]
+            if shard_count is not None and shard_count != stored_count:
+                raise ValueError(
+                    f"{directory} has {stored_count} shards, not {shard_count}"
+                )
+            shard_count = stored_count
+        else:
+            shard_count = shard_count or DEFAULT_SHARD_COUNT
+            if shard_count < 1:
+                raise ValueError("A sharded store needs at least one shard")
+            os.makedirs(directory, exist_ok=True)
+            with open(manifest_path, "w", encoding="utf-8") as file:
+                json.dump({"shards": shard_count}, file)
+
+        self.shard_count = shard_count
+        self.shards = [
+            ContactModel(os.path.join(directory, f"shard-{index:03d}.db"), pragmas)
+            for index in range(shard_count)
+        ]
+        self.search_index_enabled = all(shard.search_index_enabled for shard in self.shards)
+        self._executor = ThreadPoolExecutor(shard_count, "contacts-shard")
+        # Bulk adds hold a thread per shard for their whole run, so they get
+        # their own threads and never block queries
+        self._bulk_executor = ThreadPoolExecutor(shard_count, "contacts-shard-bulk")
+
+    def close(self):
+        """Closes all database connections held by the shards"""
+        self._executor.shutdown()
+        self._bulk_executor.shutdown()
+        for shard in self.shards:
+            shard.close()
+
+    def _global_id(self, index, local_id):
+        return local_id * self.shard_count + index
+
+    def _locate(self, contact_id):
+        """Returns (shard, local id) for a global contact id"""
+        index = contact_id % self.shard_count
+        return self.shards[index], contact_id // self.shard_count
+
+    def _shard_index_for(self, phone):
+        return self._shard_index_for_key(phone_key(phone))
+
+    def _shard_index_for_key(self, key):
+        # crc32 rather than hash(), which changes between processes
+        return zlib.crc32(key.encode("ascii")) % self.shard_count
+
+    def _moved_phone_keys(self):
+        """Returns {phone key: shard index} for the phones stored outside their hash's shard"""
+        def moved(index, shard):
+            return [key for key in shard.phone_keys() if self._shard_index_for_key(key) != index]
+
+        shards_by_key = {}
+        for index, keys in enumerate(self._fan_out(moved)):
+            for key in keys:
+                shards_by_key.setdefault(key, index)
+        return shards_by_key
+
+    def _globalize(self, index, contacts):
+        """Converts the ids of a shard's contacts to global ids in place"""
+        for contact in contacts:
+            contact.contact_id = self._global_id(index, contact.contact_id)
+        return contacts
+
+    def _fan_out(self, fn):
+        """Runs fn(index, shard) on every shard in parallel and returns the results"""
+        futures = [
+            self._executor.submit(fn, index, shard) for index, shard in enumerate(self.shards)
+        ]
+        return [future.result() for future in futures]
+
+    def _merge(self, fn, limit=None, offset=0):
+        """Merges the (name, id) ordered contact lists fn(index, shard) returns"""
+        results = self._fan_out(lambda index, shard: self._globalize(index, fn(index, shard)))
+        merged = heapq.merge(*results, key=_order_key)
+        end = None if limit is None else offset + limit
+        return list(islice(merged, offset, end))
+
+    def get_data_version(self):
+        """Returns a value that changes whenever another connection commits to a shard"""
+        return tuple(shard.get_data_version() for shard in self.shards)
+
+    def get_stats(self):
+        """Returns a dict describing the size and state of the shards combined"""
+        stats = self._fan_out(lambda index, shard: shard.get_stats())
+        return {
+            "contacts": sum(s["contacts"] for s in stats),
+            "schema_version": min(s["schema_version"] for s in stats),
+            "search_index": all(s["search_index"] for s in stats),
+            "page_size": stats[0]["page_size"],
+            "pages": sum(s["pages"] for s in stats),
+            "free_pages": sum(s["free_pages"] for s in stats),
+            "size_bytes": sum(s["size_bytes"] for s in stats),
+            "shards": self.shard_count,
+        }
+
+    @timed
+    def vacuum(self):
+        """Vacuums every shard in parallel and returns the total size before and after"""
+        sizes = self._fan_out(lambda index, shard: shard.vacuum())
+        return sum(before for before, _ in sizes), sum(after for _, after in sizes)
+
+    @timed
+    def add_contact(self, name, phone):
+        """Adds a new contact to its shard and returns its global ID"""
+        index = self._shard_index_for(phone)
+        return self._global_id(index, self.shards[index].add_contact(name, phone))
+
+    @timed
+    def add_contacts_bulk(
+        self,
+        contacts,
+        batch_size=DEFAULT_BATCH_SIZE,
+        progress_callback=None,
+        atomic=True,
+        on_duplicate="keep",
+    ):
+        """Adds (name, phone) pairs to their shards in parallel and returns a BulkResult
+
+        Works like ContactModel.add_contacts_bulk, with every shard writing
+        its share on its own thread. In atomic mode the shards only commit
+        once all of them have written everything, and a failure in any
+        shard rolls all of them back; the commits themselves are not
+        coordinated, so a failure while committing can leave some shards
+        committed. To skip or update duplicates, the shards are first scanned
+        for phones that update_contact left outside their hash's shard.
+        """
+        if on_duplicate not in DUPLICATE_MODES:
+            raise ValueError(f"Unknown duplicate mode: {on_duplicate}")
+
+        # Duplicates of contacts whose phone was changed by update_contact
+        # must go to the shard holding them
+        moved = {} if on_duplicate == "keep" else self._moved_phone_keys()
+        queues = [queue.Queue(BULK_QUEUED_BATCHES) for _ in self.shards]
+        failed = threading.Event()
+        written = threading.Barrier(self.shard_count)
+        processed = [0] * self.shard_count
+        progress_lock = threading.Lock()
+
+        def feed(index):
+            while True:
+                try:
+                    batch = queues[index].get(timeout=BULK_POLL_INTERVAL)
+                except queue.Empty:
+                    if failed.is_set():
+                        raise _ShardAborted() from None
+                    continue
+                if batch is None:
+                    break
+                yield from batch
+            if failed.is_set():
+                raise _ShardAborted()
+
+        def before_commit():
+            # Hold the commit until every shard has written its last batch
+            try:
+                written.wait()
+            except threading.BrokenBarrierError:
+                raise _ShardAborted() from None
+            if failed.is_set():
+                raise _ShardAborted()
+
+        def report(index, count):
+            with progress_lock:
+                processed[index] = count
+                total = sum(processed)
+                if progress_callback:
+                    progress_callback(total)
+
+        def add(index, shard):
+            try:
+                return shard.add_contacts_bulk(
+                    feed(index),
+                    batch_size,
+                    lambda count: report(index, count),
+                    atomic,
+                    on_duplicate,
+                    before_commit if atomic else None,
+                )
+            except BaseException:
+                failed.set()
+                written.abort()
+                raise
+
+        def put(index, batch):
+            while not failed.is_set():
+                try:
+                    queues[index].put(batch, timeout=BULK_POLL_INTERVAL)
+                    return
+                except queue.Full:
+                    pass
+
+        futures = [
+            self._bulk_executor.submit(add, index, shard)
+            for index, shard in enumerate(self.shards)
+        ]
+        try:
+            pending = [[] for _ in self.shards]
+            for name, phone in contacts:
+                if failed.is_set():
+                    break
+                key = phone_key(phone)
+                index = moved.get(key)
+                if index is None:
+                    index = self._shard_index_for_key(key)
+                pending[index].append((name, phone))
+                if len(pending[index]) >= batch_size:
+                    put(index, pending[index])
+                    pending[index] = []
+            for index, batch in enumerate(pending):
+                if batch:
+                    put(index, batch)
+                put(index, None)
+        except BaseException:
+            failed.set()
+            written.abort()
+            for future in futures:
+                future.exception()
+            raise
+
+        results = []
+        errors = []
+        for future in futures:
+            error = future.exception()
+            if error is None:
+                results.append(future.result())
+            elif not isinstance(error, _ShardAborted):
+                errors.append(error)
+        if errors:
+            raise errors[0]
+        return BulkResult(*(sum(column) for column in zip(*results)))
+
+    @timed
+    def update_contact(self, contact_id, name, phone):
+        """Updates an existing contact in its shard
+
+        The contact stays in the shard it was added to, even if the new
+        phone hashes to another one, so its id does not change; see
+        add_contacts_bulk for how its duplicates are found.
+        """
+        shard, local_id = self._locate(contact_id)
+        return shard.update_contact(local_id, name, phone)
+
+    @timed
+    def delete_contact(self, contact_id):
+        """Deletes a contact by its ID"""
+        shard, local_id = self._locate(contact_id)
+        return shard.delete_contact(local_id)
+
+    @timed
+    def get_contact(self, contact_id):
+        """Gets a contact by its ID"""
+        shard, local_id = self._locate(contact_id)
+        contact = shard.get_contact(local_id)
+        if contact is not None:
+            contact.contact_id = contact_id
+        return contact
+
+    @timed
+    def lookup_by_phone(self, phone, min_suffix=MIN_SUFFIX_DIGITS):
+        """Returns the contacts with the given phone number from every shard
+
+        Suffix matches can live in any shard, so every shard is asked.
+        """
+        return self._merge(lambda index, shard: shard.lookup_by_phone(phone, min_suffix))
+
+    @timed
+    def get_all_contacts(self, limit=None, offset=0):
+        """Returns all contacts, optionally a window of limit rows from offset"""
+        return self.filter_contacts("", limit, offset)
+
+    def iter_contacts(self, chunk_size=DEFAULT_BATCH_SIZE, search_text=""):
+        """Yields contacts sorted by name, merging each shard's keyset pages"""
+        iterators = [
+            self._iter_shard(index, shard, chunk_size, search_text)
+            for index, shard in enumerate(self.shards)
+        ]
+        return heapq.merge(*iterators, key=_order_key)
+
+    def _iter_shard(self, index, shard, chunk_size, search_text):
+        for contact in shard.iter_contacts(chunk_size, search_text):
+            contact.contact_id = self._global_id(index, contact.contact_id)
+            yield contact
+
+    @timed
+    def filter_contacts(self, search_text, limit=None, offset=0):
+        """Returns contacts that match the search text in name or phone
+
+        Every shard returns its first offset + limit matches, which are
+        merged before the window is cut.
+        """
+        shard_limit = None if limit is None else offset + limit
+        return self._merge(
+            lambda index, shard: shard.filter_contacts(search_text, shard_limit),
+            limit,
+            offset,
+        )
+
+    @timed
+    def page_contacts(self, after=None, limit=DEFAULT_PAGE_SIZE, search_text=""):
+        """Returns the page of contacts that follows the (name, id) key after"""
+
+        def page(index, shard):
+            shard_after = None
+            if after is not None:
+                # The shard's contacts with the same name follow after when
+                # their global id is greater, that is when their local id is
+                # greater than this
+                name, contact_id = after
+                shard_after = (name, (contact_id - index) // self.shard_count)
+            return shard.page_contacts(shard_after, limit, search_text)
+
+        return self._merge(page, limit)
+
+    @timed
+    def fuzzy_matches(self, search_text, limit=DEFAULT_FUZZY_LIMIT):
+        """Returns (score, contact) pairs from every shard, best first
+
+        Every shard returns its best limit matches, which are merged by
+        score and global id.
+        """
+
+        def matches(index, shard):
+            pairs = shard.fuzzy_matches(search_text, limit)
+            self._globalize(index, [contact for _, contact in pairs])
+            return pairs
+
+        merged = heapq.merge(*self._fan_out(matches), key=_fuzzy_order_key)
+        return list(islice(merged, limit))
+
+    @timed
+    def count_contacts(self, search_text=""):
+        """Returns how many contacts match the search text"""
+        return sum(self._fan_out(lambda index, shard: shard.count_contacts(search_text)))
+
+
+def reshard(source, destination, shard_count, batch_size=DEFAULT_BATCH_SIZE,
+            progress_callback=None):
+    """Copies every contact of a store into a new sharded store and returns the count
+
+    source is a ContactModel or ShardedContactModel; destination must not
+    exist. The new store is built next to it and renamed into place once
+    complete, so an interrupted run never leaves a partial store at
+    destination. Contacts get new ids in the new store.
+    """
+    if os.path.exists(destination):
+        raise ValueError(f"{destination} already exists")
+
+    partial = destination + ".partial"
+    shutil.rmtree(partial, ignore_errors=True)
+    try:
+        with ShardedContactModel(partial, shard_count) as target:
+            target.add_contacts_bulk(
+                ((contact.name, contact.phone) for contact in source.iter_contacts()),
+                batch_size,
+                progress_callback,
+                atomic=False,
+            )
+            count = target.count_contacts()
+    except BaseException:
+        shutil.rmtree(partial, ignore_errors=True)
+        raise
+    os.rename(partial, destination)
+    return count
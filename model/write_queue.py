@@ -0,0 +1,166 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+from model.instrumentation import instrumentation
+
+
+# Mutations waiting for the writer before submit blocks the caller
+DEFAULT_MAX_PENDING = 10000
+
+# Most mutations committed together in one transaction
+DEFAULT_MAX_BATCH = 1000
+
+# Marks the end of the queue
+_STOP = object()
+
+
+class WriteQueue:
+    def __init__(
+        self, contact_model, max_pending=DEFAULT_MAX_PENDING, max_batch=DEFAULT_MAX_BATCH
+    ):
+        """Serializes the writes of many threads through one writer thread
+
+        Each call returns a concurrent.futures.Future. The writer drains
+        whatever is queued (up to max_batch mutations) and commits it as one
+        transaction, so concurrent writers share a single fsync and never
+        contend for the SQLite write lock among themselves. Every mutation
+        runs in its own savepoint: one that fails resolves its future with
+        the error without undoing the others. Futures resolve once the
+        transaction commits. When max_pending mutations are waiting, submit
+        blocks, which slows producers down to the writer's pace.
+        """
+        self.contact_model = contact_model
+        self.max_batch = max_batch
+        self._queue = queue.Queue(max_pending)
+        self._closed = False
+        self._close_lock = threading.Lock()
+        self._thread = threading.Thread(target=self._run, name="contacts-writer", daemon=True)
+        self._thread.start()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_contact(self, name, phone, timeout=None):
+        """Queues a new contact; the future's result is its ID"""
+        return self.submit(self.contact_model.add_contact_in, name, phone, timeout=timeout)
+
+    def update_contact(self, contact_id, name, phone, timeout=None):
+        """Queues an update; the future's result tells whether the contact existed"""
+        return self.submit(
+            self.contact_model.update_contact_in, contact_id, name, phone, timeout=timeout
+        )
+
+    def delete_contact(self, contact_id, timeout=None):
+        """Queues a delete; the future's result tells whether the contact existed"""
+        return self.submit(self.contact_model.delete_contact_in, contact_id, timeout=timeout)
+
+    def submit(self, mutation, *args, timeout=None):
+        """Queues mutation(conn, *args) to run in the next group transaction
+
+        mutation is one of the ContactModel *_in methods, or any function
+        writing through conn without committing.
+
+        Blocks while the queue is full, raising queue.Full if timeout
+        seconds pass first.
+        """
+        return self._put(mutation, args, {}, True, timeout)
+
+    def run(self, fn, *args, timeout=None, **kwargs):
+        """Queues fn(*args, **kwargs) to run alone on the writer thread
+
+        For work that manages its own transactions, such as an import; the
+        writer commits the mutations queued before it first.
+        """
+        return self._put(fn, args, kwargs, False, timeout)
+
+    def _put(self, fn, args, kwargs, batched, timeout):
+        future = Future()
+        with self._close_lock:
+            if self._closed:
+                raise RuntimeError("The write queue is closed.")
+            self._queue.put((fn, args, kwargs, batched, future), timeout=timeout)
+        return future
+
+    def close(self):
+        """Commits the queued writes and stops the writer thread"""
+        with self._close_lock:
+            if self._closed:
+                return
+            self._closed = True
+        self._queue.put(_STOP)
+        self._thread.join()
+
+    def _run(self):
+        conn = self.contact_model.get_connection()
+        pending = None
+        while True:
+            item = pending or self._queue.get()
+            pending = None
+            if item is _STOP:
+                return
+
+            fn, args, kwargs, batched, future = item
+            if not batched:
+                self._call(future, fn, *args, **kwargs)
+                continue
+
+            batch = [item]
+            while len(batch) < self.max_batch:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is _STOP or not item[3]:
+                    # Committed after this batch
+                    pending = item
+                    break
+                batch.append(item)
+            self._commit(conn, batch)
+
+    def _call(self, future, fn, *args, **kwargs):
+        if not future.set_running_or_notify_cancel():
+            return
+        try:
+            future.set_result(fn(*args, **kwargs))
+        except BaseException as e:
+            future.set_exception(e)
+
+    def _commit(self, conn, batch):
+        """Runs a batch of mutations in one transaction and resolves their futures"""
+        started = time.perf_counter()
+        batch = [item for item in batch if item[4].set_running_or_notify_cancel()]
+        results = []
+        try:
+            # Takes the write lock up front; other processes are waited for
+            # by the connection's busy timeout
+            conn.execute("BEGIN IMMEDIATE")
+            for fn, args, _, _, future in batch:
+                conn.execute("SAVEPOINT mutation")
+                try:
+                    results.append((future, fn(conn, *args), None))
+                except Exception as e:
+                    conn.execute("ROLLBACK TO mutation")
+                    results.append((future, None, e))
+                conn.execute("RELEASE mutation")
+            conn.commit()
+        except BaseException as e:
+            if conn.in_transaction:
+                conn.rollback()
+            for _, _, _, _, future in batch:
+                future.set_exception(e)
+            return
+
+        for future, result, error in results:
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+        if instrumentation.enabled:
+            instrumentation.observe("WriteQueue.commit", time.perf_counter() - started)
+            instrumentation.increment("write_queue_commits")
+            instrumentation.increment("write_queue_mutations", len(batch))
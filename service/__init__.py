@@ -0,0 +1 @@
+# This file allows Python to treat the directory as a package 
\ No newline at end of file
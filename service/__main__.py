@@ -0,0 +1,48 @@
+import argparse
+import asyncio
+import logging
+import os
+import sys
+from service.app import DEFAULT_READ_WORKERS, ContactService
+
+
+def parse_args(argv=None):
+    """Parses the command line arguments"""
+    parser = argparse.ArgumentParser(
+        prog="python -m service", description="Serve the contacts database over HTTP."
+    )
+    parser.add_argument("--db", default=os.environ.get("CONTACTS_DB", "contacts.db"))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8080)
+    parser.add_argument(
+        "--read-workers", type=int, default=DEFAULT_READ_WORKERS,
+        help="threads running read queries",
+    )
+    return parser.parse_args(argv)
+
+
+async def serve(args):
+    """Runs the service until cancelled"""
+    service = ContactService(args.db, args.read_workers)
+    server = await service.start(args.host, args.port)
+    for sock in server.sockets:
+        host, port = sock.getsockname()[:2]
+        print(f"Serving {args.db} on http://{host}:{port}", flush=True)
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(levelname)s %(message)s")
+    try:
+        asyncio.run(serve(parse_args(argv)))
+    except KeyboardInterrupt:
+        pass
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,420 @@
+import asyncio
+import base64
+import io
+import json
+import logging
+import os
+import re
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+from http import HTTPStatus
+from model.contact_model import DUPLICATE_MODES, ContactModel
+from model.fuzzy import DEFAULT_FUZZY_LIMIT
+from model.export_formats import get_export_format
+from model.import_export_model import ImportExportModel, OperationCancelled
+from model.phone import PHONE_FORMAT_MESSAGE, is_valid_phone
+from model.write_queue import DEFAULT_MAX_PENDING, WriteQueue
+from service.http_protocol import (
+    MAX_HEADER_SIZE,
+    HTTPError,
+    Response,
+    StreamingResponse,
+    error_response,
+    json_response,
+    read_request,
+    write_response,
+)
+
+
+# Threads running read queries, each with its own SQLite connection
+DEFAULT_READ_WORKERS = 8
+
+# Read calls queued per read thread before new requests wait their turn
+READ_QUEUE_DEPTH = 4
+
+# Contacts per page when the client does not ask for a limit, and the most
+# it may ask for
+DEFAULT_PAGE_LIMIT = 50
+MAX_PAGE_LIMIT = 1000
+
+# Largest JSON request body, and largest import upload, in bytes
+MAX_JSON_BODY = 1024 * 1024
+MAX_IMPORT_BODY = 512 * 1024 * 1024
+
+# Size of the chunks an export is streamed in, and how many may be queued
+EXPORT_CHUNK_SIZE = 64 * 1024
+EXPORT_QUEUED_CHUNKS = 8
+
+# Invalid lines listed in an import response
+MAX_REPORTED_INVALID_LINES = 100
+
+# Content type of each export format
+EXPORT_CONTENT_TYPES = {
+    "txt": "text/plain; charset=utf-8",
+    "csv": "text/csv; charset=utf-8",
+    "jsonl": "application/x-ndjson",
+    "vcard": "text/vcard; charset=utf-8",
+}
+
+logger = logging.getLogger("contacts.service")
+
+
+def contact_json(contact):
+    """Returns the JSON representation of a contact"""
+    return {"id": contact.contact_id, "name": contact.name, "phone": contact.phone}
+
+
+def encode_cursor(contact):
+    """Returns an opaque token for the page following contact"""
+    key = json.dumps([contact.name, contact.contact_id], ensure_ascii=False)
+    return base64.urlsafe_b64encode(key.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(cursor):
+    """Returns the (name, id) key encoded by encode_cursor"""
+    try:
+        name, contact_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        if isinstance(name, str) and isinstance(contact_id, int):
+            return name, contact_id
+    except (ValueError, TypeError):
+        pass
+    raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid cursor")
+
+
+def contact_fields(data):
+    """Returns the validated (name, phone) of a request body"""
+    name = data.get("name")
+    phone = data.get("phone")
+    if not isinstance(name, str) or not name.strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Name cannot be empty.")
+    if not isinstance(phone, str) or not phone.strip():
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Phone cannot be empty.")
+    if not is_valid_phone(phone.strip()):
+        raise HTTPError(HTTPStatus.BAD_REQUEST, PHONE_FORMAT_MESSAGE)
+    return name.strip(), phone.strip()
+
+
+def _int_param(request, name, default, minimum, maximum):
+    value = request.query.get(name)
+    if value is None:
+        return default
+    try:
+        number = int(value)
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be an integer") from None
+    if not minimum <= number <= maximum:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, f"{name} must be between {minimum} and {maximum}")
+    return number
+
+
+class _ChunkStream(io.RawIOBase):
+    def __init__(self, loop, queue, slots, cancelled):
+        """Binary stream that hands what is written to an asyncio queue
+
+        Written from an executor thread. slots bounds the chunks waiting in
+        the queue, so a slow client slows the export down instead of letting
+        it buffer the whole file; setting cancelled stops the writer.
+        """
+        self.loop = loop
+        self.queue = queue
+        self.slots = slots
+        self.cancelled = cancelled
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        while not self.slots.acquire(timeout=0.1):
+            if self.cancelled.is_set():
+                raise OperationCancelled()
+        if self.cancelled.is_set():
+            raise OperationCancelled()
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, bytes(data))
+        return len(data)
+
+
+class ContactService:
+    def __init__(self, db_path="contacts.db", read_workers=DEFAULT_READ_WORKERS):
+        """HTTP/JSON interface to a contacts database
+
+        Handlers run on the event loop; SQLite calls run on a bounded pool of
+        reader threads, and every write goes through a WriteQueue, whose
+        single writer thread commits the writes of concurrent requests
+        together so they never contend for the database write lock.
+        """
+        self.model = ContactModel(db_path)
+        self.import_export_model = ImportExportModel(self.model)
+        self.read_workers = read_workers
+        self.read_executor = ThreadPoolExecutor(read_workers, "contacts-read")
+        self.write_queue = WriteQueue(self.model)
+        self._read_slots = None
+        self._write_slots = None
+
+        self.routes = [
+            ("GET", r"/health", self.health),
+            ("GET", r"/contacts", self.list_contacts),
+            ("POST", r"/contacts", self.create_contact),
+            ("GET", r"/contacts/count", self.count_contacts),
+            ("GET", r"/contacts/lookup", self.lookup_contacts),
+            ("GET", r"/contacts/fuzzy", self.fuzzy_contacts),
+            ("GET", r"/contacts/(\d+)", self.get_contact),
+            ("PUT", r"/contacts/(\d+)", self.update_contact),
+            ("DELETE", r"/contacts/(\d+)", self.delete_contact),
+            ("GET", r"/export", self.export_contacts),
+            ("POST", r"/import", self.import_contacts),
+        ]
+        self.routes = [
+            (method, re.compile(pattern + "$"), handler) for method, pattern, handler in self.routes
+        ]
+
+    async def start(self, host="127.0.0.1", port=8080):
+        """Starts listening and returns the asyncio server"""
+        self._read_slots = asyncio.Semaphore(self.read_workers * READ_QUEUE_DEPTH)
+        # Keeps the write queue from filling up, since a full queue would
+        # block the event loop
+        self._write_slots = asyncio.Semaphore(DEFAULT_MAX_PENDING)
+        return await asyncio.start_server(
+            self.handle_connection, host, port, limit=MAX_HEADER_SIZE
+        )
+
+    def close(self):
+        """Waits for running calls and closes the database connections"""
+        self.read_executor.shutdown()
+        self.write_queue.close()
+        self.model.close()
+
+    async def read(self, fn, *args, **kwargs):
+        """Runs a blocking read on the reader pool"""
+        async with self._read_slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self.read_executor, partial(fn, *args, **kwargs))
+
+    async def write(self, queue_method, *args, **kwargs):
+        """Calls a WriteQueue method and waits for the write to commit"""
+        async with self._write_slots:
+            return await asyncio.wrap_future(queue_method(*args, **kwargs))
+
+    async def handle_connection(self, reader, writer):
+        """Serves the requests of one client connection"""
+        try:
+            while True:
+                try:
+                    request = await read_request(reader)
+                except HTTPError as e:
+                    await write_response(writer, error_response(e.status, e.message), False)
+                    break
+                if request is None:
+                    break
+
+                response = await self.dispatch(request)
+                keep_alive = request.keep_alive
+                try:
+                    await request.discard_body()
+                except HTTPError:
+                    keep_alive = False
+
+                await write_response(writer, response, keep_alive)
+                if not keep_alive:
+                    break
+        except ConnectionError:
+            pass
+        except Exception:
+            logger.exception("Error while sending a response")
+        finally:
+            writer.close()
+
+    async def dispatch(self, request):
+        """Routes a request to its handler and returns the response"""
+        allowed = []
+        for method, pattern, handler in self.routes:
+            match = pattern.match(request.path)
+            if not match:
+                continue
+            if method != request.method:
+                allowed.append(method)
+                continue
+            try:
+                return await handler(request, *match.groups())
+            except HTTPError as e:
+                return error_response(e.status, e.message)
+            except Exception:
+                logger.exception("Error handling %s %s", request.method, request.path)
+                return error_response(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal server error")
+
+        if allowed:
+            response = error_response(HTTPStatus.METHOD_NOT_ALLOWED, "Method not allowed")
+            response.headers["Allow"] = ", ".join(allowed)
+            return response
+        return error_response(HTTPStatus.NOT_FOUND, "Not found")
+
+    async def health(self, request):
+        return json_response({"status": "ok"})
+
+    async def list_contacts(self, request):
+        """GET /contacts?search=&limit=&cursor= returns a page of contacts
+
+        The response's next_cursor fetches the following page; it is null on
+        the last page.
+        """
+        limit = _int_param(request, "limit", DEFAULT_PAGE_LIMIT, 1, MAX_PAGE_LIMIT)
+        cursor = request.query.get("cursor")
+        after = decode_cursor(cursor) if cursor else None
+        search_text = request.query.get("search", "").strip()
+
+        # One extra row tells whether there is a next page
+        contacts = await self.read(self.model.page_contacts, after, limit + 1, search_text)
+        next_cursor = None
+        if len(contacts) > limit:
+            contacts = contacts[:limit]
+            next_cursor = encode_cursor(contacts[-1])
+
+        return json_response(
+            {"contacts": [contact_json(c) for c in contacts], "next_cursor": next_cursor}
+        )
+
+    async def count_contacts(self, request):
+        search_text = request.query.get("search", "").strip()
+        return json_response({"count": await self.read(self.model.count_contacts, search_text)})
+
+    async def lookup_contacts(self, request):
+        """GET /contacts/lookup?phone= returns the contacts with a phone number"""
+        phone = request.query.get("phone", "").strip()
+        if not phone:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "phone is required")
+        contacts = await self.read(self.model.lookup_by_phone, phone)
+        return json_response({"contacts": [contact_json(c) for c in contacts]})
+
+    async def fuzzy_contacts(self, request):
+        """GET /contacts/fuzzy?search=&limit= returns the contacts best matching a text
+
+        Tolerates typos and missing accents; each contact has its score,
+        0 for an exact match, and lower is better.
+        """
+        search_text = request.query.get("search", "").strip()
+        if not search_text:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "search is required")
+        limit = _int_param(request, "limit", DEFAULT_FUZZY_LIMIT, 1, MAX_PAGE_LIMIT)
+        matches = await self.read(self.model.fuzzy_matches, search_text, limit)
+        return json_response({
+            "contacts": [dict(contact_json(contact), score=score) for score, contact in matches]
+        })
+
+    async def get_contact(self, request, contact_id):
+        contact = await self.read(self.model.get_contact, int(contact_id))
+        if contact is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Contact not found")
+        return json_response(contact_json(contact))
+
+    async def create_contact(self, request):
+        name, phone = contact_fields(await request.read_json(MAX_JSON_BODY))
+        contact_id = await self.write(self.write_queue.add_contact, name, phone)
+        response = json_response({"id": contact_id, "name": name, "phone": phone},
+                                 HTTPStatus.CREATED)
+        response.headers["Location"] = f"/contacts/{contact_id}"
+        return response
+
+    async def update_contact(self, request, contact_id):
+        name, phone = contact_fields(await request.read_json(MAX_JSON_BODY))
+        if not await self.write(
+            self.write_queue.update_contact, int(contact_id), name, phone
+        ):
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Contact not found")
+        return json_response({"id": int(contact_id), "name": name, "phone": phone})
+
+    async def delete_contact(self, request, contact_id):
+        if not await self.write(self.write_queue.delete_contact, int(contact_id)):
+            raise HTTPError(HTTPStatus.NOT_FOUND, "Contact not found")
+        return Response(HTTPStatus.NO_CONTENT, content_type=None)
+
+    async def export_contacts(self, request):
+        """GET /export?format=csv&gzip=1 streams every contact"""
+        try:
+            export_format = get_export_format(request.query.get("format", "txt"))
+        except ValueError as e:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(e)) from None
+        compress = request.query.get("gzip", "").lower() in ("1", "true", "yes")
+
+        file_name = "contacts" + export_format.extension
+        content_type = EXPORT_CONTENT_TYPES.get(export_format.name, "application/octet-stream")
+        if compress:
+            file_name += ".gz"
+            content_type = "application/gzip"
+
+        return StreamingResponse(
+            self._export_chunks(export_format.name, compress),
+            content_type,
+            {"Content-Disposition": f'attachment; filename="{file_name}"'},
+        )
+
+    async def _export_chunks(self, export_format, compress):
+        """Yields the export file in chunks written by a reader thread"""
+        loop = asyncio.get_running_loop()
+        queue = asyncio.Queue()
+        slots = threading.Semaphore(EXPORT_QUEUED_CHUNKS)
+        cancelled = threading.Event()
+        done = object()
+
+        def produce():
+            stream = io.BufferedWriter(
+                _ChunkStream(loop, queue, slots, cancelled), EXPORT_CHUNK_SIZE
+            )
+            try:
+                self.import_export_model.export_contacts_to_stream(
+                    stream, export_format, compress
+                )
+            finally:
+                loop.call_soon_threadsafe(queue.put_nowait, done)
+
+        future = loop.run_in_executor(self.read_executor, produce)
+        try:
+            while True:
+                chunk = await queue.get()
+                if chunk is done:
+                    break
+                slots.release()
+                yield chunk
+            await future
+        finally:
+            if not future.done():
+                # The client went away; stop the producer and collect its error
+                cancelled.set()
+                future.add_done_callback(lambda f: f.exception())
+
+    async def import_contacts(self, request):
+        """POST /import?on_duplicate=skip&encoding= imports a "name, phone" upload"""
+        on_duplicate = request.query.get("on_duplicate", "keep")
+        if on_duplicate not in DUPLICATE_MODES:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, f"Unknown duplicate mode: {on_duplicate}")
+        if request.content_length > MAX_IMPORT_BODY:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+
+        # The importer memory-maps its input, so spool the upload to a file
+        with tempfile.TemporaryDirectory() as temp_dir:
+            path = os.path.join(temp_dir, "upload.txt")
+            with open(path, "wb") as file:
+                async for chunk in request.iter_body():
+                    file.write(chunk)
+
+            try:
+                result = await self.write(
+                    self.write_queue.run,
+                    self.import_export_model.import_contacts,
+                    path,
+                    workers=1,
+                    encoding=request.query.get("encoding"),
+                    on_duplicate=on_duplicate,
+                )
+            except (ValueError, LookupError) as e:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, str(e)) from None
+
+        return json_response(
+            {
+                "inserted": result.inserted,
+                "updated": result.updated,
+                "skipped": result.skipped,
+                "invalid_line_count": len(result.invalid_lines),
+                "invalid_lines": result.invalid_lines[:MAX_REPORTED_INVALID_LINES],
+            }
+        )
@@ -0,0 +1,167 @@
+import asyncio
+import json
+from http import HTTPStatus
+from urllib.parse import parse_qsl, urlsplit
+
+
+# Largest request head (request line and headers) accepted, in bytes
+MAX_HEADER_SIZE = 64 * 1024
+
+# Seconds an idle keep-alive connection is kept open
+KEEPALIVE_TIMEOUT = 15
+
+# Size of the chunks read from a request body
+BODY_CHUNK_SIZE = 64 * 1024
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        """Error answered with the given status and a JSON error body"""
+        self.status = HTTPStatus(status)
+        self.message = message or self.status.phrase
+        super().__init__(self.message)
+
+
+class Request:
+    def __init__(self, method, target, version, headers, reader):
+        """A parsed request head; the body is read on demand"""
+        self.method = method
+        self.version = version
+        self.headers = headers
+        url = urlsplit(target)
+        self.path = url.path
+        self.query = dict(parse_qsl(url.query))
+        self.reader = reader
+        try:
+            self.content_length = int(headers.get("content-length", 0) or 0)
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "Invalid Content-Length") from None
+        self._body_read = False
+
+    @property
+    def keep_alive(self):
+        connection = self.headers.get("connection", "").lower()
+        if self.version == "HTTP/1.0":
+            return connection == "keep-alive"
+        return connection != "close"
+
+    async def iter_body(self):
+        """Yields the request body in chunks"""
+        if "chunked" in self.headers.get("transfer-encoding", "").lower():
+            raise HTTPError(HTTPStatus.LENGTH_REQUIRED)
+        self._body_read = True
+        remaining = self.content_length
+        while remaining > 0:
+            chunk = await self.reader.read(min(remaining, BODY_CHUNK_SIZE))
+            if not chunk:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, "Incomplete request body")
+            remaining -= len(chunk)
+            yield chunk
+
+    async def read_body(self, max_size):
+        """Returns the whole request body, which must not exceed max_size bytes"""
+        if self.content_length > max_size:
+            raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+        chunks = [chunk async for chunk in self.iter_body()]
+        return b"".join(chunks)
+
+    async def read_json(self, max_size):
+        """Returns the request body parsed as a JSON object"""
+        try:
+            data = json.loads(await self.read_body(max_size))
+        except ValueError:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The body is not valid JSON") from None
+        if not isinstance(data, dict):
+            raise HTTPError(HTTPStatus.BAD_REQUEST, "The body must be a JSON object")
+        return data
+
+    async def discard_body(self):
+        """Skips an unread body so the connection can be reused"""
+        if not self._body_read:
+            async for _ in self.iter_body():
+                pass
+
+
+class Response:
+    def __init__(self, status=HTTPStatus.OK, body=b"", content_type="application/json",
+                 headers=None):
+        """A complete response"""
+        self.status = HTTPStatus(status)
+        self.body = body
+        self.content_type = content_type
+        self.headers = headers or {}
+
+
+class StreamingResponse(Response):
+    def __init__(self, chunks, content_type, headers=None):
+        """A response whose body is an async iterator of bytes, sent chunked"""
+        super().__init__(HTTPStatus.OK, b"", content_type, headers)
+        self.chunks = chunks
+
+
+def json_response(data, status=HTTPStatus.OK):
+    """Returns a Response with data encoded as JSON"""
+    body = json.dumps(data, ensure_ascii=False).encode("utf-8")
+    return Response(status, body)
+
+
+def error_response(status, message):
+    return json_response({"error": message}, status)
+
+
+async def read_request(reader):
+    """Reads a request head, or returns None when the client closed the connection"""
+    try:
+        head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), KEEPALIVE_TIMEOUT)
+    except (asyncio.IncompleteReadError, asyncio.TimeoutError, ConnectionError):
+        return None
+    except asyncio.LimitOverrunError:
+        raise HTTPError(HTTPStatus.REQUEST_HEADER_FIELDS_TOO_LARGE) from None
+
+    lines = head.decode("latin-1").split("\r\n")
+    try:
+        method, target, version = lines[0].split(" ")
+    except ValueError:
+        raise HTTPError(HTTPStatus.BAD_REQUEST, "Malformed request line") from None
+    if not version.startswith("HTTP/1."):
+        raise HTTPError(HTTPStatus.HTTP_VERSION_NOT_SUPPORTED)
+
+    headers = {}
+    for line in lines[1:]:
+        if line:
+            name, _, value = line.partition(":")
+            headers[name.strip().lower()] = value.strip()
+    return Request(method, target, version, headers, reader)
+
+
+async def write_response(writer, response, keep_alive):
+    """Sends a response, streaming it with chunked encoding if needed"""
+    status = response.status
+    head = [f"HTTP/1.1 {status.value} {status.phrase}"]
+    headers = dict(response.headers)
+    if response.content_type:
+        headers["Content-Type"] = response.content_type
+    streaming = isinstance(response, StreamingResponse)
+    if streaming:
+        headers["Transfer-Encoding"] = "chunked"
+    elif status != HTTPStatus.NO_CONTENT:
+        headers["Content-Length"] = str(len(response.body))
+    headers["Connection"] = "keep-alive" if keep_alive else "close"
+    head.extend(f"{name}: {value}" for name, value in headers.items())
+    writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1"))
+
+    if not streaming:
+        writer.write(response.body)
+        await writer.drain()
+        return
+
+    try:
+        async for chunk in response.chunks:
+            if chunk:
+                writer.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+                await writer.drain()
+    finally:
+        # Stops the producer if the client went away
+        await response.chunks.aclose()
+    writer.write(b"0\r\n\r\n")
+    await writer.drain()
@@ -0,0 +1,50 @@
+import unittest
+import shutil
+import tempfile
+from benchmarks.runner import compare, parse_scales, run_benchmarks
+
+
+class TestBenchmarkRunner(unittest.TestCase):
+    def setUp(self):
+        self.data_dir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.data_dir)
+
+    def test_run_benchmarks(self):
+        results = run_benchmarks([50], repeat=1, data_dir=self.data_dir)
+
+        names = [result["name"] for result in results["results"]]
+        self.assertIn("add_contact", names)
+        self.assertIn("filter_contacts[name, first page]", names)
+        self.assertIn("MainWindow.show_contacts", names)
+
+        for result in results["results"]:
+            if "skipped" not in result:
+                self.assertGreater(result["median"], 0)
+
+        imported = next(r for r in results["results"] if r["name"] == "import_contacts_from_file")
+        self.assertEqual(imported["operations"], 50)
+
+    def test_compare(self):
+        def run(*medians):
+            return {
+                "results": [
+                    {"name": name, "count": 1000, "median": median}
+                    for name, median in zip("abc", medians)
+                ]
+            }
+
+        rows = compare(run(1.0, 1.0, 1.0), run(1.5, 1.1, 0.5), threshold=0.2)
+
+        self.assertEqual(
+            [(name, status) for name, _, _, status in rows],
+            [("a", "regression"), ("b", "ok"), ("c", "improvement")],
+        )
+
+    def test_parse_scales(self):
+        self.assertEqual(parse_scales("1k, 1M,250"), [1000, 1000000, 250])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import unittest
+import argparse
+import gzip
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+from contacts.cli import export_command
+from model.contact_model import ContactModel
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+class TestCli(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "contacts.db")
+
+    def tearDown(self):
+        shutil.rmtree(self.temp_dir)
+
+    def run_cli(self, *args, stdin=b""):
+        """Runs python -m contacts against the test database"""
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        return subprocess.run(
+            [sys.executable, "-m", "contacts", "--db", self.db_path, *args],
+            input=stdin,
+            capture_output=True,
+            cwd=self.temp_dir,
+            env=env,
+        )
+
+    def test_import_from_stdin(self):
+        result = self.run_cli(
+            "import", "--json", stdin=b"John Doe, 123\nJane Smith, 456\nbad line\n"
+        )
+
+        self.assertEqual(result.returncode, 0)
+        summary = json.loads(result.stdout)
+        self.assertEqual(summary["inserted"], 2)
+        self.assertEqual(summary["invalid_lines"], ["Line 3: Invalid format"])
+
+        # Nothing left to import
+        result = self.run_cli("import", "--on-duplicate", "skip", stdin=b"John, 123\n")
+        self.assertEqual(result.returncode, 0)
+        self.assertIn(b"skipped 1", result.stdout)
+        self.assertEqual(self.run_cli("import", stdin=b"").returncode, 3)
+        self.assertEqual(self.run_cli("import", stdin=b"bad\n").returncode, 1)
+
+    def test_search_and_count(self):
+        self.run_cli("import", stdin=b"John Doe, 123\nJane Smith, 456\n")
+
+        result = self.run_cli("--json", "search", "smi")
+        self.assertEqual(result.returncode, 0)
+        records = [json.loads(line) for line in result.stdout.splitlines()]
+        self.assertEqual(records, [{"id": 2, "name": "Jane Smith", "phone": "456"}])
+
+        result = self.run_cli("search", "j", "--limit", "1")
+        self.assertEqual(result.stdout, b"2\tJane Smith\t456\n")
+
+        result = self.run_cli("search", "--fuzzy", "jhon")
+        self.assertEqual(result.stdout, b"1\tJohn Doe\t123\n")
+
+        self.assertEqual(self.run_cli("search", "nobody").returncode, 3)
+        self.assertEqual(self.run_cli("count").stdout, b"2\n")
+        self.assertEqual(json.loads(self.run_cli("count", "doe", "--json").stdout), {"count": 1})
+
+    def test_export(self):
+        self.run_cli("import", stdin=b"John Doe, 123\n")
+
+        result = self.run_cli("export", "--format", "csv")
+        self.assertEqual(result.stdout, b"name,phone\r\nJohn Doe,123\r\n")
+
+        result = self.run_cli("export", "--gzip")
+        self.assertEqual(gzip.decompress(result.stdout), b"John Doe, 123\n")
+
+        result = self.run_cli("--json", "export", "out.jsonl")
+        self.assertEqual(json.loads(result.stdout)["exported"], 1)
+        with open(os.path.join(self.temp_dir, "out.jsonl"), encoding="utf-8") as file:
+            self.assertEqual(json.loads(file.read()), {"name": "John Doe", "phone": "123"})
+
+    def test_stats_and_vacuum(self):
+        self.run_cli("import", stdin=b"John Doe, 123\n")
+
+        stats = json.loads(self.run_cli("--json", "stats").stdout)
+        self.assertEqual(stats["contacts"], 1)
+
+        result = self.run_cli("--json", "vacuum")
+        self.assertEqual(result.returncode, 0)
+        self.assertIn("size_after", json.loads(result.stdout))
+
+    def test_errors(self):
+        self.assertEqual(self.run_cli("unknown").returncode, 2)
+
+        result = self.run_cli("import", "missing.txt")
+        self.assertEqual(result.returncode, 1)
+        self.assertTrue(result.stderr.startswith(b"error:"))
+
+    def test_export_to_a_path_that_cannot_be_opened(self):
+        with ContactModel(self.db_path) as model:
+            for path, error in (
+                (os.path.join(self.temp_dir, "missing", "out.txt"), FileNotFoundError),
+                (self.temp_dir, IsADirectoryError),
+            ):
+                with self.subTest(path=path):
+                    args = argparse.Namespace(file=path, format="txt", gzip=False, json=False)
+                    # The error open raised, not one from removing the file
+                    with self.assertRaises(error) as raised:
+                        export_command(model, args)
+                    self.assertIsNone(raised.exception.__context__)
+        self.assertTrue(os.path.isdir(self.temp_dir))
+
+    def test_does_not_import_qt(self):
+        code = (
+            "import sys; from contacts.cli import main; "
+            f"main(['--db', {self.db_path!r}, 'count']); "
+            "sys.exit('PyQt5' in sys.modules)"
+        )
+        result = subprocess.run(
+            [sys.executable, "-c", code],
+            capture_output=True,
+            cwd=ROOT,
+        )
+        self.assertEqual(result.returncode, 0)
+
+    def test_reshard(self):
+        self.run_cli("import", stdin=b"John Doe, 123\nJane Smith, 456\nBob, 789\n")
+        store = os.path.join(self.temp_dir, "sharded")
+
+        result = self.run_cli("reshard", store, "--shards", "3", "--json")
+        self.assertEqual(result.returncode, 0)
+        self.assertEqual(json.loads(result.stdout)["contacts"], 3)
+
+        self.db_path = store
+        result = self.run_cli("search", "o")
+        names = [line.split("\t")[1] for line in result.stdout.decode().splitlines()]
+        self.assertEqual(names, ["Bob", "John Doe"])
+        self.assertEqual(self.run_cli("reshard", store).returncode, 1)
+
+    def test_sync_changes(self):
+        self.run_cli("import", stdin=b"John Doe, 123\nJane Smith, 456\n")
+        changes = self.run_cli("export-changes").stdout
+        self.assertEqual(len(changes.splitlines()), 2)
+
+        result = self.run_cli("--json", "export-changes", "changes.jsonl.gz", "--since", "1")
+        self.assertEqual(json.loads(result.stdout)["changes"], 1)
+        self.assertEqual(json.loads(result.stdout)["next_since"], 2)
+
+        self.db_path = os.path.join(self.temp_dir, "copy.db")
+        result = self.run_cli("apply-changes", "--json", stdin=changes)
+        self.assertEqual(json.loads(result.stdout)["inserted"], 2)
+        self.assertEqual(self.run_cli("count").stdout, b"2\n")
+
+
+if __name__ == "__main__":
+    unittest.main()
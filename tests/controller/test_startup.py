@@ -0,0 +1,33 @@
+import unittest
+import builtins
+import io
+import sys
+from controller.startup import StartupReport
+
+
+class TestStartupReport(unittest.TestCase):
+    def test_report(self):
+        original_import = builtins.__import__
+        sys.modules.pop("colorsys", None)
+
+        report = StartupReport()
+        report.track_imports()
+        try:
+            import colorsys  # noqa: F401
+            report.mark("imported")
+        finally:
+            output = io.StringIO()
+            report.finish(output)
+
+        self.assertIs(builtins.__import__, original_import)
+        self.assertEqual([name for name, _, _ in report.imports], ["colorsys"])
+        self.assertEqual(
+            [label for label, _ in report.phases], ["imported", "first page shown (interactive)"]
+        )
+        text = output.getvalue()
+        self.assertIn("imported", text)
+        self.assertIn("colorsys", text)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,24 @@
+import unittest
+import io
+from model.changes import Change, read_changes, write_changes
+
+
+class TestChangeFormat(unittest.TestCase):
+    def test_round_trip(self):
+        changes = [Change(1, "a1", "Zoë, \"Z\"", "+1 555"), Change(3, "b2", None, None)]
+        file = io.StringIO()
+
+        self.assertEqual(write_changes(file, changes), 2)
+        self.assertEqual(file.getvalue().splitlines()[1], '[3,"b2"]')
+        file.seek(0)
+        self.assertEqual(list(read_changes(file)), changes)
+
+    def test_invalid_lines(self):
+        for line in ["[1]", "{}", "not json", '[1,"a","name"]', '["1","a"]', '[1,"a",2,3]']:
+            with self.subTest(line=line):
+                with self.assertRaisesRegex(ValueError, "line 2"):
+                    list(read_changes(io.StringIO('[1,"a"]\n' + line + "\n")))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,114 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from model.contact_cache import ContactCache
+from model.contact_model import ContactModel
+
+
+class TestContactCache(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "contacts.db")
+        self.model = ContactModel(self.db_path)
+        self.model.add_contact("Bob", "222")
+        self.model.add_contact("Dave", "444")
+
+        self.cache = ContactCache(self.model)
+        self.events = []
+        self.cache.add_listener(self.events.append)
+
+    def tearDown(self):
+        self.model.close()
+        shutil.rmtree(self.temp_dir)
+
+    def names(self):
+        return [contact.name for contact in self.cache.page_contacts()]
+
+    def test_load(self):
+        self.assertEqual(len(self.cache), 2)
+        self.assertEqual(self.names(), ["Bob", "Dave"])
+        self.assertEqual(self.events[0].kind, "reset")
+
+    def test_add_contact(self):
+        self.cache.reload()
+        contact_id = self.cache.add_contact("Carol", "333")
+
+        self.assertEqual(self.names(), ["Bob", "Carol", "Dave"])
+        event = self.events[-1]
+        self.assertEqual((event.kind, event.row), ("inserted", 1))
+        self.assertEqual(event.contact.contact_id, contact_id)
+
+        # Written through to the database
+        self.assertEqual(self.model.get_contact(contact_id).name, "Carol")
+
+    def test_update_contact(self):
+        bob = self.cache.contact_at(0)
+        self.assertTrue(self.cache.update_contact(bob.contact_id, "Eve", "555"))
+
+        self.assertEqual(self.names(), ["Dave", "Eve"])
+        event = self.events[-1]
+        self.assertEqual((event.kind, event.row, event.new_row), ("changed", 0, 1))
+        self.assertEqual(self.model.get_contact(bob.contact_id).name, "Eve")
+
+    def test_delete_contact(self):
+        dave = self.cache.contact_at(1)
+        self.assertTrue(self.cache.delete_contact(dave.contact_id))
+
+        self.assertEqual(self.names(), ["Bob"])
+        self.assertEqual((self.events[-1].kind, self.events[-1].row), ("removed", 1))
+        self.assertIsNone(self.model.get_contact(dave.contact_id))
+        self.assertFalse(self.cache.delete_contact(dave.contact_id))
+
+    def test_page_contacts(self):
+        self.cache.add_contact("Bob", "223")
+        first = self.cache.page_contacts(limit=2)
+        self.assertEqual([c.phone for c in first], ["222", "223"])
+
+        last = first[-1]
+        page = self.cache.page_contacts((last.name, last.contact_id), 2)
+        self.assertEqual([c.name for c in page], ["Dave"])
+
+    def test_external_changes(self):
+        self.assertEqual(len(self.cache), 2)
+        self.assertFalse(self.cache.check_for_external_changes())
+
+        # Our own writes are not external changes
+        self.cache.add_contact("Carol", "333")
+        self.assertFalse(self.cache.check_for_external_changes())
+
+        # Another connection commits
+        with ContactModel(self.db_path) as other:
+            other.add_contact("Alice", "111")
+
+        self.assertTrue(self.cache.is_stale())
+        self.assertTrue(self.cache.check_for_external_changes())
+        self.assertEqual(self.names(), ["Alice", "Bob", "Carol", "Dave"])
+        self.assertEqual(self.events[-1].kind, "reset")
+        self.assertFalse(self.cache.is_stale())
+        self.assertEqual(self.cache.edit_count, 1)
+
+    def test_snapshot_loaded_on_another_thread(self):
+        data_version = self.model.get_data_version()
+        snapshots = []
+        thread = threading.Thread(target=lambda: snapshots.append(self.cache.load_snapshot()))
+        thread.start()
+        thread.join()
+        self.assertFalse(self.cache.loaded)
+
+        # A commit made while the snapshot was loading
+        with ContactModel(self.db_path) as other:
+            other.add_contact("Alice", "111")
+
+        self.cache.apply_snapshot(snapshots[0], data_version)
+        self.assertTrue(self.cache.loaded)
+        self.assertEqual(self.events[-1].kind, "reset")
+        self.assertEqual(self.names(), ["Bob", "Dave"])
+
+        self.assertTrue(self.cache.check_for_external_changes())
+        self.assertEqual(self.names(), ["Alice", "Bob", "Dave"])
+
+
+if __name__ == "__main__":
+    unittest.main()
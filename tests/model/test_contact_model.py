@@ -0,0 +1,418 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+from model.contact_model import ContactModel
+
+
+class TestContactModel(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "contacts.db")
+        self.model = ContactModel(self.db_path)
+
+    def tearDown(self):
+        self.model.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_crud(self):
+        contact_id = self.model.add_contact("John Doe", "1234567890")
+
+        contact = self.model.get_contact(contact_id)
+        self.assertEqual(contact.name, "John Doe")
+        self.assertEqual(contact.phone, "1234567890")
+
+        self.assertTrue(self.model.update_contact(contact_id, "John", "111"))
+        self.assertEqual(self.model.get_contact(contact_id).name, "John")
+
+        self.assertTrue(self.model.delete_contact(contact_id))
+        self.assertIsNone(self.model.get_contact(contact_id))
+        self.assertFalse(self.model.delete_contact(contact_id))
+
+    def test_lookup_by_phone(self):
+        self.model.add_contact("National", "(555) 123-4567")
+        self.model.add_contact("International", "+1 555 123 4567")
+        self.model.add_contact("Local", "123-4567")
+        self.model.add_contact("Other country", "+44 555 123 4567")
+        self.model.add_contact("Short", "911")
+
+        def lookup(phone):
+            return [c.name for c in self.model.lookup_by_phone(phone)]
+
+        # A known country code rules out numbers from other countries
+        self.assertEqual(lookup("+1-555-123-4567"), ["International", "Local", "National"])
+        self.assertEqual(
+            lookup("5551234567"), ["International", "Local", "National", "Other country"]
+        )
+        self.assertEqual(lookup("0044 555 123 4567"), ["Local", "National", "Other country"])
+        self.assertEqual(lookup("911"), ["Short"])
+        self.assertEqual(lookup("4567"), [])
+        self.assertEqual(lookup(""), [])
+
+        contact_id = self.model.get_all_contacts()[-1].contact_id
+        self.model.update_contact(contact_id, "Short", "+1 555 123 4567")
+        self.assertIn("Short", lookup("+15551234567"))
+
+    def test_filter_contacts(self):
+        self.model.add_contact("John Doe", "1234567890")
+        self.model.add_contact("Jane Smith", "0987654321")
+
+        names = [c.name for c in self.model.filter_contacts("smi")]
+        self.assertEqual(names, ["Jane Smith"])
+
+        names = [c.name for c in self.model.filter_contacts("456")]
+        self.assertEqual(names, ["John Doe"])
+
+    def test_paged_queries(self):
+        for i in range(10):
+            self.model.add_contact(f"Contact {i}", f"55500{i}")
+
+        page = self.model.get_all_contacts(limit=3, offset=3)
+        self.assertEqual([c.name for c in page], ["Contact 3", "Contact 4", "Contact 5"])
+
+        page = self.model.filter_contacts("contact", limit=4, offset=8)
+        self.assertEqual([c.name for c in page], ["Contact 8", "Contact 9"])
+
+        page = self.model.filter_contacts("5", limit=2)
+        self.assertEqual([c.name for c in page], ["Contact 0", "Contact 1"])
+
+    def test_page_contacts(self):
+        for i in range(10):
+            self.model.add_contact(f"Contact {i}", f"55500{i}")
+        # Same name: ties are broken by id
+        self.model.add_contact("Contact 3", "999")
+
+        page = self.model.page_contacts(limit=4)
+        self.assertEqual([c.name for c in page], ["Contact 0", "Contact 1", "Contact 2", "Contact 3"])
+
+        last = page[-1]
+        page = self.model.page_contacts((last.name, last.contact_id), 4)
+        self.assertEqual([c.phone for c in page], ["999", "555004", "555005", "555006"])
+
+        # Filtered pages
+        page = self.model.page_contacts(("Contact 4", 0), 10, "contact")
+        self.assertEqual([c.name for c in page][:2], ["Contact 4", "Contact 5"])
+        self.assertEqual(len(page), 6)
+        page = self.model.page_contacts(None, 10, "9")
+        self.assertEqual([c.name for c in page], ["Contact 3", "Contact 9"])
+
+    def test_count_contacts(self):
+        self.assertEqual(self.model.count_contacts(), 0)
+        self.model.add_contact("John Doe", "1234567890")
+        self.model.add_contact("Jane Smith", "0987654321")
+
+        self.assertEqual(self.model.count_contacts(), 2)
+        self.assertEqual(self.model.count_contacts("smith"), 1)
+        self.assertEqual(self.model.count_contacts("j"), 2)
+        self.assertEqual(self.model.count_contacts("nobody"), 0)
+
+    def test_get_contact_columns(self):
+        john_id = self.model.add_contact("John Doe", "1234567890")
+        jane_id = self.model.add_contact("Jane Smith", "0987654321")
+
+        columns = self.model.get_contact_columns()
+        self.assertEqual(list(columns.ids), [jane_id, john_id])
+        self.assertEqual(columns.names, ["Jane Smith", "John Doe"])
+        self.assertEqual(columns.phones, ["0987654321", "1234567890"])
+
+        columns = self.model.get_contact_columns("doe")
+        self.assertEqual(list(columns.ids), [john_id])
+
+    def test_iter_contacts(self):
+        for i in range(10):
+            self.model.add_contact(f"Contact {i}", f"55500{i}")
+
+        names = [c.name for c in self.model.iter_contacts(chunk_size=3)]
+        self.assertEqual(names, [f"Contact {i}" for i in range(10)])
+
+    def test_filter_contacts_uses_search_index(self):
+        self.assertTrue(self.model.search_index_enabled)
+        contact_id = self.model.add_contact("John Doe", "1234567890")
+        self.model.add_contact("Jane Smith", "0987654321")
+
+        # Substring matches in name and phone, case insensitive
+        self.assertEqual([c.name for c in self.model.filter_contacts("n do")], ["John Doe"])
+        self.assertEqual([c.name for c in self.model.filter_contacts("876")], ["Jane Smith"])
+        self.assertEqual([c.name for c in self.model.filter_contacts("JANE")], ["Jane Smith"])
+
+        # Short queries fall back to a scan
+        self.assertEqual(len(self.model.filter_contacts("j")), 2)
+
+        # Updates and deletes keep the index in sync
+        self.model.update_contact(contact_id, "Johnny Walker", "5550000")
+        self.assertEqual(self.model.filter_contacts("n do"), [])
+        self.assertEqual([c.name for c in self.model.filter_contacts("walk")], ["Johnny Walker"])
+        self.model.delete_contact(contact_id)
+        self.assertEqual(self.model.filter_contacts("walk"), [])
+
+    def test_search_index_built_for_existing_database(self):
+        db_path = os.path.join(self.temp_dir, "old.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "CREATE TABLE contacts (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "name TEXT NOT NULL, phone TEXT NOT NULL)"
+        )
+        conn.execute("INSERT INTO contacts (name, phone) VALUES ('John Doe', '123')")
+        conn.commit()
+        conn.close()
+
+        with ContactModel(db_path) as model:
+            self.assertEqual([c.name for c in model.filter_contacts("doe")], ["John Doe"])
+
+            # The normalized phone column was added and filled
+            result = model.add_contacts_bulk([("Johnny", "123")], on_duplicate="skip")
+            self.assertEqual(result.skipped, 1)
+
+    def test_queries_before_deferred_backfills(self):
+        db_path = os.path.join(self.temp_dir, "old.db")
+        conn = sqlite3.connect(db_path)
+        conn.execute(
+            "CREATE TABLE contacts (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "name TEXT NOT NULL, phone TEXT NOT NULL)"
+        )
+        conn.execute("INSERT INTO contacts (name, phone) VALUES ('John Doe', '(555) 123-4567')")
+        conn.commit()
+        conn.close()
+
+        with ContactModel(db_path, defer_backfills=True) as model:
+            self.assertFalse(model.search_index_enabled)
+            model.add_contact("Jane Doe", "+1 555 765 4321")
+
+            for filled in (False, True):
+                with self.subTest(filled=filled):
+                    self.assertEqual(
+                        [c.name for c in model.filter_contacts("doe")], ["Jane Doe", "John Doe"]
+                    )
+                    self.assertEqual(
+                        [c.name for c in model.lookup_by_phone("+1 555 123 4567")], ["John Doe"]
+                    )
+                    self.assertEqual([c.name for c in model.fuzzy_search("jhon")], ["John Doe"])
+                    result = model.add_contacts_bulk(
+                        [("Johnny", "5551234567")], on_duplicate="skip"
+                    )
+                    self.assertEqual(result.skipped, 1)
+                    self.assertTrue(model.run_backfills())
+
+            self.assertTrue(model.search_index_enabled)
+
+    def test_add_contacts_bulk(self):
+        progress = []
+        contacts = ((f"Contact {i}", str(i)) for i in range(25))
+
+        result = self.model.add_contacts_bulk(
+            contacts, batch_size=10, progress_callback=progress.append
+        )
+
+        self.assertEqual(result, (25, 0, 0))
+        self.assertEqual(progress, [10, 20, 25])
+        self.assertEqual(len(self.model.get_all_contacts()), 25)
+
+    def test_add_contacts_bulk_duplicates(self):
+        john_id = self.model.add_contact("John Doe", "1234567890")
+        contacts = [("Johnny", "1234567890"), ("Jane", "555"), ("Janet", "555")]
+
+        # Skip: existing phones and repeats within the batch are dropped
+        result = self.model.add_contacts_bulk(contacts, on_duplicate="skip")
+        self.assertEqual(result, (1, 0, 2))
+        self.assertEqual([c.name for c in self.model.get_all_contacts()], ["Jane", "John Doe"])
+
+        # Importing the same rows again changes nothing
+        result = self.model.add_contacts_bulk(contacts, on_duplicate="skip")
+        self.assertEqual(result, (0, 0, 3))
+        self.assertEqual(self.model.count_contacts(), 2)
+
+        # Update: the existing contacts take the new names
+        result = self.model.add_contacts_bulk(
+            contacts + [("Zed", "999"), ("Zeddy", "999")], batch_size=4, on_duplicate="update"
+        )
+        self.assertEqual(result, (1, 4, 0))
+        self.assertEqual(
+            [c.name for c in self.model.get_all_contacts()], ["Janet", "Johnny", "Zeddy"]
+        )
+        self.assertEqual(self.model.get_contact(john_id).name, "Johnny")
+
+        # Keep: duplicates are inserted
+        result = self.model.add_contacts_bulk(contacts, on_duplicate="keep")
+        self.assertEqual(result, (3, 0, 0))
+        self.assertEqual(self.model.count_contacts(), 6)
+
+        with self.assertRaises(ValueError):
+            self.model.add_contacts_bulk(contacts, on_duplicate="merge")
+
+    def test_find_duplicates(self):
+        self.model.add_contact("John Doe", "1234567890")
+        self.model.add_contact("john  DOE", "111")
+        self.model.add_contact("Johnny", "111")
+        self.model.add_contact("Jane Smith", "0987654321")
+        self.model.add_contact("J. Smith", "0987654321")
+        self.model.add_contact("Bob", "222")
+
+        groups = self.model.find_duplicates()
+        self.assertEqual(
+            [[c.name for c in group] for group in groups],
+            [["J. Smith", "Jane Smith"], ["John Doe", "Johnny", "john  DOE"]],
+        )
+
+    def test_add_contacts_bulk_atomic_rollback(self):
+        def contacts():
+            for i in range(25):
+                yield f"Contact {i}", str(i)
+            raise ValueError("broken file")
+
+        with self.assertRaises(ValueError):
+            self.model.add_contacts_bulk(contacts(), batch_size=10)
+
+        # Nothing was written
+        self.assertEqual(self.model.get_all_contacts(), [])
+
+    def test_add_contacts_bulk_chunk_commit(self):
+        def contacts():
+            for i in range(25):
+                yield f"Contact {i}", str(i)
+            raise ValueError("broken file")
+
+        with self.assertRaises(ValueError):
+            self.model.add_contacts_bulk(contacts(), batch_size=10, atomic=False)
+
+        # Completed batches were kept
+        self.assertEqual(len(self.model.get_all_contacts()), 20)
+
+    def test_export_and_apply_changes(self):
+        john_id = self.model.add_contact("John", "111")
+        jane_id = self.model.add_contact("Jane", "222")
+        self.model.add_contacts_bulk([("Bob", "333")])
+        copy = ContactModel(os.path.join(self.temp_dir, "copy.db"))
+        self.addCleanup(copy.close)
+
+        result = copy.apply_changes(self.model.export_changes(chunk_size=2))
+        self.assertEqual((result.inserted, result.last_seq), (3, self.model.get_change_seq()))
+        since = result.last_seq
+
+        self.model.update_contact(john_id, "John Doe", "111")
+        self.model.update_contact(john_id, "John Smith", "111")
+        self.model.update_contact(jane_id, "Jane", "222")  # Unchanged
+        self.model.delete_contact(jane_id)
+        changes = list(self.model.export_changes(since))
+        self.assertEqual(
+            [(c.name, c.phone) for c in changes], [("John Smith", "111"), (None, None)]
+        )
+
+        result = copy.apply_changes(changes)
+        self.assertEqual((result.inserted, result.updated, result.deleted), (0, 1, 1))
+        self.assertEqual(
+            [(c.name, c.phone) for c in copy.filter_contacts("")],
+            [(c.name, c.phone) for c in self.model.filter_contacts("")],
+        )
+
+        # Changes synced back to where they came from stop there
+        seq = self.model.get_change_seq()
+        self.model.apply_changes(copy.export_changes())
+        self.assertEqual(self.model.get_change_seq(), seq)
+
+    def test_apply_changes_is_atomic(self):
+        contact_id = self.model.add_contact("John", "111")
+        changes = list(self.model.export_changes())
+        self.model.delete_contact(contact_id)
+
+        with self.assertRaises(AttributeError):
+            self.model.apply_changes(changes + [None])
+        self.assertEqual(self.model.count_contacts(), 0)
+
+    def test_fuzzy_search(self):
+        john_id = self.model.add_contact("John Doe", "111")
+        self.model.add_contacts_bulk(
+            [("Johnny Doeson", "222"), ("Jane Roe", "333"), ("María Rodríguez", "444")]
+        )
+
+        def names(search_text, limit=10):
+            return [(score, c.name) for score, c in self.model.fuzzy_matches(search_text, limit)]
+
+        self.assertEqual(names("Jon Do"), [(3, "John Doe"), (4, "Johnny Doeson")])
+        self.assertEqual(names("jhon doe", 1), [(2, "John Doe")])
+        self.assertEqual(names("maria rodrigez"), [(2, "María Rodríguez")])
+        self.assertEqual(
+            [c.name for c in self.model.fuzzy_search("roe")], ["Jane Roe", "María Rodríguez"]
+        )
+
+        # Every write keeps the word index up to date
+        self.model.update_contact(john_id, "Jon Smith", "111")
+        self.assertEqual(names("smith"), [(0, "Jon Smith")])
+        self.assertEqual(names("john doe"), [(2, "Johnny Doeson")])
+        self.model.delete_contact(john_id)
+        self.assertEqual(names("smith"), [])
+        self.model.add_contacts_bulk(
+            [("Jane Smith", "333"), ("Ann Lee", "555"), ("Ann Leigh", "555")],
+            on_duplicate="update",
+        )
+        self.assertEqual(names("smith"), [(0, "Jane Smith")])
+        self.assertEqual(names("ann"), [(0, "Ann Leigh")])
+        self.assertEqual(self.model.fuzzy_search(" , "), [])
+
+    def test_fuzzy_search_does_not_write(self):
+        self.model.add_contact("John Doe", "111")
+
+        with ContactModel(self.db_path) as reader:
+            version = self.model.get_data_version()
+            self.assertEqual([c.name for c in reader.fuzzy_search("jhon")], ["John Doe"])
+            self.assertFalse(reader.get_connection().in_transaction)
+        self.assertEqual(self.model.get_data_version(), version)
+
+    def test_applied_changes_are_indexed_for_fuzzy_search(self):
+        source = ContactModel(os.path.join(self.temp_dir, "source.db"))
+        self.addCleanup(source.close)
+        kept_id = source.add_contact("John Doe", "111")
+        deleted_id = source.add_contact("Jane Roe", "222")
+        source.update_contact(kept_id, "Jon Smith", "111")
+        source.delete_contact(deleted_id)
+        self.model.apply_changes(source.export_changes())
+
+        self.assertEqual([c.name for c in self.model.fuzzy_search("smiht")], ["Jon Smith"])
+        self.assertEqual(self.model.fuzzy_search("doe"), [])
+        self.assertEqual(self.model.fuzzy_search("roe"), [])
+
+    def test_connection_is_reused_per_thread(self):
+        conn = self.model.get_connection()
+        self.assertIs(conn, self.model.get_connection())
+
+        # Other threads get their own connection
+        other = []
+        thread = threading.Thread(
+            target=lambda: other.append(self.model.get_connection())
+        )
+        thread.start()
+        thread.join()
+        self.assertIsNot(conn, other[0])
+
+    def test_connections_of_exited_threads_are_closed(self):
+        self.model.get_connection()
+        threads = [threading.Thread(target=self.model.count_contacts) for _ in range(20)]
+        for thread in threads:
+            thread.start()
+            thread.join()
+
+        self.assertEqual(len(self.model._pool._connections), 1)
+        self.assertEqual(self.model.count_contacts(), 0)
+
+    def test_pragmas_applied(self):
+        conn = self.model.get_connection()
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        self.assertEqual(journal_mode.lower(), "wal")
+        synchronous = conn.execute("PRAGMA synchronous").fetchone()[0]
+        self.assertEqual(synchronous, 1)  # NORMAL
+
+    def test_close(self):
+        with ContactModel(self.db_path) as model:
+            model.add_contact("John Doe", "1234567890")
+
+        # A closed model does not open new connections
+        with self.assertRaises(sqlite3.ProgrammingError):
+            model.get_all_contacts()
+
+        # The data was persisted
+        self.assertEqual(len(self.model.get_all_contacts()), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,65 @@
+import unittest
+from model.fuzzy import (
+    candidate_words,
+    combine_tiers,
+    edit_budget,
+    fuzzy_words,
+    indexed_trigrams,
+    word_score,
+    word_trigrams,
+)
+
+
+class TestFuzzy(unittest.TestCase):
+    def test_fuzzy_words(self):
+        self.assertEqual(
+            fuzzy_words("  José MÜLLER-Ørsted, 3rd "), ["jose", "muller", "ørsted", "3rd"]
+        )
+        self.assertEqual(edit_budget("jo"), 0)
+        self.assertEqual(edit_budget("jon"), 1)
+        self.assertEqual(edit_budget("rodrigez"), 2)
+        self.assertEqual(edit_budget("agent007"), 0)
+        self.assertEqual(indexed_trigrams("agent007"), set())
+
+    def test_word_score(self):
+        cases = [
+            ("john", "john", 0),
+            ("jo", "john", 1),
+            ("jon", "john", 2),
+            ("jhon", "john", 2),  # Swapped letters are one typo
+            ("jonh", "johnson", 3),  # A typo in a prefix
+            ("rodrigez", "rodriguez", 2),
+            ("smiht", "smith", 2),
+            ("smxxh", "smith", None),
+            ("jane", "john", None),
+        ]
+        for query, word, score in cases:
+            with self.subTest(query=query, word=word):
+                self.assertEqual(word_score(query, word, edit_budget(query)), score)
+
+    def test_candidate_words(self):
+        index = {}
+        for word in ["john", "johnson", "jane", "rodriguez", "rodrigo"]:
+            for trigram in word_trigrams(word):
+                index.setdefault(trigram, []).append(word)
+
+        def candidates(query):
+            words = candidate_words(query, [index.get(t, []) for t in word_trigrams(query)])
+            return sorted(
+                word for word in words if word_score(query, word, edit_budget(query)) is not None
+            )
+
+        self.assertEqual(candidates("jhon"), ["john", "johnson"])
+        self.assertEqual(candidates("rodrigez"), ["rodrigo", "rodriguez"])
+
+    def test_combine_tiers(self):
+        tiers = combine_tiers([
+            {0: {1, 2, 3}, 2: {4, 5}},
+            {1: {2, 4}, 2: {3, 5, 6}},
+        ])
+
+        self.assertEqual(tiers, [(1, {2}), (2, {3}), (3, {4}), (4, {5})])
+
+
+if __name__ == "__main__":
+    unittest.main()
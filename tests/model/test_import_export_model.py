@@ -1,7 +1,11 @@
 import unittest
 from unittest.mock import Mock
-from model.import_export_model import ImportExportModel
+from model.contact_model import BulkResult, ContactModel
+from model.import_export_model import ImportExportModel, OperationCancelled
+import codecs
+import gzip
 import os
+import shutil
 import tempfile
 
 
@@ -10,6 +14,15 @@ class TestImportExportModel(unittest.TestCase):
         self.mock_contact_model = Mock()
         self.model = ImportExportModel(self.mock_contact_model)
 
+        # Consume the streamed rows the way ContactModel.add_contacts_bulk does
+        self.imported_rows = []
+
+        def add_contacts_bulk(contacts, **kwargs):
+            self.imported_rows.extend(contacts)
+            return BulkResult(len(self.imported_rows), 0, 0)
+
+        self.mock_contact_model.add_contacts_bulk.side_effect = add_contacts_bulk
+
     def test_export_contacts_success(self):
         # Setup mock contacts
         mock_contact1 = Mock()
@@ -18,10 +31,9 @@ class TestImportExportModel(unittest.TestCase):
         mock_contact2 = Mock()
         mock_contact2.name = "Jane Smith"
         mock_contact2.phone = "0987654321"
-        self.mock_contact_model.get_all_contacts.return_value = [
-            mock_contact1,
-            mock_contact2,
-        ]
+        self.mock_contact_model.iter_contacts.return_value = iter(
+            [mock_contact1, mock_contact2]
+        )
 
         # Create temporary file
         with tempfile.NamedTemporaryFile(delete=False) as temp_file:
@@ -44,13 +56,56 @@ class TestImportExportModel(unittest.TestCase):
         os.unlink(file_path)
 
     def test_export_no_contacts(self):
-        self.mock_contact_model.get_all_contacts.return_value = []
+        self.mock_contact_model.iter_contacts.return_value = iter([])
 
         success, message = self.model.export_contacts_to_file("dummy.txt")
 
         self.assertFalse(success)
         self.assertEqual(message, "There are no contacts to export.")
 
+    def _export(self, file_name, **kwargs):
+        contact = Mock()
+        contact.name = "Doe, John"
+        contact.phone = "1234567890"
+        self.mock_contact_model.iter_contacts.return_value = iter([contact])
+
+        temp_dir = tempfile.mkdtemp()
+        file_path = os.path.join(temp_dir, file_name)
+        success, message = self.model.export_contacts_to_file(file_path, **kwargs)
+        self.assertTrue(success, message)
+
+        if file_path.endswith(".gz"):
+            with gzip.open(file_path, "rt", encoding="utf-8", newline="") as f:
+                content = f.read()
+        else:
+            with open(file_path, encoding="utf-8", newline="") as f:
+                content = f.read()
+
+        # Cleanup
+        shutil.rmtree(temp_dir)
+        return content
+
+    def test_export_formats(self):
+        self.assertEqual(self._export("out.csv"), 'name,phone\r\n"Doe, John",1234567890\r\n')
+        self.assertEqual(
+            self._export("out.jsonl"), '{"name": "Doe, John", "phone": "1234567890"}\n'
+        )
+        self.assertIn("FN:Doe\\, John\r\nTEL:1234567890", self._export("out.vcf"))
+
+        # Explicit format overrides the extension
+        self.assertEqual(self._export("out.dat", export_format="csv").splitlines()[0], "name,phone")
+
+        # Unknown extensions use the legacy text format
+        self.assertEqual(self._export("out.dat"), "Doe, John, 1234567890\n")
+
+    def test_export_gzip(self):
+        self.assertEqual(self._export("out.csv.gz").splitlines()[0], "name,phone")
+
+    def test_export_unknown_format(self):
+        success, message = self.model.export_contacts_to_file("out.txt", export_format="xml")
+        self.assertFalse(success)
+        self.assertIn("Unknown export format: xml", message)
+
     def test_import_contacts_success(self):
         # Create test file
         test_content = """John Doe, 1234567890 
@@ -69,8 +124,10 @@ class TestImportExportModel(unittest.TestCase):
         self.assertIn("Successfully imported 2 contact(s)", message)
 
         # Verify contacts were added
-        self.mock_contact_model.add_contact.assert_any_call("John Doe", "1234567890")
-        self.mock_contact_model.add_contact.assert_any_call("Jane Smith", "0987654321")
+        self.assertEqual(
+            self.imported_rows,
+            [("John Doe", "1234567890"), ("Jane Smith", "0987654321")],
+        )
 
         # Cleanup
         os.unlink(file_path)
@@ -117,6 +174,118 @@ class TestImportExportModel(unittest.TestCase):
         # Cleanup
         os.unlink(file_path)
 
+    def test_import_parallel(self):
+        # Create test file with invalid lines spread over several chunks
+        lines = []
+        for i in range(1, 201):
+            lines.append("Invalid Line" if i % 50 == 0 else f"Contact {i}, {i}")
+
+        with tempfile.NamedTemporaryFile(mode="w", delete=False) as temp_file:
+            temp_file.write("\n".join(lines))
+            file_path = temp_file.name
+
+        # Parse with chunks of a few lines each
+        invalid_lines = []
+        with open(file_path, "rb") as f:
+            buffer = f.read()
+        rows = list(
+            self.model._parse_contacts_parallel(
+                file_path, buffer, 0, "utf-8", invalid_lines, 2, chunk_size=64
+            )
+        )
+
+        # Rows keep file order and errors keep their line numbers
+        self.assertEqual(len(rows), 196)
+        self.assertEqual(rows[0], ("Contact 1", "1"))
+        self.assertEqual(rows[-1], ("Contact 199", "199"))
+        self.assertEqual(
+            invalid_lines,
+            ["Line 50: Invalid format", "Line 100: Invalid format",
+             "Line 150: Invalid format", "Line 200: Invalid format"],
+        )
+
+        # The full import gives the same result as the serial path
+        success, message = self.model.import_contacts_from_file(file_path, workers=2)
+        self.assertTrue(success)
+        self.assertIn("Successfully imported 196 contact(s)", message)
+        self.assertIn("- Line 50: Invalid format", message)
+
+        # Cleanup
+        os.unlink(file_path)
+
+    def _import_bytes(self, data, **kwargs):
+        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
+            temp_file.write(data)
+            file_path = temp_file.name
+
+        result = self.model.import_contacts_from_file(file_path, **kwargs)
+
+        # Cleanup
+        os.unlink(file_path)
+        return result
+
+    def test_import_encodings(self):
+        # UTF-8 with a byte order mark and Windows line endings
+        success, _ = self._import_bytes(codecs.BOM_UTF8 + "José, 123\r\nZoë,456\r\n".encode("utf-8"))
+        self.assertTrue(success)
+        self.assertEqual(self.imported_rows, [("José", "123"), ("Zoë", "456")])
+
+        # Latin-1 is detected when the file is not valid UTF-8
+        self.imported_rows.clear()
+        success, _ = self._import_bytes("José, 123\n".encode("latin-1"))
+        self.assertTrue(success)
+        self.assertEqual(self.imported_rows, [("José", "123")])
+
+        # An explicit encoding is used as given
+        self.imported_rows.clear()
+        success, _ = self._import_bytes("Šárka, 123\n".encode("cp1250"), encoding="cp1250")
+        self.assertTrue(success)
+        self.assertEqual(self.imported_rows, [("Šárka", "123")])
+
+        # Encodings that are not ASCII compatible are rejected
+        success, message = self._import_bytes("John, 123\n".encode("utf-16"))
+        self.assertFalse(success)
+        self.assertIn("UTF-16 and UTF-32 files are not supported", message)
+
+    def test_import_line_parsing(self):
+        data = b"Doe, John, 123\n,123\nJohn, 12ab\nJohn,\n\n   \nJane ,  0987  "
+        success, message = self._import_bytes(data)
+
+        self.assertTrue(success)
+        self.assertEqual(self.imported_rows, [("Doe, John", "123"), ("Jane", "0987")])
+        self.assertIn("Warning: 3 line(s) could not be imported", message)
+        self.assertIn("- Line 2: Invalid format", message)
+        self.assertIn("- Line 4: Invalid format", message)
+
+    def test_import_empty_file(self):
+        success, message = self._import_bytes(b"")
+        self.assertFalse(success)
+        self.assertEqual(message, "No contacts were found in the file.")
+
+    def test_import_failure_reports_committed_batches(self):
+        def add_contacts_bulk(contacts, progress_callback=None, **kwargs):
+            progress_callback(1)
+            raise RuntimeError("disk full")
+
+        self.mock_contact_model.add_contacts_bulk.side_effect = add_contacts_bulk
+
+        with tempfile.NamedTemporaryFile(mode="w", delete=False) as temp_file:
+            temp_file.write("John Doe, 1234567890\n")
+            file_path = temp_file.name
+
+        # All-or-nothing mode does not report partial progress
+        success, message = self.model.import_contacts_from_file(file_path)
+        self.assertFalse(success)
+        self.assertEqual(message, "Error importing contacts: disk full")
+
+        # Chunk-commit mode reports what was kept
+        success, message = self.model.import_contacts_from_file(file_path, atomic=False)
+        self.assertFalse(success)
+        self.assertIn("1 contact(s) were imported before the error", message)
+
+        # Cleanup
+        os.unlink(file_path)
+
     def test_file_errors(self):
         # Test export to invalid path
         success, message = self.model.export_contacts_to_file("/invalid/path/file.txt")
@@ -129,5 +298,90 @@ class TestImportExportModel(unittest.TestCase):
         self.assertIn("Error importing contacts", message)
 
 
+
+class TestImportExportProgress(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.contact_model = ContactModel(os.path.join(self.temp_dir, "contacts.db"))
+        self.model = ImportExportModel(self.contact_model)
+
+        self.import_path = os.path.join(self.temp_dir, "import.txt")
+        with open(self.import_path, "w") as f:
+            for i in range(100):
+                f.write(f"Contact {i}, {i}\n")
+
+    def tearDown(self):
+        self.contact_model.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_import_progress(self):
+        progress = []
+        success, _ = self.model.import_contacts_from_file(
+            self.import_path, batch_size=40, progress_callback=lambda *args: progress.append(args)
+        )
+
+        self.assertTrue(success)
+        self.assertEqual(self.contact_model.count_contacts(), 100)
+        self.assertEqual([count for count, _ in progress], [40, 80, 100])
+        self.assertEqual(progress[-1][1], 1.0)
+        self.assertTrue(0 < progress[0][1] < progress[1][1] < 1)
+
+    def test_import_duplicates(self):
+        self.model.import_contacts_from_file(self.import_path)
+
+        success, message = self.model.import_contacts_from_file(
+            self.import_path, on_duplicate="skip"
+        )
+        self.assertTrue(success)
+        self.assertEqual(message, "Successfully imported 0 contact(s)\n100 duplicate(s) skipped")
+        self.assertEqual(self.contact_model.count_contacts(), 100)
+
+        success, message = self.model.import_contacts_from_file(
+            self.import_path, on_duplicate="update"
+        )
+        self.assertIn("100 existing contact(s) updated", message)
+
+    def test_import_cancel(self):
+        def cancel(count, fraction):
+            if count >= 40:
+                raise OperationCancelled()
+
+        # All-or-nothing imports are rolled back
+        success, message = self.model.import_contacts_from_file(
+            self.import_path, batch_size=20, progress_callback=cancel
+        )
+        self.assertFalse(success)
+        self.assertEqual(message, "Import cancelled. No contacts were imported.")
+        self.assertEqual(self.contact_model.count_contacts(), 0)
+
+        # Chunk-commit imports keep the committed batches
+        success, message = self.model.import_contacts_from_file(
+            self.import_path, batch_size=20, progress_callback=cancel, atomic=False
+        )
+        self.assertFalse(success)
+        self.assertEqual(message, "Import cancelled after 40 contact(s) were imported.")
+        self.assertEqual(self.contact_model.count_contacts(), 40)
+
+    def test_export_progress_and_cancel(self):
+        self.model.import_contacts_from_file(self.import_path)
+        export_path = os.path.join(self.temp_dir, "export.txt")
+
+        progress = []
+        success, _ = self.model.export_contacts_to_file(
+            export_path, progress_callback=lambda *args: progress.append(args)
+        )
+        self.assertTrue(success)
+        self.assertEqual(progress[-1], (100, 1.0))
+
+        def cancel(count, fraction):
+            raise OperationCancelled()
+
+        success, message = self.model.export_contacts_to_file(
+            export_path, progress_callback=cancel
+        )
+        self.assertFalse(success)
+        self.assertEqual(message, "Export cancelled.")
+        self.assertFalse(os.path.exists(export_path))
+
 if __name__ == "__main__":
     unittest.main()
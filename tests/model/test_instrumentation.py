@@ -0,0 +1,75 @@
+import unittest
+import json
+import os
+import shutil
+import tempfile
+from model.contact_model import ContactModel
+from model.instrumentation import instrumentation
+
+
+class TestInstrumentation(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.model = ContactModel(os.path.join(self.temp_dir, "contacts.db"))
+        self.model.add_contact("John Doe", "1234567890")
+        instrumentation.reset()
+
+    def tearDown(self):
+        instrumentation.disable()
+        instrumentation.reset()
+        self.model.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_disabled_by_default(self):
+        self.model.filter_contacts("john")
+
+        self.assertEqual(instrumentation.snapshot(), {"counters": {}, "operations": {}})
+
+    def test_operation_timings(self):
+        instrumentation.enable(slow_threshold=60)
+        self.model.add_contact("Jane Smith", "0987654321")
+        self.model.get_all_contacts()
+
+        snapshot = instrumentation.snapshot()
+        operations = snapshot["operations"]
+        self.assertEqual(operations["ContactModel.add_contact"]["count"], 1)
+        # get_all_contacts delegates to filter_contacts; both are timed
+        self.assertEqual(operations["ContactModel.filter_contacts"]["count"], 1)
+        self.assertEqual(sum(operations["ContactModel.get_all_contacts"]["buckets"].values()), 1)
+        self.assertGreater(snapshot["counters"]["sqlite_statements"], 0)
+        self.assertNotIn("slow_operations", snapshot["counters"])
+
+    def test_slow_operation_log(self):
+        instrumentation.enable(slow_threshold=0)
+
+        with self.assertLogs("contacts.slow") as logs:
+            self.model.filter_contacts("doe")
+
+        # Logged once, by the outermost operation
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("Slow operation ContactModel.filter_contacts", logs.output[0])
+        self.assertIn("SQL: SELECT name, phone, id FROM contacts", logs.output[0])
+        self.assertIn("PLAN:", logs.output[0])
+
+    def test_export(self):
+        instrumentation.enable(slow_threshold=60)
+        self.model.count_contacts()
+
+        text = instrumentation.to_prometheus()
+        self.assertIn("# TYPE contacts_operation_seconds histogram", text)
+        self.assertIn(
+            'contacts_operation_seconds_count{operation="ContactModel.count_contacts"} 1', text
+        )
+        self.assertIn(
+            'contacts_operation_seconds_bucket{operation="ContactModel.count_contacts",le="+Inf"} 1',
+            text,
+        )
+
+        path = os.path.join(self.temp_dir, "metrics.json")
+        instrumentation.write(path)
+        with open(path, encoding="utf-8") as file:
+            self.assertEqual(json.load(file), instrumentation.snapshot())
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,187 @@
+import unittest
+import os
+import shutil
+import tempfile
+import threading
+from model.contact_model import ContactModel
+from model.memory_model import InMemoryContactModel
+
+
+class TestInMemoryContactModel(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.model = InMemoryContactModel()
+
+    def tearDown(self):
+        self.model.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_crud(self):
+        contact_id = self.model.add_contact("Jane Doe", "555-1234")
+
+        contact = self.model.get_contact(contact_id)
+        self.assertEqual((contact.name, contact.phone), ("Jane Doe", "555-1234"))
+        self.assertTrue(self.model.update_contact(contact_id, "Jane Smith", "555-9999"))
+        self.assertEqual(self.model.filter_contacts("smith")[0].contact_id, contact_id)
+        self.assertEqual(self.model.filter_contacts("doe"), [])
+        self.assertTrue(self.model.delete_contact(contact_id))
+        self.assertIsNone(self.model.get_contact(contact_id))
+        self.assertFalse(self.model.update_contact(contact_id, "Gone", "1"))
+        self.assertFalse(self.model.delete_contact(contact_id))
+        self.assertEqual(self.model.count_contacts(), 0)
+
+    def test_reads_match_contact_model(self):
+        contacts = [(f"{first} {i:03d}", f"+1 555 {i:04d}") for i, first in enumerate(
+            ["Ann", "Bob", "Johnny", "Joan", "Ánna"] * 40
+        )]
+        contacts += [("Dup", "+1 555 0007"), ("Local", "555 0008")]
+        database = ContactModel(os.path.join(self.temp_dir, "contacts.db"))
+        self.addCleanup(database.close)
+        for model in (self.model, database):
+            model.add_contacts_bulk(contacts)
+
+        def keys(found):
+            return [(c.name, c.phone, c.contact_id) for c in found]
+
+        for text in ["", "jo", "ohn", "555 01", "Ánna 0", "zz"]:
+            with self.subTest(text=text):
+                expected = keys(database.filter_contacts(text))
+                self.assertEqual(keys(self.model.filter_contacts(text)), expected)
+                self.assertEqual(keys(self.model.filter_contacts(text, 7, 3)), expected[3:10])
+                self.assertEqual(self.model.count_contacts(text), len(expected))
+                if expected:
+                    after = expected[len(expected) // 2][0], expected[len(expected) // 2][2]
+                    self.assertEqual(
+                        keys(self.model.page_contacts(after, 5, text)),
+                        keys(database.page_contacts(after, 5, text)),
+                    )
+
+        for phone in ["5550007", "+15550008", "0008"]:
+            with self.subTest(phone=phone):
+                self.assertEqual(
+                    keys(self.model.lookup_by_phone(phone)), keys(database.lookup_by_phone(phone))
+                )
+        self.assertEqual(
+            [keys(group) for group in self.model.find_duplicates()],
+            [keys(group) for group in database.find_duplicates()],
+        )
+
+    def test_fuzzy_search_matches_contact_model(self):
+        contacts = [(f"{first} {last} {i:03d}", str(i)) for i, (first, last) in enumerate(
+            [("John", "Smith"), ("Jon", "Smyth"), ("Joan", "Doe"), ("Jöhnny", "Smithson")] * 50
+        )]
+        database = ContactModel(os.path.join(self.temp_dir, "contacts.db"))
+        self.addCleanup(database.close)
+        for model in (self.model, database):
+            model.add_contacts_bulk(contacts)
+            model.delete_contact(5)
+
+        def keys(matches):
+            return [(score, c.name, c.contact_id) for score, c in matches]
+
+        for text in ["jon", "jhon smiht", "johnny 007", "007", "sm", "0", "smith doe", "zz"]:
+            for limit in [None, 3, 120]:
+                with self.subTest(text=text, limit=limit):
+                    self.assertEqual(
+                        keys(self.model.fuzzy_matches(text, limit)),
+                        keys(database.fuzzy_matches(text, limit)),
+                    )
+
+    def test_add_contacts_bulk(self):
+        self.model.add_contact("Existing", "111")
+
+        result = self.model.add_contacts_bulk(
+            [("Updated", "111"), ("New", "222"), ("Newer", "222")], on_duplicate="update"
+        )
+
+        self.assertEqual((result.inserted, result.updated, result.skipped), (1, 2, 0))
+        self.assertEqual([c.name for c in self.model.filter_contacts("")], ["Newer", "Updated"])
+
+    def test_bulk_update_of_a_contact_twice_in_a_batch(self):
+        contact_id = self.model.add_contact("Same", "111")
+        self.model.add_contact("Other", "222")
+
+        self.model.add_contacts_bulk(
+            [("Changed", "111"), ("Same", "111"), ("Renamed", "222")], on_duplicate="update"
+        )
+
+        self.assertEqual(
+            [c.name for c in self.model.page_contacts(limit=10)], ["Renamed", "Same"]
+        )
+        self.assertEqual(self.model.lookup_by_phone("111")[0].contact_id, contact_id)
+        self.assertEqual([c.name for c in self.model.lookup_by_phone("222")], ["Renamed"])
+        self.assertEqual(self.model.page_contacts(("Same", contact_id)), [])
+
+    def test_atomic_bulk_add_rolls_back(self):
+        existing_id = self.model.add_contact("Existing", "111")
+
+        def contacts():
+            yield from [("Updated", "111"), ("New", "222"), ("Other", "333")]
+            raise ValueError("bad row")
+
+        with self.assertRaises(ValueError):
+            self.model.add_contacts_bulk(contacts(), batch_size=1, on_duplicate="update")
+
+        self.assertEqual(
+            [(c.contact_id, c.name) for c in self.model.filter_contacts("")],
+            [(existing_id, "Existing")],
+        )
+        self.assertEqual(self.model.lookup_by_phone("222"), [])
+        self.assertEqual(self.model.add_contact("Next", "444"), existing_id + 3)
+
+    def test_atomic_bulk_add_rollback_keeps_concurrent_adds(self):
+        self.model.add_contact("Existing", "111")
+        concurrent_ids = []
+
+        def add_concurrently():
+            concurrent_ids.append(self.model.add_contact("Concurrent", "999"))
+
+        def contacts():
+            yield ("New", "222")
+            thread = threading.Thread(target=add_concurrently)
+            thread.start()
+            thread.join()
+            yield ("Updated", "111")
+            raise ValueError("bad row")
+
+        with self.assertRaises(ValueError):
+            self.model.add_contacts_bulk(contacts(), batch_size=1, on_duplicate="update")
+
+        self.assertEqual(
+            [c.name for c in self.model.filter_contacts("")], ["Concurrent", "Existing"]
+        )
+        self.assertEqual(self.model.get_contact(concurrent_ids[0]).phone, "999")
+        next_id = self.model.add_contact("Next", "444")
+        self.assertGreater(next_id, concurrent_ids[0])
+        self.assertEqual(self.model.get_contact(concurrent_ids[0]).name, "Concurrent")
+
+    def test_data_version_changes_for_other_threads(self):
+        version = self.model.get_data_version()
+        self.model.add_contact("Mine", "111")
+        self.assertEqual(self.model.get_data_version(), version)
+
+        thread = threading.Thread(target=self.model.add_contact, args=("Theirs", "222"))
+        thread.start()
+        thread.join()
+        self.assertNotEqual(self.model.get_data_version(), version)
+
+    def test_snapshot_round_trip(self):
+        path = os.path.join(self.temp_dir, "snapshot.db")
+        model = InMemoryContactModel(path)
+        kept_id = model.add_contact("Kept", "+44 20 7946 0000")
+        deleted_id = model.add_contact("Deleted", "222")
+        model.delete_contact(deleted_id)
+        model.close()
+
+        with ContactModel(path) as database:
+            self.assertEqual(database.get_contact(kept_id).name, "Kept")
+            self.assertEqual(database.lookup_by_phone("+442079460000")[0].contact_id, kept_id)
+            self.assertEqual([c.contact_id for c in database.fuzzy_search("kep")], [kept_id])
+
+        reloaded = InMemoryContactModel(path)
+        self.assertEqual([c.contact_id for c in reloaded.filter_contacts("")], [kept_id])
+        self.assertGreater(reloaded.add_contact("New", "333"), deleted_id)
+
+
+if __name__ == "__main__":
+    unittest.main()
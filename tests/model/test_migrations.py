@@ -0,0 +1,148 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from model import migrations
+from model.migrations import (
+    Migration,
+    get_version,
+    latest_version,
+    migrate,
+    pending_backfills,
+    run_backfill,
+    table_exists,
+)
+
+
+class TestMigrations(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.db_path = os.path.join(self.temp_dir, "contacts.db")
+        self.conn = sqlite3.connect(self.db_path)
+
+    def tearDown(self):
+        self.conn.close()
+        shutil.rmtree(self.temp_dir)
+
+    def create_old_database(self, count):
+        """Creates a contacts table as written before schema versions existed"""
+        self.conn.execute(
+            "CREATE TABLE contacts (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "name TEXT NOT NULL, phone TEXT NOT NULL)"
+        )
+        self.conn.executemany(
+            "INSERT INTO contacts (name, phone) VALUES (?, ?)",
+            [(f"Contact {i}", f"555-{i:04d}") for i in range(count)],
+        )
+        self.conn.commit()
+
+    def test_fresh_database(self):
+        reports = migrate(self.conn)
+
+        self.assertEqual([r.version for r in reports], [m.version for m in migrations.MIGRATIONS])
+        self.assertTrue(all(r.applied for r in reports))
+        self.assertEqual(get_version(self.conn), latest_version())
+        self.assertEqual(migrate(self.conn), [])
+
+    def test_dry_run(self):
+        self.create_old_database(3)
+
+        reports = migrate(self.conn, dry_run=True)
+
+        self.assertEqual(len(reports), len(migrations.MIGRATIONS))
+        self.assertFalse(any(r.applied for r in reports))
+        self.assertEqual(get_version(self.conn), 0)
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(contacts)")]
+        self.assertNotIn("phone_digits", columns)
+
+    def test_upgrade_in_batches(self):
+        self.create_old_database(25)
+
+        migrate(self.conn, batch_size=10)
+
+        self.assertEqual(get_version(self.conn), latest_version())
+        missing = self.conn.execute(
+            "SELECT COUNT(*) FROM contacts "
+            "WHERE phone_digits IS NULL OR phone_reversed IS NULL OR uid IS NULL"
+        ).fetchone()[0]
+        self.assertEqual(missing, 0)
+        journaled = self.conn.execute("SELECT COUNT(*) FROM contact_changes").fetchone()[0]
+        self.assertEqual(journaled, 25)
+        words = self.conn.execute("SELECT COUNT(*) FROM contact_words").fetchone()[0]
+        self.assertEqual(words, 50)
+        self.assertEqual(
+            self.conn.execute("SELECT COUNT(*) FROM migration_progress").fetchone()[0], 0
+        )
+        if table_exists(self.conn, "contacts_fts"):
+            rows = self.conn.execute(
+                "SELECT rowid FROM contacts_fts WHERE contacts_fts MATCH '\"555-0012\"'"
+            ).fetchall()
+            self.assertEqual(rows, [(13,)])
+
+    def test_deferred_backfills(self):
+        self.create_old_database(25)
+
+        migrate(self.conn, defer_backfills=True)
+
+        self.assertEqual(get_version(self.conn), latest_version())
+        pending = pending_backfills(self.conn)
+        self.assertEqual(pending[-3:], [5, 6, 7])
+        filled = self.conn.execute(
+            "SELECT COUNT(*) FROM contacts WHERE phone_digits IS NOT NULL"
+        ).fetchone()[0]
+        self.assertEqual(filled, 0)
+
+        # Each batch resumes from the recorded progress
+        calls = iter([False, True])
+        self.assertFalse(run_backfill(self.conn, 4, batch_size=10, cancelled=lambda: next(calls)))
+        self.assertEqual(pending_backfills(self.conn), pending)
+        for version in pending:
+            self.assertTrue(run_backfill(self.conn, version, batch_size=10))
+
+        self.assertEqual(pending_backfills(self.conn), [])
+        missing = self.conn.execute(
+            "SELECT COUNT(*) FROM contacts WHERE phone_digits IS NULL OR uid IS NULL"
+        ).fetchone()[0]
+        self.assertEqual(missing, 0)
+        self.assertEqual(migrate(self.conn), [])
+
+    def test_interrupted_backfill_resumes(self):
+        self.create_old_database(25)
+        batches = []
+
+        def failing_backfill(conn, first_id, last_id):
+            if first_id > 10:
+                raise RuntimeError("interrupted")
+            batches.append((first_id, last_id))
+            conn.execute(
+                "UPDATE contacts SET name = 'done' WHERE id BETWEEN ? AND ?",
+                (first_id, last_id),
+            )
+
+        def schema(conn):
+            return True
+
+        original = migrations.MIGRATIONS[:]
+        migrations.MIGRATIONS.append(
+            Migration(latest_version() + 1, "Test backfill", schema, failing_backfill)
+        )
+        try:
+            with self.assertRaises(RuntimeError):
+                migrate(self.conn, batch_size=10)
+            self.assertEqual(get_version(self.conn), latest_version() - 1)
+            self.assertEqual(batches, [(1, 10)])
+
+            # The committed batch is not repeated
+            migrations.MIGRATIONS[-1] = migrations.MIGRATIONS[-1]._replace(
+                backfill=lambda conn, first_id, last_id: batches.append((first_id, last_id))
+            )
+            migrate(self.conn, batch_size=10)
+            self.assertEqual(batches, [(1, 10), (11, 20), (21, 25)])
+            self.assertEqual(get_version(self.conn), latest_version())
+        finally:
+            migrations.MIGRATIONS[:] = original
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from model.phone import is_valid_phone, normalize_phone, to_e164
+
+
+class TestPhone(unittest.TestCase):
+    def test_is_valid_phone(self):
+        for phone in ["123", "+1 (555) 123-4567", "555.123.4567", "0044/20 7946 0958"]:
+            self.assertTrue(is_valid_phone(phone), phone)
+            self.assertTrue(is_valid_phone(phone.encode("ascii")), phone)
+        for phone in ["", "+", "12a", "1+2", "(--)", "555 123 ext 4"]:
+            self.assertFalse(is_valid_phone(phone), phone)
+            self.assertFalse(is_valid_phone(phone.encode("ascii")), phone)
+
+    def test_to_e164(self):
+        self.assertEqual(to_e164("+1 (555) 123-4567"), "+15551234567")
+        self.assertEqual(to_e164("0044 20 7946 0958"), "+442079460958")
+        self.assertIsNone(to_e164("555 123 4567"))
+        self.assertEqual(to_e164("0555 123 4567", country_code="49"), "+495551234567")
+        self.assertIsNone(to_e164("+0 123"))
+        self.assertIsNone(to_e164("+1234567890123456"))
+
+    def test_normalize_phone(self):
+        self.assertEqual(
+            normalize_phone("+1 555-0100"), ("15550100", "+15550100", "00105551")
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
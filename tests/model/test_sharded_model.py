@@ -0,0 +1,148 @@
+import unittest
+import os
+import shutil
+import sqlite3
+import tempfile
+from model.contact_model import ContactModel
+from model.sharded_model import ShardedContactModel, is_sharded_store, open_model, reshard
+
+
+class TestShardedContactModel(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.store = os.path.join(self.temp_dir, "store")
+        self.model = ShardedContactModel(self.store, shard_count=3)
+
+    def tearDown(self):
+        self.model.close()
+        shutil.rmtree(self.temp_dir)
+
+    def add_many(self, count):
+        return [self.model.add_contact(f"Contact {i:03d}", f"555{i:04d}") for i in range(count)]
+
+    def test_crud(self):
+        ids = self.add_many(30)
+
+        self.assertEqual(len(set(ids)), 30)
+        self.assertEqual({i % 3 for i in ids}, {0, 1, 2})
+        contact = self.model.get_contact(ids[7])
+        self.assertEqual((contact.name, contact.contact_id), ("Contact 007", ids[7]))
+
+        self.assertTrue(self.model.update_contact(ids[7], "Renamed", "999"))
+        self.assertEqual(self.model.get_contact(ids[7]).name, "Renamed")
+        self.assertTrue(self.model.delete_contact(ids[7]))
+        self.assertIsNone(self.model.get_contact(ids[7]))
+        self.assertEqual(self.model.count_contacts(), 29)
+
+    def test_merged_reads_keep_order(self):
+        ids = self.add_many(50)
+        expected = [(f"Contact {i:03d}", contact_id) for i, contact_id in enumerate(ids)]
+
+        def keys(contacts):
+            return [(c.name, c.contact_id) for c in contacts]
+
+        self.assertEqual(keys(self.model.get_all_contacts()), expected)
+        self.assertEqual(keys(self.model.get_all_contacts(limit=5, offset=10)), expected[10:15])
+        self.assertEqual(keys(self.model.iter_contacts(chunk_size=7)), expected)
+        self.assertEqual(list(self.model.get_contact_columns("Contact 04").ids), ids[40:50])
+
+        pages = []
+        after = None
+        while True:
+            page = self.model.page_contacts(after, 6)
+            pages.extend(page)
+            if len(page) < 6:
+                break
+            after = (page[-1].name, page[-1].contact_id)
+        self.assertEqual(keys(pages), expected)
+
+    def test_fuzzy_search(self):
+        ids = [self.model.add_contact(name, str(i)) for i, name in enumerate(
+            ["Jon Smith", "John Smith", "Johnny Smyth", "Jane Doe"] * 3
+        )]
+
+        matches = self.model.fuzzy_matches("jhon smith", 8)
+
+        # One typo away from "Jon" and "John", ties ordered by id across shards,
+        # then "Johnny Smyth", a typo in a prefix and one in the last name
+        exact = sorted(ids[i] for i in range(12) if i % 4 < 2)
+        near = sorted(ids[i] for i in range(12) if i % 4 == 2)[:2]
+        self.assertEqual(
+            [(score, c.contact_id) for score, c in matches],
+            [(2, i) for i in exact] + [(5, i) for i in near],
+        )
+
+    def test_add_contacts_bulk(self):
+        progress = []
+        contacts = [(f"Contact {i}", str(i % 40)) for i in range(100)]
+
+        result = self.model.add_contacts_bulk(
+            contacts, batch_size=10, progress_callback=progress.append, on_duplicate="skip"
+        )
+
+        self.assertEqual(result, (40, 0, 60))
+        self.assertEqual(progress[-1], 100)
+        self.assertEqual(self.model.count_contacts(), 40)
+
+    def test_bulk_duplicates_of_a_contact_whose_phone_changed_shard(self):
+        contact_id = self.model.add_contact("Moved", "5550001")
+        phone = next(
+            f"555{i:04d}" for i in range(2, 100)
+            if self.model._shard_index_for(f"555{i:04d}") != contact_id % 3
+        )
+        self.model.update_contact(contact_id, "Moved", phone)
+
+        result = self.model.add_contacts_bulk([("Skipped", phone)], on_duplicate="skip")
+        self.assertEqual(result, (0, 0, 1))
+        result = self.model.add_contacts_bulk([("Updated", phone)], on_duplicate="update")
+        self.assertEqual(result, (0, 1, 0))
+        self.assertEqual(self.model.lookup_by_phone(phone)[0].name, "Updated")
+        self.assertEqual(self.model.count_contacts(), 1)
+
+    def test_add_contacts_bulk_failure_rolls_back_every_shard(self):
+        def contacts():
+            for i in range(100):
+                yield f"Contact {i}", str(i)
+            raise RuntimeError("bad input")
+
+        with self.assertRaises(RuntimeError):
+            self.model.add_contacts_bulk(contacts(), batch_size=10)
+        self.assertEqual(self.model.count_contacts(), 0)
+
+    def test_failure_in_a_shards_last_batch_rolls_back_every_shard(self):
+        model = ShardedContactModel(os.path.join(self.temp_dir, "pair"), shard_count=2)
+        self.addCleanup(model.close)
+        contacts = [(f"Contact {i}", str(i)) for i in range(20)] + [(None, "999")]
+
+        # Every shard gets a single batch, the failing row in one of them
+        with self.assertRaises(sqlite3.IntegrityError):
+            model.add_contacts_bulk(contacts)
+        self.assertEqual(model.count_contacts(), 0)
+
+    def test_reopen_and_reshard(self):
+        self.add_many(20)
+        self.model.close()
+
+        self.assertTrue(is_sharded_store(self.store))
+        with self.assertRaises(ValueError):
+            ShardedContactModel(self.store, shard_count=5)
+        self.model = open_model(self.store)
+        self.assertEqual(self.model.shard_count, 3)
+
+        destination = os.path.join(self.temp_dir, "resharded")
+        self.assertEqual(reshard(self.model, destination, 5), 20)
+        with ShardedContactModel(destination) as resharded:
+            self.assertEqual(resharded.shard_count, 5)
+            self.assertEqual(
+                [c.name for c in resharded.get_all_contacts()],
+                [c.name for c in self.model.get_all_contacts()],
+            )
+
+        single = os.path.join(self.temp_dir, "single.db")
+        with ContactModel(single) as model:
+            model.add_contact("John", "123")
+            self.assertEqual(reshard(model, os.path.join(self.temp_dir, "from_single"), 2), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
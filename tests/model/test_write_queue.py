@@ -0,0 +1,79 @@
+import os
+import shutil
+import sqlite3
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from model.contact_model import ContactModel
+from model.write_queue import WriteQueue
+
+
+class TestWriteQueue(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.model = ContactModel(os.path.join(self.temp_dir, "contacts.db"))
+        self.write_queue = WriteQueue(self.model, max_batch=50)
+
+    def tearDown(self):
+        self.write_queue.close()
+        self.model.close()
+        shutil.rmtree(self.temp_dir)
+
+    def test_mutations(self):
+        contact_id = self.write_queue.add_contact("John", "123").result()
+
+        self.assertTrue(self.write_queue.update_contact(contact_id, "Jane", "456").result())
+        self.assertEqual(self.model.get_contact(contact_id).name, "Jane")
+        self.assertTrue(self.write_queue.delete_contact(contact_id).result())
+        self.assertFalse(self.write_queue.delete_contact(contact_id).result())
+        self.assertEqual(self.model.count_contacts(), 0)
+
+    def test_concurrent_writers_share_commits(self):
+        def write(thread):
+            futures = [
+                self.write_queue.add_contact(f"Contact {thread}-{i}", str(i)) for i in range(100)
+            ]
+            return [future.result() for future in futures]
+
+        with ThreadPoolExecutor(8) as executor:
+            ids = [i for thread_ids in executor.map(write, range(8)) for i in thread_ids]
+
+        self.assertEqual(len(set(ids)), 800)
+        self.assertEqual(self.model.count_contacts(), 800)
+
+    def test_failed_mutation_does_not_undo_its_batch(self):
+        def fail(conn):
+            conn.execute("INSERT INTO contacts (name, phone) VALUES ('Broken', '1')")
+            conn.execute("INSERT INTO missing_table VALUES (1)")
+
+        # Holds the writer so the three mutations are committed together
+        started = threading.Event()
+        release = threading.Event()
+        self.write_queue.run(lambda: (started.set(), release.wait()))
+        started.wait()
+        first = self.write_queue.add_contact("John", "123")
+        failed = self.write_queue.submit(fail)
+        last = self.write_queue.add_contact("Jane", "456")
+        release.set()
+
+        self.assertIsInstance(first.result(), int)
+        self.assertIsInstance(last.result(), int)
+        with self.assertRaises(sqlite3.OperationalError):
+            failed.result()
+        self.assertEqual(
+            sorted(c.name for c in self.model.get_all_contacts()), ["Jane", "John"]
+        )
+
+    def test_close_commits_queued_writes(self):
+        futures = [self.write_queue.add_contact(f"Contact {i}", str(i)) for i in range(20)]
+        self.write_queue.close()
+
+        self.assertTrue(all(future.done() for future in futures))
+        self.assertEqual(self.model.count_contacts(), 20)
+        with self.assertRaises(RuntimeError):
+            self.write_queue.add_contact("Late", "1")
+
+
+if __name__ == "__main__":
+    unittest.main()
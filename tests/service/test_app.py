@@ -0,0 +1,155 @@
+import asyncio
+import gzip
+import http.client
+import json
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from model.phone import PHONE_FORMAT_MESSAGE
+from service.app import ContactService
+
+
+class TestContactService(unittest.TestCase):
+    def setUp(self):
+        self.temp_dir = tempfile.mkdtemp()
+        self.service = ContactService(os.path.join(self.temp_dir, "contacts.db"), read_workers=2)
+        self.loop = asyncio.new_event_loop()
+        self.server = self.loop.run_until_complete(self.service.start("127.0.0.1", 0))
+        self.port = self.server.sockets[0].getsockname()[1]
+        self.thread = threading.Thread(target=self.loop.run_forever)
+        self.thread.start()
+
+    def tearDown(self):
+        async def stop():
+            self.server.close()
+            await self.server.wait_closed()
+
+        asyncio.run_coroutine_threadsafe(stop(), self.loop).result()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+        self.loop.close()
+        self.service.close()
+        shutil.rmtree(self.temp_dir)
+
+    def request(self, method, path, body=None, raw=False):
+        connection = http.client.HTTPConnection("127.0.0.1", self.port, timeout=10)
+        try:
+            if body is not None and not isinstance(body, bytes):
+                body = json.dumps(body).encode("utf-8")
+            connection.request(method, path, body)
+            response = connection.getresponse()
+            data = response.read()
+            if not raw and data:
+                data = json.loads(data)
+            return response, data
+        finally:
+            connection.close()
+
+    def test_crud(self):
+        response, created = self.request("POST", "/contacts", {"name": "John", "phone": "123"})
+        self.assertEqual(response.status, 201)
+        self.assertEqual(response.getheader("Location"), f"/contacts/{created['id']}")
+
+        response, contact = self.request("GET", f"/contacts/{created['id']}")
+        self.assertEqual(contact, {"id": created["id"], "name": "John", "phone": "123"})
+
+        response, _ = self.request("PUT", f"/contacts/{created['id']}", {"name": "Jane", "phone": "456"})
+        self.assertEqual(response.status, 200)
+        _, contact = self.request("GET", f"/contacts/{created['id']}")
+        self.assertEqual(contact["name"], "Jane")
+
+        response, _ = self.request("DELETE", f"/contacts/{created['id']}")
+        self.assertEqual(response.status, 204)
+        response, _ = self.request("GET", f"/contacts/{created['id']}")
+        self.assertEqual(response.status, 404)
+
+    def test_errors(self):
+        response, body = self.request("POST", "/contacts", {"name": "John", "phone": "12a"})
+        self.assertEqual(response.status, 400)
+        self.assertEqual(body["error"], PHONE_FORMAT_MESSAGE)
+
+        response, _ = self.request("POST", "/contacts", b"{not json")
+        self.assertEqual(response.status, 400)
+
+        response, _ = self.request("PATCH", "/contacts/1")
+        self.assertEqual(response.status, 405)
+        self.assertEqual(response.getheader("Allow"), "GET, PUT, DELETE")
+
+        response, _ = self.request("GET", "/missing")
+        self.assertEqual(response.status, 404)
+
+        response, _ = self.request("GET", "/contacts?cursor=invalid")
+        self.assertEqual(response.status, 400)
+
+    def test_lookup(self):
+        self.request("POST", "/contacts", {"name": "John", "phone": "(555) 123-4567"})
+
+        _, body = self.request("GET", "/contacts/lookup?phone=%2B15551234567")
+        self.assertEqual([c["name"] for c in body["contacts"]], ["John"])
+        response, _ = self.request("GET", "/contacts/lookup")
+        self.assertEqual(response.status, 400)
+
+    def test_fuzzy_search(self):
+        for name in ["John Smith", "Jon Smyth", "Jane Doe"]:
+            self.request("POST", "/contacts", {"name": name, "phone": "123"})
+
+        _, body = self.request("GET", "/contacts/fuzzy?search=jhon%20smith&limit=1")
+        self.assertEqual(
+            body["contacts"], [{"id": 1, "name": "John Smith", "phone": "123", "score": 2}]
+        )
+        response, _ = self.request("GET", "/contacts/fuzzy")
+        self.assertEqual(response.status, 400)
+
+    def test_pagination(self):
+        for i in range(5):
+            self.request("POST", "/contacts", {"name": f"Contact {i}", "phone": str(i)})
+
+        names = []
+        path = "/contacts?limit=2"
+        while path:
+            _, page = self.request("GET", path)
+            names.extend(contact["name"] for contact in page["contacts"])
+            path = page["next_cursor"] and f"/contacts?limit=2&cursor={page['next_cursor']}"
+
+        self.assertEqual(names, [f"Contact {i}" for i in range(5)])
+        _, count = self.request("GET", "/contacts/count?search=act%203")
+        self.assertEqual(count, {"count": 1})
+
+    def test_import_and_export(self):
+        response, result = self.request("POST", "/import", b"John, 123\nbroken\nJane, 456\n")
+        self.assertEqual(response.status, 200)
+        self.assertEqual(result["inserted"], 2)
+        self.assertEqual(result["invalid_line_count"], 1)
+
+        response, body = self.request("GET", "/export?format=csv", raw=True)
+        self.assertEqual(response.getheader("Transfer-Encoding"), "chunked")
+        self.assertEqual(body.decode("utf-8").splitlines()[1:], ["Jane,456", "John,123"])
+
+        response, body = self.request("GET", "/export?gzip=1", raw=True)
+        self.assertEqual(response.getheader("Content-Type"), "application/gzip")
+        self.assertIn("John", gzip.decompress(body).decode("utf-8"))
+
+        response, _ = self.request("GET", "/export?format=pdf")
+        self.assertEqual(response.status, 400)
+
+    def test_concurrent_clients(self):
+        self.request("POST", "/contacts", {"name": "John", "phone": "123"})
+
+        def client(i):
+            if i % 5 == 0:
+                return self.request("POST", "/contacts", {"name": f"New {i}", "phone": str(i)})[0].status
+            return self.request("GET", "/contacts?search=john")[0].status
+
+        with ThreadPoolExecutor(20) as executor:
+            statuses = list(executor.map(client, range(100)))
+
+        self.assertEqual(set(statuses), {200, 201})
+        _, count = self.request("GET", "/contacts/count")
+        self.assertEqual(count["count"], 21)
+
+
+if __name__ == "__main__":
+    unittest.main()
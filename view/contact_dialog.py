@@ -1,6 +1,8 @@
 from PyQt5.QtWidgets import (QDialog, QVBoxLayout, QHBoxLayout, QLabel, 
                              QLineEdit, QPushButton, QMessageBox)
 from PyQt5.QtCore import Qt
+from model.phone import PHONE_FORMAT_MESSAGE, is_valid_phone
+from view.styles import CONTACT_DIALOG_STYLE
 
 class ContactDialog(QDialog):
     def __init__(self, parent=None, contact=None):
@@ -10,6 +12,7 @@ class ContactDialog(QDialog):
         self.setWindowTitle("New Contact" if contact is None else "Edit Contact")
         self.setFixedSize(400, 200)
         self.setModal(True)
+        self.setStyleSheet(CONTACT_DIALOG_STYLE)
         
         # Contact data (if editing)
         self.contact = contact
@@ -23,20 +26,10 @@ class ContactDialog(QDialog):
         # Name field
         name_layout = QVBoxLayout()
         name_label = QLabel("Name:")
-        name_label.setStyleSheet("font-weight: bold;")
+        name_label.setObjectName("fieldLabel")
         self.name_input = QLineEdit()
         self.name_input.setPlaceholderText("Enter contact name")
-        self.name_input.setStyleSheet("""
-            QLineEdit {
-                padding: 8px;
-                border: 1px solid #ccc;
-                border-radius: 4px;
-                font-size: 14px;
-            }
-            QLineEdit:focus {
-                border: 1px solid #4CAF50;
-            }
-        """)
+        self.name_input.setObjectName("nameInput")
         
         if contact:
             self.name_input.setText(contact.name)
@@ -51,20 +44,10 @@ class ContactDialog(QDialog):
         # Phone field
         phone_layout = QVBoxLayout()
         phone_label = QLabel("Phone:")
-        phone_label.setStyleSheet("font-weight: bold;")
+        phone_label.setObjectName("fieldLabel")
         self.phone_input = QLineEdit()
         self.phone_input.setPlaceholderText("Enter phone number")
-        self.phone_input.setStyleSheet("""
-            QLineEdit {
-                padding: 8px;
-                border: 1px solid #ccc;
-                border-radius: 4px;
-                font-size: 14px;
-            }
-            QLineEdit:focus {
-                border: 1px solid #4CAF50;
-            }
-        """)
+        self.phone_input.setObjectName("phoneInput")
         
         if contact:
             self.phone_input.setText(contact.phone)
@@ -83,34 +66,11 @@ class ContactDialog(QDialog):
         
         # Cancel button
         self.btn_cancel = QPushButton("Cancel")
-        self.btn_cancel.setStyleSheet("""
-            QPushButton {
-                padding: 8px 15px;
-                background-color: #f2f2f2;
-                border: 1px solid #ccc;
-                border-radius: 4px;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                background-color: #e6e6e6;
-            }
-        """)
+        self.btn_cancel.setObjectName("cancelButton")
         
         # Save button
         self.btn_save = QPushButton("Save")
-        self.btn_save.setStyleSheet("""
-            QPushButton {
-                padding: 8px 15px;
-                background-color: #4CAF50;
-                color: white;
-                border: none;
-                border-radius: 4px;
-                font-size: 14px;
-            }
-            QPushButton:hover {
-                background-color: #45a049;
-            }
-        """)
+        self.btn_save.setObjectName("saveButton")
         
         buttons_layout.addWidget(self.btn_cancel)
         buttons_layout.addWidget(self.btn_save)
@@ -138,9 +98,9 @@ class ContactDialog(QDialog):
             self.phone_input.setFocus()
             return
         
-        # Validate phone format (numbers only)
-        if not phone.isdigit():
-            QMessageBox.warning(self, "Validation", "Phone must contain only numbers.")
+        # Validate phone format (digits, separators and a leading +)
+        if not is_valid_phone(phone):
+            QMessageBox.warning(self, "Validation", PHONE_FORMAT_MESSAGE)
             self.phone_input.setFocus()
             return
         
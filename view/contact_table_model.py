@@ -0,0 +1,117 @@
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class ContactTableModel(QAbstractTableModel):
+    HEADERS = ["ID", "Name", "Phone"]
+
+    def __init__(self, parent=None, page_size=200):
+        super().__init__(parent)
+        self.page_size = page_size
+        self._contacts = []
+        self._fetch_page = None
+        self._has_more = False
+
+    def set_source(self, fetch_page):
+        """Replace the rows with a new source
+
+        fetch_page(after, limit) must return up to limit contacts following the
+        (name, id) key after, or the first page when after is None. Only the
+        first page is loaded here; the view asks for more while scrolling.
+        """
+        self.beginResetModel()
+        self._fetch_page = fetch_page
+        self._contacts = []
+        self._has_more = fetch_page is not None
+        self.endResetModel()
+
+        self.fetchMore(QModelIndex())
+
+    def contact_at(self, row):
+        """Return the contact shown in the given row"""
+        if 0 <= row < len(self._contacts):
+            return self._contacts[row]
+        return None
+
+    def insert_contact(self, row, contact):
+        """Insert a contact at row if that part of the list is loaded"""
+        loaded = len(self._contacts)
+        if row > loaded or (row == loaded and self._has_more):
+            return  # fetchMore will pick it up
+
+        self.beginInsertRows(QModelIndex(), row, row)
+        self._contacts.insert(row, contact)
+        self.endInsertRows()
+
+    def remove_contact(self, row):
+        """Remove the contact at row if it is loaded"""
+        if row >= len(self._contacts):
+            return
+
+        self.beginRemoveRows(QModelIndex(), row, row)
+        del self._contacts[row]
+        self.endRemoveRows()
+
+    def update_contact(self, row, new_row, contact):
+        """Show a changed contact, moving it from row to new_row"""
+        if row == new_row:
+            if row < len(self._contacts):
+                self._contacts[row] = contact
+                last_column = len(self.HEADERS) - 1
+                self.dataChanged.emit(self.index(row, 0), self.index(row, last_column))
+            return
+
+        self.remove_contact(row)
+        self.insert_contact(new_row, contact)
+
+    def rowCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self._contacts)
+
+    def columnCount(self, parent=QModelIndex()):
+        if parent.isValid():
+            return 0
+        return len(self.HEADERS)
+
+    def data(self, index, role=Qt.DisplayRole):
+        if not index.isValid() or role != Qt.DisplayRole:
+            return None
+
+        contact = self._contacts[index.row()]
+        column = index.column()
+        if column == 0:
+            return str(contact.contact_id)
+        if column == 1:
+            return contact.name
+        return contact.phone
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.HEADERS[section]
+        return None
+
+    def canFetchMore(self, parent):
+        if parent.isValid():
+            return False
+        return self._has_more
+
+    def fetchMore(self, parent):
+        """Load the next page of contacts from the source"""
+        if parent.isValid() or not self._has_more:
+            return
+
+        after = None
+        if self._contacts:
+            last = self._contacts[-1]
+            after = (last.name, last.contact_id)
+
+        page = self._fetch_page(after, self.page_size)
+        if len(page) < self.page_size:
+            self._has_more = False
+        if not page:
+            return
+
+        first = len(self._contacts)
+        self.beginInsertRows(QModelIndex(), first, first + len(page) - 1)
+        self._contacts.extend(page)
+        self.endInsertRows()
@@ -4,16 +4,19 @@ from PyQt5.QtWidgets import (
     QVBoxLayout,
     QHBoxLayout,
     QPushButton,
-    QTableWidget,
-    QTableWidgetItem,
+    QTableView,
     QHeaderView,
     QMessageBox,
     QLabel,
     QFileDialog,
     QLineEdit,
+    QInputDialog,
+    QCheckBox,
 )
 from PyQt5.QtCore import Qt
 from PyQt5.QtGui import QCloseEvent
+from view.contact_table_model import ContactTableModel
+from view.styles import MAIN_WINDOW_STYLE
 
 
 class MainWindow(QMainWindow):
@@ -23,6 +26,7 @@ class MainWindow(QMainWindow):
         # Main window configuration
         self.setWindowTitle("Contacts Application")
         self.setGeometry(100, 100, 800, 500)
+        self.setStyleSheet(MAIN_WINDOW_STYLE)
 
         # Central widget
         central_widget = QWidget()
@@ -38,9 +42,7 @@ class MainWindow(QMainWindow):
         # Left panel title
         left_title = QLabel("Actions")
         left_title.setAlignment(Qt.AlignCenter)
-        left_title.setStyleSheet(
-            "font-size: 16px; font-weight: bold; margin-bottom: 20px;"
-        )
+        left_title.setObjectName("actionsTitle")
         left_layout.addWidget(left_title)
 
         # Buttons
@@ -51,47 +53,17 @@ class MainWindow(QMainWindow):
         # Import/Export section
         import_export_label = QLabel("Import/Export")
         import_export_label.setAlignment(Qt.AlignCenter)
-        import_export_label.setStyleSheet(
-            "font-size: 14px; font-weight: bold; margin-top: 10px; margin-bottom: 10px;"
-        )
+        import_export_label.setObjectName("sectionTitle")
 
-        self.btn_export = QPushButton("Export to TXT")
+        self.btn_export = QPushButton("Export Contacts")
         self.btn_import = QPushButton("Import from TXT")
 
-        # Button style
-        button_style = """
-            QPushButton {
-                padding: 10px;
-                font-size: 14px;
-                background-color: #4CAF50;
-                color: white;
-                border: none;
-                border-radius: 5px;
-                margin: 5px;
-            }
-            QPushButton:hover {
-                background-color: #45a049;
-            }
-            QPushButton:disabled {
-                background-color: #cccccc;
-                color: #666666;
-            }
-        """
-        self.btn_new.setStyleSheet(button_style)
-        self.btn_edit.setStyleSheet(button_style)
-        self.btn_delete.setStyleSheet(
-            button_style.replace("#4CAF50", "#f44336").replace("#45a049", "#d32f2f")
-        )
-
-        # Export button with blue style
-        self.btn_export.setStyleSheet(
-            button_style.replace("#4CAF50", "#2196F3").replace("#45a049", "#0b7dda")
-        )
-
-        # Import button with purple style
-        self.btn_import.setStyleSheet(
-            button_style.replace("#4CAF50", "#9C27B0").replace("#45a049", "#7B1FA2")
-        )
+        # Button colors (see view/styles.py)
+        self.btn_new.setProperty("variant", "primary")
+        self.btn_edit.setProperty("variant", "primary")
+        self.btn_delete.setProperty("variant", "danger")
+        self.btn_export.setProperty("variant", "export")
+        self.btn_import.setProperty("variant", "import")
 
         # Add buttons to layout
         left_layout.addWidget(self.btn_new)
@@ -110,62 +82,31 @@ class MainWindow(QMainWindow):
         # Right panel title
         right_title = QLabel("Contacts List")
         right_title.setAlignment(Qt.AlignCenter)
-        right_title.setStyleSheet(
-            "font-size: 16px; font-weight: bold; margin-bottom: 10px;"
-        )
+        right_title.setObjectName("contactsTitle")
         right_layout.addWidget(right_title)
 
-        # Search input
+        # Search input, and whether to search by best match tolerating typos
+        search_layout = QHBoxLayout()
         self.search_input = QLineEdit()
         self.search_input.setPlaceholderText("Search contacts...")
-        self.search_input.setStyleSheet(
-            """
-            QLineEdit {
-                padding: 8px;
-                font-size: 14px;
-                border: 1px solid #dddddd;
-                border-radius: 5px;
-                margin-bottom: 10px;
-            }
-            QLineEdit:focus {
-                border-color: #4CAF50;
-            }
-        """
-        )
-        right_layout.addWidget(self.search_input)
-
-        # Contacts table
-        self.table = QTableWidget(0, 3)  # 0 rows initially, 3 columns (ID, Name, Phone)
-        self.table.setHorizontalHeaderLabels(["ID", "Name", "Phone"])
+        self.search_input.setObjectName("searchInput")
+        search_layout.addWidget(self.search_input)
+        self.fuzzy_checkbox = QCheckBox("Fuzzy")
+        self.fuzzy_checkbox.setToolTip("Show the best matches first, tolerating typos")
+        search_layout.addWidget(self.fuzzy_checkbox)
+        right_layout.addLayout(search_layout)
+
+        # Contacts table (rows are loaded lazily by the table model)
+        self.table_model = ContactTableModel(self)
+        self.table = QTableView()
+        self.table.setObjectName("contactsTable")
+        self.table.setModel(self.table_model)
         self.table.verticalHeader().setVisible(False)
-        self.table.setEditTriggers(QTableWidget.NoEditTriggers)
-        self.table.setSelectionBehavior(QTableWidget.SelectRows)
-        self.table.setSelectionMode(QTableWidget.SingleSelection)
+        self.table.setEditTriggers(QTableView.NoEditTriggers)
+        self.table.setSelectionBehavior(QTableView.SelectRows)
+        self.table.setSelectionMode(QTableView.SingleSelection)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
 
-        # Table style
-        self.table.setStyleSheet(
-            """
-            QTableWidget {
-                border: 1px solid #dddddd;
-                border-radius: 5px;
-                background-color: #ffffff;
-            }
-            QHeaderView::section {
-                background-color: #f2f2f2;
-                padding: 5px;
-                border: 1px solid #dddddd;
-                font-weight: bold;
-            }
-            QTableWidget::item {
-                padding: 5px;
-            }
-            QTableWidget::item:selected {
-                background-color: #e0f7fa;
-            }
-        """
-        )
-
         right_layout.addWidget(self.table)
 
         # Add panels to main layout
@@ -177,31 +118,29 @@ class MainWindow(QMainWindow):
         self.btn_delete.setEnabled(False)
 
         # Connect table selection with button enabling
-        self.table.itemSelectionChanged.connect(self.on_selection_changed)
+        self.table.selectionModel().selectionChanged.connect(self.on_selection_changed)
 
     def on_selection_changed(self):
         """Enable or disable buttons based on table selection"""
-        has_selection = len(self.table.selectedItems()) > 0
+        has_selection = self.table.selectionModel().hasSelection()
         self.btn_edit.setEnabled(has_selection)
         self.btn_delete.setEnabled(has_selection)
 
     def get_selected_contact_id(self):
         """Get the ID of the selected contact"""
-        if len(self.table.selectedItems()) > 0:
-            row = self.table.selectedItems()[0].row()
-            id_item = self.table.item(row, 0)
-            return int(id_item.text())
+        selected_rows = self.table.selectionModel().selectedRows()
+        if selected_rows:
+            contact = self.table_model.contact_at(selected_rows[0].row())
+            if contact is not None:
+                return contact.contact_id
         return None
 
-    def show_contacts(self, contacts):
-        """Show contacts in the table"""
-        self.table.setRowCount(0)
-        for contact in contacts:
-            row = self.table.rowCount()
-            self.table.insertRow(row)
-            self.table.setItem(row, 0, QTableWidgetItem(str(contact.contact_id)))
-            self.table.setItem(row, 1, QTableWidgetItem(contact.name))
-            self.table.setItem(row, 2, QTableWidgetItem(contact.phone))
+    def show_contacts(self, fetch_page):
+        """Show contacts in the table, loading pages from fetch_page(after, limit)"""
+        self.table_model.set_source(fetch_page)
+
+        # Resetting the model clears the selection without notifying
+        self.on_selection_changed()
 
     def show_error(self, message):
         """Show an error message"""
@@ -225,7 +164,11 @@ class MainWindow(QMainWindow):
     def export_contacts_dialog(self):
         """Open a dialog to export contacts to a text file"""
         file_path, _ = QFileDialog.getSaveFileName(
-            self, "Export Contacts", "", "Text Files (*.txt);;All Files (*)"
+            self,
+            "Export Contacts",
+            "",
+            "Text Files (*.txt);;CSV Files (*.csv);;JSON Lines Files (*.jsonl);;"
+            "vCard Files (*.vcf);;Gzip Files (*.gz);;All Files (*)",
         )
 
         if file_path:
@@ -242,6 +185,33 @@ class MainWindow(QMainWindow):
             return file_path
         return None
 
+    def ask_duplicate_mode(self):
+        """Ask what to do with imported contacts whose phone already exists"""
+        options = {
+            "Skip them": "skip",
+            "Update the existing contact's name": "update",
+            "Keep both": "keep",
+        }
+        choice, ok = QInputDialog.getItem(
+            self,
+            "Import Contacts",
+            "Some contacts may already exist (same phone number):",
+            list(options),
+            0,
+            False,
+        )
+
+        if ok:
+            return options[choice]
+        return None
+
+    def create_progress_dialog(self, title):
+        """Create a dialog that shows the progress of a background job"""
+        # Imported on first use to keep startup fast
+        from view.progress_dialog import JobProgressDialog
+
+        return JobProgressDialog(self, title)
+
     def closeEvent(self, event: QCloseEvent):
         """Handle the window close event with confirmation dialog"""
         reply = QMessageBox.question(
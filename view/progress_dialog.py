@@ -0,0 +1,35 @@
+import time
+from PyQt5.QtWidgets import QProgressDialog
+from PyQt5.QtCore import Qt
+
+
+class JobProgressDialog(QProgressDialog):
+    # Resolution of the progress bar
+    STEPS = 1000
+
+    def __init__(self, parent, title):
+        super().__init__(title, "Cancel", 0, self.STEPS, parent)
+
+        # Dialog configuration
+        self.setWindowTitle(title)
+        self.setWindowModality(Qt.WindowModal)
+        self.setMinimumDuration(0)
+        self.setAutoReset(False)
+        self.setMinimumWidth(400)
+
+        self.title = title
+        self.started_at = time.monotonic()
+
+    def update_progress(self, count, fraction):
+        """Show the number of contacts processed, the rate and the time left"""
+        elapsed = time.monotonic() - self.started_at
+        rate = count / elapsed if elapsed > 0 else 0
+
+        label = f"{self.title}\n\n{count:,} contacts ({rate:,.0f}/s)"
+        if 0 < fraction < 1:
+            remaining = elapsed * (1 - fraction) / fraction
+            minutes, seconds = divmod(int(remaining), 60)
+            label += f" - {minutes}:{seconds:02d} remaining"
+
+        self.setLabelText(label)
+        self.setValue(int(fraction * self.STEPS))
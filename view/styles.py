@@ -0,0 +1,115 @@
+# Style sheets shared by the widgets. Each window sets one style sheet whose
+# rules select widgets by object name or "variant" property, so Qt parses it
+# once instead of once per widget. Rules are scoped to named widgets so they
+# do not leak into message boxes parented to the window.
+
+
+def _button_rules(variant, color, hover_color):
+    """Rules for an action button variant of the main window"""
+    return f"""
+        QPushButton[variant="{variant}"] {{
+            padding: 10px;
+            font-size: 14px;
+            background-color: {color};
+            color: white;
+            border: none;
+            border-radius: 5px;
+            margin: 5px;
+        }}
+        QPushButton[variant="{variant}"]:hover {{
+            background-color: {hover_color};
+        }}
+        QPushButton[variant="{variant}"]:disabled {{
+            background-color: #cccccc;
+            color: #666666;
+        }}
+    """
+
+
+MAIN_WINDOW_STYLE = (
+    """
+    QLabel#actionsTitle, QLabel#contactsTitle {
+        font-size: 16px;
+        font-weight: bold;
+    }
+    QLabel#actionsTitle {
+        margin-bottom: 20px;
+    }
+    QLabel#contactsTitle {
+        margin-bottom: 10px;
+    }
+    QLabel#sectionTitle {
+        font-size: 14px;
+        font-weight: bold;
+        margin-top: 10px;
+        margin-bottom: 10px;
+    }
+    QLineEdit#searchInput {
+        padding: 8px;
+        font-size: 14px;
+        border: 1px solid #dddddd;
+        border-radius: 5px;
+        margin-bottom: 10px;
+    }
+    QLineEdit#searchInput:focus {
+        border-color: #4CAF50;
+    }
+    QTableView#contactsTable {
+        border: 1px solid #dddddd;
+        border-radius: 5px;
+        background-color: #ffffff;
+    }
+    QTableView#contactsTable QHeaderView::section {
+        background-color: #f2f2f2;
+        padding: 5px;
+        border: 1px solid #dddddd;
+        font-weight: bold;
+    }
+    QTableView#contactsTable::item {
+        padding: 5px;
+    }
+    QTableView#contactsTable::item:selected {
+        background-color: #e0f7fa;
+    }
+    """
+    + _button_rules("primary", "#4CAF50", "#45a049")
+    + _button_rules("danger", "#f44336", "#d32f2f")
+    + _button_rules("export", "#2196F3", "#0b7dda")
+    + _button_rules("import", "#9C27B0", "#7B1FA2")
+)
+
+CONTACT_DIALOG_STYLE = """
+    QLabel#fieldLabel {
+        font-weight: bold;
+    }
+    QLineEdit#nameInput, QLineEdit#phoneInput {
+        padding: 8px;
+        border: 1px solid #ccc;
+        border-radius: 4px;
+        font-size: 14px;
+    }
+    QLineEdit#nameInput:focus, QLineEdit#phoneInput:focus {
+        border: 1px solid #4CAF50;
+    }
+    QPushButton#cancelButton {
+        padding: 8px 15px;
+        background-color: #f2f2f2;
+        border: 1px solid #ccc;
+        border-radius: 4px;
+        font-size: 14px;
+    }
+    QPushButton#cancelButton:hover {
+        background-color: #e6e6e6;
+    }
+    QPushButton#saveButton {
+        padding: 8px 15px;
+        background-color: #4CAF50;
+        color: white;
+        border: none;
+        border-radius: 4px;
+        font-size: 14px;
+    }
+    QPushButton#saveButton:hover {
+        background-color: #45a049;
+    }
+"""